@@ -1,9 +1,26 @@
 import pandas as pd
 import numpy as np
-from scipy.stats import skew
-from scipy.stats import norm
+from config import get_config
+from profiling.instrumentation import instrumented
 
-def filter_by_var(price_df, confidence_level=0.95, var_threshold=-0.05, lookback=252, method='historical'):
+__all__ = [
+    "filter_by_var",
+    "filter_by_volatility",
+    "filter_by_correlation",
+    "select_assets_by_sharpe",
+    "rolling_volatility_panel",
+    "rolling_sharpe_panel",
+    "volatility_eligibility",
+    "sharpe_selection_mask",
+]
+
+@instrumented("filter_by_var")
+def filter_by_var(price_df, confidence_level=None, var_threshold=None, lookback=None, method='historical'):
+    # None = configured strategy.var_confidence / var_threshold / var_lookback
+    cfg = get_config().strategy
+    confidence_level = cfg.var_confidence if confidence_level is None else confidence_level
+    var_threshold = cfg.var_threshold if var_threshold is None else var_threshold
+    lookback = cfg.var_lookback if lookback is None else lookback
     if 'Date' not in price_df.columns or 'Symbol' not in price_df.columns or 'Close' not in price_df.columns:
         raise ValueError("Input DataFrame must contain 'Date', 'Symbol', and 'Close' columns.")
 
@@ -19,6 +36,7 @@ def filter_by_var(price_df, confidence_level=0.95, var_threshold=-0.05, lookback
         if method == 'historical':
             var = np.percentile(r, (1 - confidence_level) * 100)
         elif method == 'parametric':
+            from scipy.stats import norm  # scipy.stats is slow to import, load on demand
             mu = r.mean()
             sigma = r.std()
             z = norm.ppf(1 - confidence_level)
@@ -32,38 +50,194 @@ def filter_by_var(price_df, confidence_level=0.95, var_threshold=-0.05, lookback
 
 
 
-def filter_by_volatility(price_df, window=20, min_vol=0.005, max_vol=0.05):
+@instrumented("filter_by_volatility")
+def filter_by_volatility(price_df, window=None, min_vol=None, max_vol=None):
+    """
+    Symbols whose latest rolling volatility (std of the last `window` returns of the
+    symbol's own observations) lies in [min_vol, max_vol]: the last row of
+    volatility_eligibility (None = configured strategy.vol_window / min_vol / max_vol).
+    """
     if 'Date' not in price_df.columns or 'Symbol' not in price_df.columns or 'Close' not in price_df.columns:
         raise ValueError("Input DataFrame must contain 'Date', 'Symbol', and 'Close' columns.")
 
-    # Sort by Symbol and Date to ensure correct time order within each symbol
-    price_df = price_df.sort_values(['Symbol', 'Date'])
+    eligible = volatility_eligibility(price_df, window=window, min_vol=min_vol, max_vol=max_vol)
+    if eligible.empty:
+        return []
+    last = eligible.iloc[-1]
+    return last[last].index.tolist()
 
-    # Calculate daily returns per symbol
-    returns = price_df.groupby('Symbol')['Close'].apply(lambda x: x.pct_change()).dropna()
 
-    # Calculate rolling volatility (std dev) per symbol
-    rolling_vol = returns.groupby('Symbol').rolling(window).std().reset_index(level=0, drop=True)
+def _close_panel(price_df):
+    df = price_df[['Date', 'Symbol', 'Close']]
+    return df.pivot(index='Date', columns='Symbol', values='Close').sort_index().sort_index(axis=1)
+
+
+def _observation_returns(prices):
+    """
+    Simple returns between consecutive observations of each symbol, as
+    groupby('Symbol').pct_change() on the long data: a missing date is spanned
+    by one return, and the first observation has none.
+    """
+    values = prices.to_numpy(dtype=float)
+    previous = prices.ffill().shift(1).to_numpy(dtype=float)
+    returns = values / previous - 1
+    returns[np.isnan(values)] = np.nan
+    return returns
+
+
+def _rolling_mean_std(values, window):
+    """
+    Mean and sample std of the last `window` valid values of each column, at every
+    row holding a valid value (NaN elsewhere and until `window` values exist).
+
+    Valid values are moved to the top of each column so the window counts
+    observations, then window sums come from differences of cumulative sums;
+    values are centred on the column mean first to keep the sum of squares exact.
+    """
+    valid = ~np.isnan(values)
+    order = np.argsort(~valid, axis=0, kind='stable')
+    n_rows, n_cols = values.shape
+    out_mean = np.full((n_rows, n_cols), np.nan)
+    out_std = np.full((n_rows, n_cols), np.nan)
+    if n_rows < window or window < 1:
+        return out_mean, out_std
 
-    # Get the last rolling volatility value for each symbol
-    last_vol = rolling_vol.groupby('Symbol').last()
+    with np.errstate(invalid='ignore'):
+        center = np.where(valid.any(axis=0), np.nanmean(np.where(valid, values, np.nan), axis=0), 0.0)
+    x = np.take_along_axis(np.where(valid, values - center, 0.0), order, axis=0)
+    zero = np.zeros((1, n_cols))
+    s1 = np.vstack([zero, np.cumsum(x, axis=0)])
+    s2 = np.vstack([zero, np.cumsum(x * x, axis=0)])
+    sum1 = s1[window:] - s1[:-window]
+    sum2 = s2[window:] - s2[:-window]
 
-    # Filter symbols whose volatility falls within the desired range
-    filtered = last_vol[(last_vol >= min_vol) & (last_vol <= max_vol)]
+    mean = np.full((n_rows, n_cols), np.nan)
+    std = np.full((n_rows, n_cols), np.nan)
+    mean[window - 1:] = sum1 / window + center
+    with np.errstate(invalid='ignore', divide='ignore'):
+        std[window - 1:] = np.sqrt(np.maximum(sum2 - sum1 * sum1 / window, 0.0) / (window - 1))
 
-    return filtered.index.tolist()
+    # Compacted row k is the k-th observation: windows past a column's last one are padding
+    beyond = np.arange(n_rows)[:, None] >= valid.sum(axis=0)
+    mean[beyond] = np.nan
+    std[beyond] = np.nan
+    np.put_along_axis(out_mean, order, mean, axis=0)
+    np.put_along_axis(out_std, order, std, axis=0)
+    out_mean[~valid] = np.nan
+    out_std[~valid] = np.nan
+    return out_mean, out_std
 
 
+@instrumented("rolling_volatility_panel")
+def rolling_volatility_panel(price_df, window=20):
+    """
+    Rolling volatility of every symbol on every date in one pass.
 
-def filter_by_correlation(price_df, corr_threshold=0.3):
-    df = price_df.copy()
-    if 'Date' not in df.columns or 'Symbol' not in df.columns or 'Close' not in df.columns:
+    The value on date d is the std of the symbol's last `window` returns on or before
+    d (returns between its own consecutive observations), carried forward over dates
+    it did not trade, i.e. exactly what filter_by_volatility sees on data truncated at d.
+
+    Args:
+        price_df (DataFrame): Long format with ['Date', 'Symbol', 'Close'].
+        window (int): Number of returns per window.
+
+    Returns:
+        pd.DataFrame: index=Date, columns=Symbol (NaN until `window` returns exist).
+    """
+    prices = _close_panel(price_df)
+    _, std = _rolling_mean_std(_observation_returns(prices), window)
+    return pd.DataFrame(std, index=prices.index, columns=prices.columns).ffill()
+
+
+@instrumented("rolling_sharpe_panel")
+def rolling_sharpe_panel(price_df, window=60, risk_free_rate=0.0):
+    """
+    Rolling Sharpe ratio of every symbol on every date: (mean - rf_daily) / std of
+    its last `window` returns, with select_assets_by_sharpe's daily (un-annualized)
+    convention, carried forward over dates the symbol did not trade.
+
+    Args:
+        price_df (DataFrame): Long format with ['Date', 'Symbol', 'Close'].
+        window (int): Number of returns per window.
+        risk_free_rate (float): Annual risk-free rate.
+
+    Returns:
+        pd.DataFrame: index=Date, columns=Symbol (NaN until `window` returns exist or for zero std).
+    """
+    prices = _close_panel(price_df)
+    mean, std = _rolling_mean_std(_observation_returns(prices), window)
+    rf_daily = (1 + risk_free_rate) ** (1/252) - 1
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sharpe = np.where(std > 0, (mean - rf_daily) / std, np.nan)
+    return pd.DataFrame(sharpe, index=prices.index, columns=prices.columns).ffill()
+
+
+def volatility_eligibility(price_df=None, window=None, min_vol=None, max_vol=None, volatility=None):
+    """
+    Point-in-time volatility screen: True where the symbol's rolling volatility known
+    on that date lies in [min_vol, max_vol]. Row d uses closes up to d, matching the
+    backtests' convention that weights on d earn the return from d to the next date.
+
+    Args:
+        price_df (DataFrame or None): Long format with ['Date', 'Symbol', 'Close'].
+        window (int or None): Number of returns per window (None = configured strategy.vol_window).
+        min_vol, max_vol (float or None): Daily volatility bounds (None = configured strategy.min_vol / max_vol).
+        volatility (DataFrame or None): Precomputed rolling_volatility_panel (price_df unused).
+
+    Returns:
+        pd.DataFrame: bool, index=Date, columns=Symbol.
+    """
+    cfg = get_config().strategy
+    window = cfg.vol_window if window is None else window
+    min_vol = cfg.min_vol if min_vol is None else min_vol
+    max_vol = cfg.max_vol if max_vol is None else max_vol
+    vol = rolling_volatility_panel(price_df, window=window) if volatility is None else volatility
+    return (vol >= min_vol) & (vol <= max_vol)
+
+
+def sharpe_selection_mask(sharpe, top_n=None, min_sharpe=None, eligible=None):
+    """
+    Per-date selection from a rolling_sharpe_panel: symbols with a Sharpe ratio of
+    at least min_sharpe, then the top_n of those by Sharpe ratio. Apply to a weights
+    panel with weights.where(mask, 0) before renormalizing.
+
+    Args:
+        sharpe (DataFrame): Rolling Sharpe panel (index=Date, columns=Symbol).
+        top_n (int or None): Keep the top_n per date (ties by column order).
+        min_sharpe (float or None): Minimum Sharpe ratio.
+        eligible (DataFrame or None): bool mask of symbols allowed per date (e.g. volatility_eligibility).
+
+    Returns:
+        pd.DataFrame: bool, same shape as sharpe.
+    """
+    values = sharpe.to_numpy(dtype=float)
+    mask = ~np.isnan(values)
+    if eligible is not None:
+        mask &= eligible.reindex(index=sharpe.index, columns=sharpe.columns, fill_value=False).to_numpy(dtype=bool)
+    if min_sharpe is not None:
+        mask &= np.where(mask, values, -np.inf) >= min_sharpe
+    if top_n is not None:
+        # Stable descending rank among the candidates of each row
+        order = np.argsort(-np.where(mask, values, -np.inf), axis=1, kind='stable')
+        ranks = np.empty_like(order)
+        np.put_along_axis(ranks, order, np.arange(values.shape[1])[None, :], axis=1)
+        mask &= ranks < top_n
+    return pd.DataFrame(mask, index=sharpe.index, columns=sharpe.columns)
+
+
+
+@instrumented("filter_by_correlation")
+def filter_by_correlation(price_df, corr_threshold=None):
+    corr_threshold = get_config().strategy.corr_threshold if corr_threshold is None else corr_threshold
+    if 'Date' not in price_df.columns or 'Symbol' not in price_df.columns or 'Close' not in price_df.columns:
         raise ValueError("Input DataFrame must contain 'Date', 'Symbol', and 'Close' columns.")
+    df = price_df[['Date', 'Symbol', 'Close']].copy()
     
     df['Date'] = pd.to_datetime(df['Date'])
     df = df.sort_values('Date')
 
-    returns = df.pivot(index='Date', columns='Symbol', values='Close').pct_change().dropna()
+    # Greedy selection depends on column order: keep it alphabetical for categorical symbols too
+    returns = df.pivot(index='Date', columns='Symbol', values='Close').sort_index(axis=1).pct_change().dropna()
     corr_matrix = returns.corr()
 
     selected = []
@@ -74,10 +248,11 @@ def filter_by_correlation(price_df, corr_threshold=0.3):
     return selected, corr_matrix.loc[selected, selected]
 
 
+@instrumented("select_assets_by_sharpe")
 def select_assets_by_sharpe(price_df, risk_free_rate=0.0, top_n=None, min_sharpe=None):
-    df = price_df.copy()
-    if 'Date' not in df.columns or 'Symbol' not in df.columns or 'Close' not in df.columns:
+    if 'Date' not in price_df.columns or 'Symbol' not in price_df.columns or 'Close' not in price_df.columns:
         raise ValueError("Input DataFrame must contain 'Date', 'Symbol', and 'Close' columns.")
+    df = price_df[['Date', 'Symbol', 'Close']].copy()
     
     df['Date'] = pd.to_datetime(df['Date'])
     df = df.sort_values('Date')
@@ -87,19 +262,17 @@ def select_assets_by_sharpe(price_df, risk_free_rate=0.0, top_n=None, min_sharpe
 
     rf_daily = (1 + risk_free_rate) ** (1/252) - 1
 
-    sharpe_data = []
-    for asset in returns.columns:
-        mean_ret = returns[asset].mean()
-        std_dev = returns[asset].std()
-        sharpe = (mean_ret - rf_daily) / std_dev if std_dev and not np.isnan(std_dev) else np.nan
-        sharpe_data.append({
-            'asset': asset,
-            'mean_return': mean_ret,
-            'std_dev': std_dev,
-            'sharpe_ratio': sharpe
-        })
-
-    sharpe_df = pd.DataFrame(sharpe_data).dropna().set_index('asset').sort_values('sharpe_ratio', ascending=False)
+    mean_ret = returns.mean()
+    std_dev = returns.std()
+    valid_std = (std_dev != 0) & std_dev.notna()
+    sharpe = ((mean_ret - rf_daily) / std_dev.where(valid_std)).where(valid_std)
+    sharpe_df = pd.DataFrame({
+        'mean_return': mean_ret,
+        'std_dev': std_dev,
+        'sharpe_ratio': sharpe
+    })
+    sharpe_df.index = pd.Index(list(returns.columns), name='asset')
+    sharpe_df = sharpe_df.dropna().sort_values('sharpe_ratio', ascending=False)
 
     if top_n is not None:
         selected_assets = sharpe_df.head(top_n).index.tolist()
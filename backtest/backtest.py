@@ -1,64 +1,72 @@
-from metrics.metrics import *
 import pandas as pd
-from reports.plotting import *
 import numpy as np
-
-def backtest_close_to_close(price_df, combined_weights, allow_short=True):
+from backtest.fills import ohlc_panels, fill_returns
+from functions.sparse_weights import SparseWeights
+from kernels import kernels
+from metrics.metrics import periods_per_year
+from profiling.instrumentation import instrumented, span, count
+
+__all__ = [
+    "backtest_close_to_close",
+    "backtest_metrics_close_to_close",
+    "backtest_with_rebalancing",
+    "backtest_rebalanced_panel",
+]
+
+@instrumented("backtest_close_to_close")
+def backtest_close_to_close(price_df, combined_weights, allow_short=True, exposure=None):
     """
     Backtest portfolio returns using close-to-close prices.
 
     Args:
         price_df (DataFrame): Long format with Date index and Symbol column, must have 'Close'.
-        combined_weights (DataFrame): Wide format, index=Date, columns=Symbols, daily weights.
+        combined_weights (DataFrame or SparseWeights): Wide format, index=Date, columns=Symbols,
+                                                      daily weights.
         allow_short (bool): If True, negative weights represent short positions. 
                             If False, negative weights are set to zero (no shorting).
+        exposure (Series or None): Multiplier of each day's return, indexed by Date
+                                   (e.g. risk_overlay()['exposure']); missing dates count as 1.
 
     Returns:
         pd.Series: Daily portfolio returns indexed by Date.
     """
     # Filter price_df to only tickers present in combined_weights
     tickers = combined_weights.columns
-    price_df = price_df[price_df['Symbol'].isin(tickers)].copy()
-
-    # Ensure 'Date' is the index and sorted
-    if price_df.index.name != 'Date':
-        price_df = price_df.set_index('Date')
-    price_df = price_df.sort_index()
-    price_df = price_df.sort_values(['Date', 'Symbol'])  # sort by Symbol within Date for consistency
-
-    all_dates = sorted(set(price_df.index.unique()) & set(combined_weights.index))
-
-    portfolio_returns = []
-    portfolio_dates = []
-
-    for i in range(1, len(all_dates)):
-        prev_date = all_dates[i - 1]
-        curr_date = all_dates[i]
-
-        if prev_date not in combined_weights.index:
-            portfolio_dates.append(curr_date)
-            portfolio_returns.append(0)
-            continue
-
-        weights = combined_weights.loc[prev_date]
-
+    price_df = price_df[price_df['Symbol'].isin(tickers)]
+    if price_df.index.name == 'Date':
+        price_df = price_df.reset_index()
+
+    all_dates = sorted(set(price_df['Date'].drop_duplicates()) & set(combined_weights.index))
+    if len(all_dates) < 2:
+        return pd.Series([], index=[], dtype=float)
+
+    # One wide Close panel over the common dates; vectorized over all bars, so the
+    # cost no longer grows with a per-date Python loop (intraday bar counts)
+    closes = (price_df.pivot(index='Date', columns='Symbol', values='Close')
+              .reindex(index=all_dates, columns=tickers).to_numpy(dtype=float))
+    asset_returns = closes[1:] / closes[:-1] - 1
+    asset_returns[np.isnan(asset_returns)] = 0.0
+
+    if isinstance(combined_weights, SparseWeights):
+        # Sparse x dense row-dot over the stored entries only
+        weights = combined_weights.reindex(dates=all_dates[:-1])
         if not allow_short:
-            # Clip negative weights to zero (no shorting)
             weights = weights.clip(lower=0)
-
-        close_prev = price_df.loc[prev_date].set_index('Symbol')['Close']
-        close_curr = price_df.loc[curr_date].set_index('Symbol')['Close']
-
-        asset_returns = (close_curr / close_prev - 1).reindex(weights.index).fillna(0)
-
-        port_return = (weights * asset_returns).sum()
-        portfolio_dates.append(curr_date)
-        portfolio_returns.append(port_return)
-
-    return pd.Series(portfolio_returns, index=portfolio_dates).sort_index()
+        port_returns = weights.row_dot(asset_returns)
+    else:
+        weights = combined_weights.loc[all_dates[:-1]].to_numpy(dtype=float)
+        if not allow_short:
+            # Clip negative weights to zero (no shorting)
+            weights = np.clip(weights, 0, None)
+        port_returns = np.nansum(weights * asset_returns, axis=1)
+    if exposure is not None:
+        port_returns = port_returns * exposure.reindex(all_dates[1:]).fillna(1.0).to_numpy()
+    return pd.Series(port_returns, index=all_dates[1:])
 
 
-def backtest_metrics_close_to_close(price_df, combined_weights, freq=252):
+def backtest_metrics_close_to_close(price_df, combined_weights, freq=252, bar_size=None):
+    if bar_size is not None:
+        freq = periods_per_year(bar_size)
     returns = backtest_close_to_close(price_df, combined_weights)
     cumulative_return = (1 + returns).prod() - 1
     annualized_return = (1 + cumulative_return) ** (freq / len(returns)) - 1
@@ -74,7 +82,8 @@ def backtest_metrics_close_to_close(price_df, combined_weights, freq=252):
 
 
 
-def backtest_with_rebalancing(price_df, compute_combined_weights_fn, rebalance_freq=1, capital=100000, start_date=None, plot_progress=False):
+@instrumented("backtest_with_rebalancing")
+def backtest_with_rebalancing(price_df, compute_combined_weights_fn, rebalance_freq=1, capital=100000, start_date=None, plot_progress=False, exposure=None):
     price_df = price_df.copy()
     price_df.index = pd.to_datetime(price_df.index)
     all_dates = sorted(price_df.index.unique())
@@ -103,46 +112,56 @@ def backtest_with_rebalancing(price_df, compute_combined_weights_fn, rebalance_f
 
     # Initial weight load
     try:
-        full_weights = compute_combined_weights_fn(price_df, trading_dates[0])
+        with span("backtest_with_rebalancing.weights"):
+            full_weights = compute_combined_weights_fn(price_df, trading_dates[0])
         current_weights = full_weights.loc[trading_dates[0]]
     except Exception as e:
         print(f"[ERROR] Failed initial weight computation: {e}")
+        count("backtest_with_rebalancing.failed_rebalances")
         current_weights = pd.Series(dtype=float)
 
     # Main loop
-    for i in range(1, len(trading_dates)):
-        curr_date = trading_dates[i]
+    with span("backtest_with_rebalancing.loop", n_days=len(trading_dates)):
+        for i in range(1, len(trading_dates)):
+            curr_date = trading_dates[i]
+
+            # Rebalance
+            if (i - last_rebalance_idx) >= rebalance_freq:
+                rebalance_date = trading_dates[i - 1]
+                try:
+                    with span("backtest_with_rebalancing.weights"):
+                        full_weights = compute_combined_weights_fn(price_df, rebalance_date)
+                    current_weights = full_weights.loc[rebalance_date]
+                    last_rebalance_idx = i
+                    count("backtest_with_rebalancing.rebalances")
+                except Exception as e:
+                    print(f"[WARN] Failed rebalance at {rebalance_date.date()}: {e}")
+                    count("backtest_with_rebalancing.failed_rebalances")
+                    current_weights = pd.Series(dtype=float)
+
+            # Skip if weights are empty
+            if current_weights.empty:
+                print(f"[SKIP] No weights on {curr_date.date()}")
+                count("backtest_with_rebalancing.skipped_days")
+                portfolio_dates.append(curr_date)
+                portfolio_returns.append(0)
+                continue
 
-        # Rebalance
-        if (i - last_rebalance_idx) >= rebalance_freq:
-            rebalance_date = trading_dates[i - 1]
             try:
-                full_weights = compute_combined_weights_fn(price_df, rebalance_date)
-                current_weights = full_weights.loc[rebalance_date]
-                last_rebalance_idx = i
+                close_prev = price_df.loc[trading_dates[i - 1]].set_index('Symbol')['Close']
+                close_curr = price_df.loc[curr_date].set_index('Symbol')['Close']
+                asset_returns = (close_curr / close_prev - 1).reindex(current_weights.index).fillna(0)
+                port_return = (current_weights * asset_returns).sum()
             except Exception as e:
-                print(f"[WARN] Failed rebalance at {rebalance_date.date()}: {e}")
-                current_weights = pd.Series(dtype=float)
+                print(f"[ERROR] Return calc failed on {curr_date.date()}: {e}")
+                port_return = 0
+
+            if exposure is not None:
+                port_return *= exposure.get(curr_date, 1.0)
 
-        # Skip if weights are empty
-        if current_weights.empty:
-            print(f"[SKIP] No weights on {curr_date.date()}")
+            portfolio_value *= (1 + port_return)
+            portfolio_returns.append(port_return)
             portfolio_dates.append(curr_date)
-            portfolio_returns.append(0)
-            continue
-
-        try:
-            close_prev = price_df.loc[trading_dates[i - 1]].set_index('Symbol')['Close']
-            close_curr = price_df.loc[curr_date].set_index('Symbol')['Close']
-            asset_returns = (close_curr / close_prev - 1).reindex(current_weights.index).fillna(0)
-            port_return = (current_weights * asset_returns).sum()
-        except Exception as e:
-            print(f"[ERROR] Return calc failed on {curr_date.date()}: {e}")
-            port_return = 0
-
-        portfolio_value *= (1 + port_return)
-        portfolio_returns.append(port_return)
-        portfolio_dates.append(curr_date)
 
     # Final performance DF
     performance_df = pd.DataFrame({
@@ -154,6 +173,68 @@ def backtest_with_rebalancing(price_df, compute_combined_weights_fn, rebalance_f
     performance_df.set_index('Date', inplace=True)
 
     if plot_progress:
+        from reports.plotting import plot_performance  # matplotlib only when plotting
         plot_performance(performance_df['Daily Return'])
 
     return performance_df
+
+
+@instrumented("backtest_rebalanced_panel")
+def backtest_rebalanced_panel(price_df, weights, rebalance_freq=1, capital=100000, start_date=None, exposure=None,
+                              lag=0, fill="close"):
+    """
+    backtest_with_rebalancing for a precomputed weights panel (e.g. signals masked by
+    volatility_eligibility / sharpe_selection_mask), without a per-day Python loop.
+
+    The schedule is the same: weights of the first trading date are held, and once
+    rebalance_freq days have passed since the last rebalance the previous day's row
+    replaces them. A date missing from `weights` is a failed rebalance (no position,
+    retried the next day). The schedule comes from kernels.rebalance_hold_index and
+    the returns from backtest.fills.fill_returns, so rebalances can also be executed
+    with a lag and/or at the next open / VWAP proxy.
+
+    Args:
+        price_df (DataFrame): Long format with Date index (or column), 'Symbol' and 'Close'.
+        weights (DataFrame): index=Date, columns=Symbols; row d holds the weights decided at d's close.
+        rebalance_freq (int): Days between rebalances.
+        capital (float): Initial portfolio value.
+        start_date (str or datetime or None): First trading date (earlier dates get 0 returns).
+        exposure (Series or None): Multiplier of each day's return, indexed by Date.
+        lag (int): Trading days between a rebalance decision and its execution.
+        fill (str): 'close', 'next_open' or 'vwap' (see backtest.fills).
+
+    Returns:
+        pd.DataFrame: Same columns as backtest_with_rebalancing
+                      ('Daily Return', 'Cumulative Return', 'Portfolio Value'), index=Date.
+    """
+    if price_df.index.name == 'Date':
+        price_df = price_df.reset_index()
+    price_df = price_df.assign(Date=pd.to_datetime(price_df['Date']))
+    all_dates = pd.DatetimeIndex(np.sort(price_df['Date'].unique()))
+    first = 0 if start_date is None else all_dates.searchsorted(pd.to_datetime(start_date))
+    trading_dates = all_dates[first:]
+    if len(trading_dates) == 0:
+        raise ValueError("No trading dates available on or after start_date")
+
+    panels = ohlc_panels(price_df, symbols=weights.columns, dates=trading_dates)
+    W = weights.reindex(trading_dates).to_numpy(dtype=float, copy=True)
+    W[np.isnan(W)] = 0.0
+    held = kernels.rebalance_hold_index(trading_dates.isin(weights.index), rebalance_freq)
+    active = held >= 0
+    # Row d = portfolio targeted at d's close, i.e. the row held for the return into d + 1
+    targets = np.zeros_like(W)
+    targets[:-1][active[1:]] = W[held[1:][active[1:]]]
+    daily = np.zeros(len(trading_dates))
+    if len(trading_dates) > 1:
+        daily[1:] = fill_returns(panels, targets, lag=lag, fill=fill)
+    count("backtest_rebalanced_panel.skipped_days", int((~active[1:]).sum()))
+
+    daily = pd.Series(daily[1:], index=trading_dates[1:])
+    if exposure is not None:
+        daily = daily * exposure.reindex(daily.index).fillna(1.0)
+    daily = pd.concat([pd.Series(0.0, index=all_dates[:first]), daily])
+
+    performance_df = pd.DataFrame({'Daily Return': daily.to_numpy()}, index=pd.Index(daily.index, name='Date'))
+    performance_df['Cumulative Return'] = (1 + performance_df['Daily Return']).cumprod() - 1
+    performance_df['Portfolio Value'] = capital * (1 + performance_df['Cumulative Return'])
+    return performance_df
@@ -0,0 +1,235 @@
+"""
+Turnover and transaction costs for weight backtests.
+
+Weights row d is the portfolio targeted at d's close (executed `lag` days later).
+Between closes the held weights drift with the asset returns, so the trade at a
+close is the target minus the drifted holdings. Each trade pays, as a fraction of
+portfolio value,
+
+    commission  |dw| * commission_bps / 1e4
+    spread      |dw| * spread_bps / 2 / 1e4            (half the quoted spread)
+    impact      |dw| * impact_coef * vol * sqrt(|dw| * capital / ADV)
+
+with ADV the average daily dollar volume (Close * Volume) and vol the daily return
+volatility over the last adv_window days, both known at the trade's close. All
+dates are computed at once over the aligned panel, for a (dates x symbols) weights
+matrix or a (strategies x dates x symbols) stack.
+
+With a no-trade band the holdings are path dependent (whether an asset trades
+depends on where it drifted to since its last trade); that state runs in
+kernels.no_trade_band, one loop over dates on the configured kernel backend.
+"""
+import numpy as np
+import pandas as pd
+
+from backtest.fills import ohlc_panels, _held
+from config import get_config
+from kernels import kernels
+from profiling.instrumentation import instrumented, span, count
+
+__all__ = [
+    "close_returns",
+    "liquidity_panels",
+    "drift_trades",
+    "trading_costs",
+    "cost_returns",
+    "backtest_with_costs",
+]
+
+COST_COLUMNS = ("Turnover", "Commission", "Spread", "Impact", "Cost")
+
+
+def close_returns(panels):
+    """(dates x symbols) close-to-close returns, 0 on the first row and where missing."""
+    C = panels["Close"]
+    R = np.zeros_like(C)
+    R[1:] = C[1:] / C[:-1] - 1
+    R[np.isnan(R)] = 0.0
+    return R
+
+
+def liquidity_panels(panels, window=None):
+    """
+    Average daily dollar volume and daily return volatility through each date.
+
+    Args:
+        panels (dict): From backtest.fills.ohlc_panels, with 'Close' and 'Volume'.
+        window (int or None): Days in the trailing window (None = configured costs.adv_window).
+
+    Returns:
+        dict: 'adv' and 'vol', (dates x symbols) arrays, NaN until data is available.
+    """
+    if "Volume" not in panels:
+        raise ValueError("Impact costs need a 'Volume' column in the price data")
+    window = window or get_config().costs.adv_window
+    close = pd.DataFrame(panels["Close"])
+    dollar_volume = close * pd.DataFrame(panels["Volume"])
+    adv = dollar_volume.rolling(window, min_periods=1).mean()
+    vol = close.pct_change(fill_method=None).rolling(window, min_periods=2).std()
+    return {"adv": adv.to_numpy(), "vol": vol.to_numpy()}
+
+
+def drift_trades(weights, returns):
+    """
+    Trades that take the drifted holdings to each row of weights.
+
+    Args:
+        weights (ndarray): (..., dates, symbols) weights held after each close.
+        returns (ndarray): (dates, symbols) close-to-close returns (row 0 ignored).
+
+    Returns:
+        ndarray: Same shape as weights; row 0 is the initial purchase.
+    """
+    prev = weights[..., :-1, :]
+    R = returns[1:]
+    growth = 1.0 + np.einsum('...ij,ij->...i', prev, R)[..., None]
+    drifted = np.where(growth > 0, prev * (1.0 + R) / np.where(growth > 0, growth, 1.0), prev)
+    trades = weights.copy()
+    trades[..., 1:, :] -= drifted
+    return trades
+
+
+def trading_costs(trades, liquidity=None, commission_bps=None, spread_bps=None, impact_coef=None, capital=None):
+    """
+    Per-date turnover and cost components of a trades array.
+
+    Args:
+        trades (ndarray): (..., dates, symbols) weight changes.
+        liquidity (dict or None): From liquidity_panels (needed when impact_coef > 0).
+        commission_bps, spread_bps, impact_coef, capital (float or None): Cost model
+            (None = configured costs.*). spread_bps may also be a (dates x symbols) array.
+
+    Returns:
+        dict: 'Turnover', 'Commission', 'Spread', 'Impact' and 'Cost' (their sum),
+              arrays of shape (..., dates) as fractions of portfolio value.
+    """
+    cfg = get_config().costs
+    commission_bps = cfg.commission_bps if commission_bps is None else commission_bps
+    spread_bps = cfg.spread_bps if spread_bps is None else spread_bps
+    impact_coef = cfg.impact_coef if impact_coef is None else impact_coef
+    capital = cfg.capital if capital is None else capital
+
+    traded = np.abs(trades)
+    out = {
+        "Turnover": traded.sum(axis=-1),
+        "Commission": traded.sum(axis=-1) * commission_bps / 1e4,
+        "Spread": (traded * (np.asarray(spread_bps, dtype=float) / 2e4)).sum(axis=-1),
+    }
+    if impact_coef > 0:
+        if liquidity is None:
+            raise ValueError("impact_coef > 0 needs liquidity panels (see liquidity_panels)")
+        adv, vol = liquidity["adv"], liquidity["vol"]
+        known = (adv > 0) & np.isfinite(vol)
+        count("costs.missing_liquidity", int(((traded > 0) & ~known).sum()))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            impact = impact_coef * np.where(known, vol, 0.0) * traded * np.sqrt(
+                traded * capital / np.where(known, adv, np.inf))
+        out["Impact"] = impact.sum(axis=-1)
+    else:
+        out["Impact"] = np.zeros_like(out["Turnover"])
+    out["Cost"] = out["Commission"] + out["Spread"] + out["Impact"]
+    return out
+
+
+def cost_returns(panels, weights, lag=0, band=None, to_edge=False, allow_short=True, exposure=None,
+                 liquidity=None, backend=None, **cost_model):
+    """
+    Gross and net portfolio returns with turnover and costs, as array ops.
+
+    Weights row d is executed at the close of d + lag (lag=0 reproduces
+    backtest_close_to_close before costs). The trades at a close are charged to
+    that day's return; the initial purchase on the first date is charged to the
+    first return.
+
+    Args:
+        panels (dict): From backtest.fills.ohlc_panels ('Volume' needed for impact).
+        weights (ndarray): (dates x symbols) or (strategies x dates x symbols) target
+                           weights aligned with the panels; NaN = no position.
+        lag (int): Trading days between the decision and the execution close.
+        band (float or None): No-trade band half-width (None = configured costs.band, 0 = off).
+        to_edge (bool): With a band, trade to the band edge instead of the target.
+        allow_short (bool): If False, negative weights are set to zero.
+        exposure (ndarray or None): Multiplier of the position held into each of dates[1:].
+        liquidity (dict or None): Precomputed liquidity_panels (computed when needed).
+        backend (str or None): Kernel backend for the band loop (None = configured).
+        **cost_model: commission_bps, spread_bps, impact_coef, capital (see trading_costs).
+
+    Returns:
+        dict: 'Gross Return', 'Net Return' and the trading_costs components, arrays of
+              shape (..., n_dates - 1) for dates[1:]; 'held' is the executed holdings.
+    """
+    if lag < 0:
+        raise ValueError("lag must be >= 0")
+    C = panels["Close"]
+    W = np.nan_to_num(np.asarray(weights, dtype=float))
+    if W.shape[-2:] != C.shape:
+        raise ValueError(f"weights shape {W.shape} does not match the panel {C.shape}")
+    if not allow_short:
+        W = np.clip(W, 0, None)
+    band = get_config().costs.band if band is None else band
+
+    R = close_returns(panels)
+    targets = _held(W, lag)  # row t = target executed at t's close
+    if exposure is not None:
+        targets[..., :-1, :] *= np.asarray(exposure, dtype=float)[:, None]
+
+    with span("costs.returns", lag=lag, band=band):
+        if band > 0:
+            held, trades = kernels.no_trade_band(targets, R, band, to_edge=to_edge, backend=backend)
+        else:
+            held = targets
+            trades = drift_trades(held, R)
+
+        if liquidity is None and cost_model.get("impact_coef", get_config().costs.impact_coef) > 0:
+            liquidity = liquidity_panels(panels)
+        costs = trading_costs(trades, liquidity, **cost_model)
+
+    gross = np.einsum('...ij,ij->...i', held[..., :-1, :], R[1:])
+    out = {"Gross Return": gross}
+    for name in COST_COLUMNS:
+        per_date = costs[name][..., 1:].copy()
+        per_date[..., 0] += costs[name][..., 0]
+        out[name] = per_date
+    out["Net Return"] = gross - out["Cost"]
+    out["held"] = held
+    return out
+
+
+@instrumented("backtest_with_costs")
+def backtest_with_costs(price_df, combined_weights, lag=0, band=None, to_edge=False, allow_short=True,
+                        exposure=None, **cost_model):
+    """
+    backtest_close_to_close net of commissions, spread and square-root impact.
+
+    Args:
+        price_df (DataFrame): Long format with Date index or column, 'Symbol', 'Close'
+                              and 'Volume' (for impact).
+        combined_weights (DataFrame): Wide format, index=Date, columns=Symbols, daily target weights.
+        lag (int): Trading days between the decision and the execution close.
+        band (float or None): No-trade band half-width (None = configured costs.band, 0 = off).
+        to_edge (bool): With a band, trade to the band edge instead of the target.
+        allow_short (bool): If False, negative weights are set to zero.
+        exposure (Series or None): Multiplier of each day's position, indexed by Date.
+        **cost_model: commission_bps, spread_bps, impact_coef, capital (None = configured).
+
+    Returns:
+        pd.DataFrame: index=Date (dates[1:]) with 'Gross Return', 'Turnover', 'Commission',
+                      'Spread', 'Impact', 'Cost' and 'Net Return'.
+    """
+    tickers = combined_weights.columns
+    if price_df.index.name == 'Date':
+        price_df = price_df.reset_index()
+    price_df = price_df[price_df['Symbol'].isin(tickers)]
+
+    all_dates = sorted(set(price_df['Date'].drop_duplicates()) & set(combined_weights.index))
+    if len(all_dates) < 2:
+        return pd.DataFrame(columns=["Gross Return", *COST_COLUMNS, "Net Return"], dtype=float)
+
+    panels = ohlc_panels(price_df, symbols=tickers, dates=all_dates)
+    weights = combined_weights.loc[all_dates].to_numpy(dtype=float)
+    if exposure is not None:
+        exposure = exposure.reindex(all_dates[1:]).fillna(1.0).to_numpy()
+    result = cost_returns(panels, weights, lag=lag, band=band, to_edge=to_edge, allow_short=allow_short,
+                          exposure=exposure, **cost_model)
+    columns = ["Gross Return", *COST_COLUMNS, "Net Return"]
+    return pd.DataFrame({c: result[c] for c in columns}, index=pd.Index(all_dates[1:], name='Date'))
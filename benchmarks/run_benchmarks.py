@@ -0,0 +1,479 @@
+"""
+Benchmark suite for the AFROS pipeline on synthetic data.
+
+Usage:
+    python -m benchmarks.run_benchmarks --sizes 50 500 5000 --out benchmarks/results/current.json
+    python -m benchmarks.run_benchmarks --compare benchmarks/results/baseline.json benchmarks/results/current.json
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic_data import generate_synthetic_ohlcv, write_synthetic_csvs
+
+DEFAULT_SIZES = (50, 500, 5000)
+OPTIMIZER_WINDOW = 60
+OPTIMIZER_WINDOWS = 20
+
+# Cold-start budget for `import main` (seconds, excluding interpreter startup) and
+# modules that must not be imported just by loading the pipeline entry point.
+STARTUP_BUDGET_S = 1.0
+HEAVY_MODULES = ("riskfolio", "scipy.optimize", "scipy.stats", "matplotlib.pyplot", "pandas_market_calendars", "numba")
+
+BENCHMARKS = {}
+
+
+def benchmark(name, group, max_symbols=None):
+    """
+    Register a benchmark. The decorated function receives the prepared data dict
+    and returns a zero-argument callable; only that callable is timed.
+
+    Args:
+        name (str): Benchmark name.
+        group (str): Group used for --only filtering (loading, filters, signals, optimizers, backtest, risk,
+                     kernels).
+        max_symbols (int or None): Sizes above this are skipped unless --no-limits is given
+                                   (used for solvers whose cost explodes with universe size).
+    """
+    def decorator(fn):
+        BENCHMARKS[name] = {"fn": fn, "group": group, "max_symbols": max_symbols}
+        return fn
+    return decorator
+
+
+# ---------------------------------------------------------------------- #
+# Data preparation
+# ---------------------------------------------------------------------- #
+def prepare_data(n_symbols, n_dates, seed=0, gap_rate=0.0):
+    df = generate_synthetic_ohlcv(
+        n_symbols=n_symbols, n_dates=n_dates, gap_rate=gap_rate, seed=seed,
+        asset_types={"Stock": 0.8, "Bond": 0.1, "Commodity": 0.1},
+    )
+    opt_dates = np.sort(df["Date"].unique())[-(OPTIMIZER_WINDOW + OPTIMIZER_WINDOWS + 1):]
+    return {
+        "n_symbols": n_symbols,
+        "n_dates": n_dates,
+        "seed": seed,
+        "gap_rate": gap_rate,
+        "df": df,
+        "opt_df": df[df["Date"].isin(opt_dates)].reset_index(drop=True),
+    }
+
+
+def _long_only_weights(df):
+    from optimize.optimisation import inverse_volatility_weights
+    from strategy.strategy import ewma_momentum_signals
+
+    _, signals = ewma_momentum_signals(df, span=60, threshold=0.0005, min_days_above_thresh=5)
+    weights = signals.clip(lower=0) * inverse_volatility_weights(df)
+    return weights.div(weights.sum(axis=1).replace(0, np.nan), axis=0).fillna(0)
+
+
+# ---------------------------------------------------------------------- #
+# Benchmarks
+# ---------------------------------------------------------------------- #
+@benchmark("load_price_data", "loading")
+def bench_load_price_data(data):
+    from data_loading.data_loading import load_price_data
+
+    tmp_dir = tempfile.mkdtemp(prefix="afros_bench_")
+    paths = write_synthetic_csvs(
+        tmp_dir, n_symbols=data["n_symbols"], n_dates=data["n_dates"], seed=data["seed"], gap_rate=data["gap_rate"]
+    )
+    return lambda: load_price_data(start_date="1990-01-01", end_date=None, path=str(paths["Stock"]), merge=False)
+
+
+@benchmark("filter_by_var", "filters")
+def bench_filter_by_var(data):
+    from asset_selection.selection_functions import filter_by_var
+    return lambda: filter_by_var(data["df"])
+
+
+@benchmark("filter_by_volatility", "filters")
+def bench_filter_by_volatility(data):
+    from asset_selection.selection_functions import filter_by_volatility
+    return lambda: filter_by_volatility(data["df"])
+
+
+@benchmark("filter_by_correlation", "filters")
+def bench_filter_by_correlation(data):
+    from asset_selection.selection_functions import filter_by_correlation
+    return lambda: filter_by_correlation(data["df"], corr_threshold=0.3)
+
+
+@benchmark("select_assets_by_sharpe", "filters")
+def bench_select_assets_by_sharpe(data):
+    from asset_selection.selection_functions import select_assets_by_sharpe
+    return lambda: select_assets_by_sharpe(data["df"], top_n=20)
+
+
+@benchmark("rolling_sharpe_panel", "filters")
+def bench_rolling_sharpe_panel(data):
+    from asset_selection.selection_functions import rolling_sharpe_panel, sharpe_selection_mask
+    return lambda: sharpe_selection_mask(rolling_sharpe_panel(data["df"], window=60), top_n=20)
+
+
+@benchmark("ewma_momentum_signals", "signals")
+def bench_ewma_momentum_signals(data):
+    from strategy.strategy import ewma_momentum_signals
+    return lambda: ewma_momentum_signals(data["df"], span=60, threshold=0.002, min_days_above_thresh=5)
+
+
+@benchmark("inverse_volatility_weights", "optimizers")
+def bench_inverse_volatility_weights(data):
+    from optimize.optimisation import inverse_volatility_weights
+    return lambda: inverse_volatility_weights(data["df"], lookback=OPTIMIZER_WINDOW)
+
+
+@benchmark("scale_to_target_volatility", "optimizers")
+def bench_scale_to_target_volatility(data):
+    from optimize.optimisation import inverse_volatility_weights, scale_to_target_volatility
+    weights = inverse_volatility_weights(data["df"], lookback=OPTIMIZER_WINDOW).fillna(0)
+    return lambda: scale_to_target_volatility(weights, data["df"].set_index("Date"), target_vol=0.10)
+
+
+@benchmark("construct_kelly_portfolio", "optimizers", max_symbols=1000)
+def bench_construct_kelly_portfolio(data):
+    from optimize.optimisation import construct_kelly_portfolio
+    return lambda: construct_kelly_portfolio(data["opt_df"].set_index("Date"), window=OPTIMIZER_WINDOW)
+
+
+@benchmark("risk_parity", "optimizers", max_symbols=500)
+def bench_risk_parity(data):
+    from optimize.optimisation import risk_parity
+    return lambda: risk_parity(data["opt_df"].set_index("Date"), window=OPTIMIZER_WINDOW, rolling=True)
+
+
+@benchmark("hierarchical_risk_parity", "optimizers")
+def bench_hierarchical_risk_parity(data):
+    from optimize.hrp import hierarchical_risk_parity
+    return lambda: hierarchical_risk_parity(data["opt_df"], window=OPTIMIZER_WINDOW, rolling=True)
+
+
+@benchmark("rolling_max_sharpe", "optimizers", max_symbols=50)
+def bench_rolling_max_sharpe(data):
+    from optimize.optimisation import rolling_max_sharpe
+    return lambda: rolling_max_sharpe(data["opt_df"], window=OPTIMIZER_WINDOW)
+
+
+@benchmark("rolling_frontier_max_sharpe", "optimizers")
+def bench_rolling_frontier_max_sharpe(data):
+    from optimize.frontier import rolling_frontier_max_sharpe
+    return lambda: rolling_frontier_max_sharpe(data["opt_df"], window=OPTIMIZER_WINDOW, shrinkage="ledoit_wolf")
+
+
+@benchmark("rolling_efficient_frontier", "optimizers")
+def bench_rolling_efficient_frontier(data):
+    from optimize.frontier import rolling_efficient_frontier
+    return lambda: rolling_efficient_frontier(data["opt_df"], window=OPTIMIZER_WINDOW, n_points=20,
+                                              shrinkage="ledoit_wolf")
+
+
+@benchmark("backtest_close_to_close", "backtest")
+def bench_backtest_close_to_close(data):
+    from backtest.backtest import backtest_close_to_close
+    weights = _long_only_weights(data["df"])
+    return lambda: backtest_close_to_close(data["df"], weights)
+
+
+@benchmark("backtest_close_to_close_sparse", "backtest")
+def bench_backtest_close_to_close_sparse(data):
+    from backtest.backtest import backtest_close_to_close
+    from functions.sparse_weights import SparseWeights
+    weights = SparseWeights.from_frame(_long_only_weights(data["df"]))
+    return lambda: backtest_close_to_close(data["df"], weights)
+
+
+@benchmark("backtest_with_rebalancing", "backtest")
+def bench_backtest_with_rebalancing(data):
+    from backtest.backtest import backtest_with_rebalancing
+    weights = _long_only_weights(data["df"])
+    price_df = data["df"].set_index("Date")
+    return lambda: backtest_with_rebalancing(price_df, lambda _, date: weights.loc[:date], rebalance_freq=5)
+
+
+@benchmark("backtest_rebalanced_panel", "backtest")
+def bench_backtest_rebalanced_panel(data):
+    from backtest.backtest import backtest_rebalanced_panel
+    weights = _long_only_weights(data["df"])
+    price_df = data["df"].set_index("Date")
+    return lambda: backtest_rebalanced_panel(price_df, weights, rebalance_freq=5)
+
+
+@benchmark("backtest_with_fills", "backtest")
+def bench_backtest_with_fills(data):
+    from backtest.fills import backtest_with_fills
+    weights = _long_only_weights(data["df"])
+    price_df = data["df"].set_index("Date")
+    return lambda: backtest_with_fills(price_df, weights, lag=1, fill="next_open")
+
+
+@benchmark("backtest_with_costs", "backtest")
+def bench_backtest_with_costs(data):
+    from backtest.costs import backtest_with_costs
+    weights = _long_only_weights(data["df"])
+    price_df = data["df"].set_index("Date")
+    return lambda: backtest_with_costs(price_df, weights, band=0.01)
+
+
+@benchmark("monte_carlo_scenarios", "risk")
+def bench_monte_carlo_scenarios(data):
+    from risk_management.scenarios import monte_carlo_scenarios
+    from risk_management.var_engine import returns_panel
+    returns = returns_panel(data["df"])
+    weights = pd.Series(1.0 / returns.shape[1], index=returns.columns)
+    return lambda: monte_carlo_scenarios(returns, weights, n_paths=20_000, horizon=252, method="bootstrap",
+                                         stop_limits=(-0.10, -0.20), seed=0)
+
+
+def _kernel_inputs(data):
+    closes = data["df"].pivot(index="Date", columns="Symbol", values="Close")
+    returns = np.log(closes / closes.shift(1)).to_numpy()
+    strategy = np.nan_to_num(returns).mean(axis=1)
+    kelly = np.clip(np.abs(strategy) * 50, 0, 1)
+    held = np.isfinite(returns)
+    targets = held / np.maximum(held.sum(axis=1, keepdims=True), 1)
+    return {
+        "ewma": lambda k: k.ewma(returns, 2.0 / 61.0),
+        "rolling_count": lambda k: k.rolling_count(returns > 0.002, 60),
+        "drawdown_recovery": lambda k: k.drawdown_recovery(np.cumprod(1 + strategy)),
+        "drawdown_stop_path": lambda k: k.drawdown_stop_path(strategy, kelly, -0.10 * (1 - 0.5 * kelly), 0.05, 1, True),
+        "rebalance_hold_index": lambda k: k.rebalance_hold_index(np.isfinite(returns[:, 0]), 5),
+        "no_trade_band": lambda k: k.no_trade_band(targets[None], np.nan_to_num(returns), 0.01, False),
+    }
+
+
+def _register_kernel_benchmark(kernel, backend):
+    def bench(data):
+        if backend == "fast":
+            from kernels import fast as module  # ImportError without numba -> skipped
+        else:
+            from kernels import reference as module
+        call = _kernel_inputs(data)[kernel]
+        call(module)  # compile (fast) / warm up outside the timing
+        return lambda: call(module)
+    benchmark(f"kernel_{kernel}[{backend}]", "kernels")(bench)
+
+
+for _kernel in ("ewma", "rolling_count", "drawdown_recovery", "drawdown_stop_path", "rebalance_hold_index",
+                "no_trade_band"):
+    for _backend in ("reference", "fast"):
+        _register_kernel_benchmark(_kernel, _backend)
+
+
+# ---------------------------------------------------------------------- #
+# Startup
+# ---------------------------------------------------------------------- #
+_STARTUP_SCRIPT = (
+    "import json, sys, time\n"
+    "t = time.perf_counter()\n"
+    "import {module}\n"
+    "elapsed = time.perf_counter() - t\n"
+    "heavy = [m for m in {heavy!r} if m in sys.modules]\n"
+    "print(json.dumps({{'import_s': elapsed, 'heavy_modules': heavy}}))\n"
+)
+
+
+def measure_startup(module="main", repeats=5, budget_s=STARTUP_BUDGET_S):
+    """
+    Time a cold `import <module>` in fresh interpreters and list heavy backends it pulled in.
+
+    Args:
+        module (str): Module to import.
+        repeats (int): Fresh interpreters to start (min and median are reported).
+        budget_s (float): Import-time budget; exceeding it marks the record 'over_budget'.
+
+    Returns:
+        dict: Result record in the same shape as the other benchmarks.
+    """
+    script = _STARTUP_SCRIPT.format(module=module, heavy=HEAVY_MODULES)
+    import_times, wall_times, heavy = [], [], []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        out = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True)
+        wall_times.append(time.perf_counter() - start)
+        if out.returncode != 0:
+            return {"name": f"startup_import_{module}", "group": "startup", "status": "error",
+                    "reason": out.stderr.strip().splitlines()[-1] if out.stderr else "import failed"}
+        payload = json.loads(out.stdout.strip().splitlines()[-1])
+        import_times.append(payload["import_s"])
+        heavy = payload["heavy_modules"]
+
+    min_s = min(import_times)
+    return {
+        "name": f"startup_import_{module}",
+        "group": "startup",
+        "status": "ok" if min_s <= budget_s and not heavy else "over_budget",
+        "min_s": min_s,
+        "median_s": float(np.median(import_times)),
+        "wall_min_s": min(wall_times),
+        "budget_s": budget_s,
+        "heavy_modules": heavy,
+        "repeats": repeats,
+    }
+
+
+# ---------------------------------------------------------------------- #
+# Runner
+# ---------------------------------------------------------------------- #
+def _time_callable(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except Exception:
+        return None
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, n_dates=504, repeats=3, only=None, no_limits=False, gap_rate=0.0, seed=0):
+    """
+    Run the registered benchmarks for every universe size.
+
+    Args:
+        sizes (iterable): Numbers of symbols.
+        n_dates (int): Number of dates in the synthetic history.
+        repeats (int): Timed repetitions per benchmark (min and median are reported).
+        only (list or None): Benchmark names or groups to run ('startup' for the import-time check,
+                             'kernels' includes the backend equivalence check).
+        no_limits (bool): Ignore per-benchmark max_symbols caps.
+        gap_rate (float): Missing-row probability of the synthetic data.
+        seed (int): Data seed.
+
+    Returns:
+        dict: {'meta': {...}, 'results': [...]} ready to be dumped as JSON.
+    """
+    selected = {
+        name: spec for name, spec in BENCHMARKS.items()
+        if not only or name in only or spec["group"] in only
+    }
+
+    results = []
+    if not only or "startup" in only:
+        record = measure_startup()
+        results.append(record)
+        print(f"{record['name']:<30} {record.get('min_s', float('nan')):.4f}s "
+              f"(budget {STARTUP_BUDGET_S}s) {record['status']} {record.get('heavy_modules', '')}")
+
+    if not only or "kernels" in only:
+        from kernels.kernels import check_kernels
+        ok, report = check_kernels()
+        results.append({"name": "check_kernels", "group": "kernels", "status": "ok" if ok else "mismatch",
+                        "report": report})
+        print(f"{'check_kernels':<30} {'ok' if ok else 'MISMATCH'} backends={sorted(report)}")
+
+    for n_symbols in sizes:
+        data = prepare_data(n_symbols, n_dates, seed=seed, gap_rate=gap_rate)
+        for name, spec in selected.items():
+            record = {"name": name, "group": spec["group"], "n_symbols": n_symbols, "n_dates": n_dates}
+            if spec["max_symbols"] is not None and n_symbols > spec["max_symbols"] and not no_limits:
+                record.update(status="skipped", reason=f"above max_symbols={spec['max_symbols']}")
+            else:
+                try:
+                    fn = spec["fn"](data)
+                    timings = _time_callable(fn, repeats)
+                    record.update(status="ok", min_s=min(timings), median_s=float(np.median(timings)), repeats=repeats)
+                except ImportError as e:
+                    record.update(status="skipped", reason=f"missing dependency: {e}")
+                except Exception as e:
+                    record.update(status="error", reason=f"{type(e).__name__}: {e}")
+            results.append(record)
+            timing = f"{record['min_s']:.4f}s" if record["status"] == "ok" else record["status"]
+            print(f"{name:<30} n={n_symbols:<6} {timing}")
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "sizes": list(sizes),
+            "n_dates": n_dates,
+            "repeats": repeats,
+            "seed": seed,
+            "gap_rate": gap_rate,
+        },
+        "results": results,
+    }
+
+
+def save_results(results, path):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    return path.resolve()
+
+
+def compare_results(baseline_path, current_path, tolerance=0.10):
+    """
+    Compare two result files on min_s.
+
+    Args:
+        baseline_path (str): Earlier results JSON.
+        current_path (str): Newer results JSON.
+        tolerance (float): Relative slowdown above which a benchmark is flagged.
+
+    Returns:
+        pd.DataFrame: One row per (name, n_symbols) present in both with the ratio current / baseline.
+    """
+    def load(path):
+        rows = json.loads(Path(path).read_text(encoding="utf-8"))["results"]
+        df = pd.DataFrame([dict(r, n_symbols=r.get("n_symbols", 0)) for r in rows if "min_s" in r])
+        if df.empty:
+            return pd.DataFrame(columns=["name", "n_symbols", "min_s"]).set_index(["name", "n_symbols"])
+        return df.set_index(["name", "n_symbols"])[["min_s"]]
+
+    merged = load(baseline_path).join(load(current_path), lsuffix="_baseline", rsuffix="_current", how="inner")
+    merged["ratio"] = merged["min_s_current"] / merged["min_s_baseline"]
+    merged["regression"] = merged["ratio"] > 1 + tolerance
+    return merged.sort_values("ratio", ascending=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="AFROS benchmark suite on synthetic data")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--n-dates", type=int, default=504)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--only", nargs="+", default=None, help="benchmark names or groups")
+    parser.add_argument("--no-limits", action="store_true", help="ignore per-benchmark max_symbols caps")
+    parser.add_argument("--gap-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="results JSON path (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"), help="compare two result files and exit")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        table = compare_results(*args.compare, tolerance=args.tolerance)
+        print(table.to_string(float_format=lambda x: f"{x:.4f}"))
+        return 1 if table["regression"].any() else 0
+
+    results = run_benchmarks(
+        sizes=args.sizes, n_dates=args.n_dates, repeats=args.repeats, only=args.only,
+        no_limits=args.no_limits, gap_rate=args.gap_rate, seed=args.seed,
+    )
+    out = args.out or f"benchmarks/results/{results['meta']['commit'] or 'local'}.json"
+    print(f"Saved benchmark results to: {save_results(results, out)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
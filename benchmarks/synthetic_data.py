@@ -0,0 +1,126 @@
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+# Annualized drift / volatility ranges per asset type
+ASSET_TYPE_PARAMS = {
+    "Stock": {"drift": (0.00, 0.15), "vol": (0.15, 0.45), "beta": (0.6, 1.4)},
+    "Bond": {"drift": (0.00, 0.04), "vol": (0.03, 0.12), "beta": (-0.3, 0.2)},
+    "Commodity": {"drift": (-0.05, 0.08), "vol": (0.15, 0.40), "beta": (-0.2, 0.6)},
+}
+
+# File names used by load_price_data for each asset type
+ASSET_TYPE_FILES = {
+    "Stock": "master_stock_data.csv",
+    "Bond": "master_bond_etf_data.csv",
+    "Commodity": "master_commodity_etf_data.csv",
+}
+
+
+def generate_synthetic_ohlcv(
+    n_symbols=50,
+    n_dates=504,
+    start_date="2020-01-01",
+    asset_types=None,
+    gap_rate=0.0,
+    seed=0,
+    freq="B",
+):
+    """
+    Generate a deterministic long-format OHLCV panel shaped like the master CSVs.
+
+    Close prices follow a one-factor geometric random walk (market factor plus
+    idiosyncratic noise), so correlation-, volatility- and VaR-based filters see
+    realistic cross-sectional dispersion. The same arguments always give the same data.
+
+    Args:
+        n_symbols (int): Number of symbols.
+        n_dates (int): Number of periods.
+        start_date (str): First date.
+        asset_types (dict or None): Asset type -> share of symbols, e.g. {'Stock': 0.8, 'Bond': 0.2}.
+                                    Defaults to all stocks.
+        gap_rate (float): Probability that any (date, symbol) row is missing.
+        seed (int): Random seed.
+        freq (str): Pandas date frequency of the rows.
+
+    Returns:
+        pd.DataFrame: Columns ['Date', 'Open', 'High', 'Low', 'Close', 'Volume', 'Symbol', 'AssetType'],
+                      sorted by Date then Symbol.
+    """
+    rng = np.random.default_rng(seed)
+    asset_types = asset_types or {"Stock": 1.0}
+    unknown = set(asset_types) - set(ASSET_TYPE_PARAMS)
+    if unknown:
+        raise ValueError(f"Unknown asset types: {sorted(unknown)}")
+
+    # Assign symbols to types by share
+    shares = np.array(list(asset_types.values()), dtype=float)
+    counts = np.floor(shares / shares.sum() * n_symbols).astype(int)
+    counts[0] += n_symbols - counts.sum()
+    types = np.repeat(list(asset_types.keys()), counts)
+
+    dates = pd.date_range(start=start_date, periods=n_dates, freq=freq)
+    symbols = np.array([f"SYN{i:05d}" for i in range(n_symbols)])
+
+    drift = np.empty(n_symbols)
+    vol = np.empty(n_symbols)
+    beta = np.empty(n_symbols)
+    for asset_type, params in ASSET_TYPE_PARAMS.items():
+        mask = types == asset_type
+        k = mask.sum()
+        drift[mask] = rng.uniform(*params["drift"], size=k)
+        vol[mask] = rng.uniform(*params["vol"], size=k)
+        beta[mask] = rng.uniform(*params["beta"], size=k)
+
+    dt = 1 / 252
+    market = rng.normal(0.0, 0.18 * np.sqrt(dt), size=(n_dates, 1))
+    idio_vol = np.sqrt(np.maximum(vol ** 2 - (beta * 0.18) ** 2, (0.2 * vol) ** 2))
+    log_ret = (drift - 0.5 * vol ** 2) * dt + beta * market + rng.normal(size=(n_dates, n_symbols)) * idio_vol * np.sqrt(dt)
+    log_ret[0] = 0.0
+
+    close = rng.uniform(20, 300, size=n_symbols) * np.exp(np.cumsum(log_ret, axis=0))
+    prev_close = np.vstack([close[:1], close[:-1]])
+    open_ = prev_close * np.exp(rng.normal(0, 0.25, size=close.shape) * vol * np.sqrt(dt))
+    spread = np.abs(rng.normal(0, 0.5, size=close.shape)) * vol * np.sqrt(dt)
+    high = np.maximum(open_, close) * (1 + spread)
+    low = np.minimum(open_, close) * (1 - spread)
+    volume = rng.lognormal(mean=13, sigma=1, size=close.shape).round()
+
+    df = pd.DataFrame({
+        "Date": np.repeat(dates.values, n_symbols),
+        "Open": open_.ravel(),
+        "High": high.ravel(),
+        "Low": low.ravel(),
+        "Close": close.ravel(),
+        "Volume": volume.ravel(),
+        "Symbol": np.tile(symbols, n_dates),
+        "AssetType": np.tile(types, n_dates),
+    })
+
+    if gap_rate > 0:
+        df = df[rng.random(len(df)) >= gap_rate].reset_index(drop=True)
+
+    return df
+
+
+def write_synthetic_csvs(out_dir, **kwargs):
+    """
+    Write generated data as per-asset-type master CSVs (same layout as data/).
+
+    Args:
+        out_dir (str or Path): Target directory.
+        **kwargs: Passed to generate_synthetic_ohlcv.
+
+    Returns:
+        dict: Asset type -> written CSV path.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    df = generate_synthetic_ohlcv(**kwargs)
+
+    paths = {}
+    for asset_type, group in df.groupby("AssetType"):
+        path = out_dir / ASSET_TYPE_FILES[asset_type]
+        group.drop(columns="AssetType").to_csv(path, index=False)
+        paths[asset_type] = path
+    return paths
@@ -0,0 +1,292 @@
+"""
+Run-profile configuration.
+
+Settings are grouped in typed dataclasses and resolved in this order:
+built-in defaults < config file < environment variables. The file is TOML
+(.toml) or JSON (.json), given explicitly or via AFROS_CONFIG, with one table
+per section:
+
+    [compute]
+    backend = "fast"
+    precision = "float32"
+    n_jobs = 8
+
+    [data]
+    stock_path = "/srv/prices/master_stock_data.csv"
+
+Any field can be overridden from the environment as AFROS_<SECTION>_<FIELD>,
+e.g. AFROS_COMPUTE_N_JOBS=4 or AFROS_COMPUTE_MEMORY_BUDGET=2GB. Modules read the
+active configuration through get_config().
+"""
+import json
+import os
+from dataclasses import dataclass, field, fields, asdict, replace
+from pathlib import Path
+from typing import Optional
+
+__all__ = [
+    "ComputeConfig",
+    "CacheConfig",
+    "DataConfig",
+    "OptimizerConfig",
+    "StrategyConfig",
+    "CostConfig",
+    "Config",
+    "load_config",
+    "get_config",
+    "set_config",
+    "reset_config",
+    "resolve_n_jobs",
+    "cache_dir",
+    "enforce_cache_limit",
+]
+
+ENV_PREFIX = "AFROS_"
+
+
+@dataclass
+class ComputeConfig:
+    backend: str = "reference"            # "reference" (numpy) or "fast" (compiled kernels when available)
+    precision: str = "float64"            # "float64" or "float32" for large numeric panels
+    n_jobs: Optional[int] = None          # worker processes; None = os.cpu_count()
+    chunk_size: int = 64                  # dates per batched matrix product
+    memory_budget: int = 512 * 1024 ** 2  # bytes per out-of-core chunk
+
+
+@dataclass
+class CacheConfig:
+    directory: str = os.path.join(".cache", "afros")
+    max_bytes: int = 2 * 1024 ** 3
+
+
+@dataclass
+class DataConfig:
+    stock_path: str = os.path.join("data", "master_stock_data.csv")
+    bond_path: str = os.path.join("data", "master_bond_etf_data.csv")
+    commodity_path: str = os.path.join("data", "master_commodity_etf_data.csv")
+    start_date: str = "2020-01-01"
+
+
+@dataclass
+class OptimizerConfig:
+    risk_parity_backend: str = "riskfolio"  # "riskfolio" or "numpy"
+    hrp_linkage: str = "single"             # scipy linkage method for hierarchical risk parity
+    hrp_reuse_tol: float = 0.02             # mean |correlation change| below which the dendrogram is reused
+
+
+@dataclass
+class StrategyConfig:
+    var_confidence: float = 0.95
+    var_threshold: float = -0.05
+    var_lookback: int = 252
+    vol_window: int = 20
+    min_vol: float = 0.005
+    max_vol: float = 0.05
+    corr_threshold: float = 0.3
+    span: int = 60
+    threshold: float = 0.002
+    min_days_above_thresh: int = 5
+    lookback: int = 60
+
+
+@dataclass
+class CostConfig:
+    commission_bps: float = 1.0   # per unit of traded notional
+    spread_bps: float = 5.0       # full quoted spread; half is paid per trade
+    impact_coef: float = 0.1      # square-root impact: coef * daily vol * sqrt(traded $ / ADV)
+    adv_window: int = 20          # days in the average daily dollar volume and volatility
+    capital: float = 100000.0     # portfolio value used to size trades against ADV
+    band: float = 0.0             # no-trade band half-width in weight units (0 = always rebalance)
+
+
+@dataclass
+class Config:
+    compute: ComputeConfig = field(default_factory=ComputeConfig)
+    cache: CacheConfig = field(default_factory=CacheConfig)
+    data: DataConfig = field(default_factory=DataConfig)
+    optimizer: OptimizerConfig = field(default_factory=OptimizerConfig)
+    strategy: StrategyConfig = field(default_factory=StrategyConfig)
+    costs: CostConfig = field(default_factory=CostConfig)
+
+    def validate(self):
+        if self.compute.backend not in ("reference", "fast"):
+            raise ValueError(f"compute.backend must be 'reference' or 'fast', got {self.compute.backend!r}")
+        if self.compute.precision not in ("float64", "float32"):
+            raise ValueError(f"compute.precision must be 'float64' or 'float32', got {self.compute.precision!r}")
+        if self.compute.n_jobs is not None and self.compute.n_jobs < 1:
+            raise ValueError("compute.n_jobs must be >= 1 or None")
+        if self.compute.chunk_size < 1 or self.compute.memory_budget <= 0 or self.cache.max_bytes <= 0:
+            raise ValueError("chunk_size, memory_budget and cache.max_bytes must be positive")
+        if self.optimizer.risk_parity_backend not in ("riskfolio", "numpy"):
+            raise ValueError("optimizer.risk_parity_backend must be 'riskfolio' or 'numpy'")
+        if self.optimizer.hrp_linkage not in ("single", "complete", "average", "ward") or self.optimizer.hrp_reuse_tol < 0:
+            raise ValueError("optimizer.hrp_linkage must be a scipy linkage method and hrp_reuse_tol >= 0")
+        c = self.costs
+        if min(c.commission_bps, c.spread_bps, c.impact_coef, c.band) < 0 or c.adv_window < 1 or c.capital <= 0:
+            raise ValueError("costs settings must be non-negative (adv_window >= 1, capital > 0)")
+        return self
+
+    def to_dict(self):
+        return asdict(self)
+
+
+_SIZE_UNITS = {"KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3, "TB": 1024 ** 4}
+_SIZE_FIELDS = {"memory_budget", "max_bytes"}
+
+
+def _parse_size(value):
+    if isinstance(value, (int, float)):
+        return int(value)
+    text = str(value).strip().upper().replace(" ", "")
+    for unit, factor in _SIZE_UNITS.items():
+        if text.endswith(unit):
+            return int(float(text[:-len(unit)]) * factor)
+    return int(text.rstrip("B") or 0)
+
+
+def _coerce(name, annotation, value):
+    if name in _SIZE_FIELDS:
+        return _parse_size(value)
+    optional = annotation == Optional[int]
+    if optional and (value is None or str(value).strip().lower() in ("", "none", "null")):
+        return None
+    target = int if optional else annotation
+    if target is bool and isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    return target(value)
+
+
+def _apply(section, values, source):
+    known = {f.name: f for f in fields(section)}
+    unknown = set(values) - set(known)
+    if unknown:
+        raise ValueError(f"Unknown settings {sorted(unknown)} in {source}")
+    return replace(section, **{k: _coerce(k, known[k].type, v) for k, v in values.items()})
+
+
+def _read_file(path):
+    path = Path(path)
+    text = path.read_text(encoding="utf-8")
+    if path.suffix == ".toml":
+        try:
+            import tomllib
+        except ImportError:  # Python < 3.11
+            import tomli as tomllib
+        return tomllib.loads(text)
+    if path.suffix == ".json":
+        return json.loads(text)
+    raise ValueError(f"Config file must be .toml or .json: {path}")
+
+
+def load_config(path=None, environ=None):
+    """
+    Build a Config from defaults, an optional file and environment overrides.
+
+    Args:
+        path (str or None): TOML/JSON file (None = $AFROS_CONFIG if set).
+        environ (mapping or None): Environment to read overrides from (default os.environ).
+
+    Returns:
+        Config: Validated configuration.
+    """
+    environ = os.environ if environ is None else environ
+    config = Config()
+    path = path or environ.get(ENV_PREFIX + "CONFIG")
+
+    if path:
+        data = _read_file(path)
+        unknown = set(data) - {f.name for f in fields(Config)}
+        if unknown:
+            raise ValueError(f"Unknown config sections {sorted(unknown)} in {path}")
+        for name, values in data.items():
+            config = replace(config, **{name: _apply(getattr(config, name), values, path)})
+
+    for section in fields(Config):
+        current = getattr(config, section.name)
+        overrides = {}
+        for f in fields(current):
+            key = f"{ENV_PREFIX}{section.name}_{f.name}".upper()
+            if key in environ:
+                overrides[f.name] = environ[key]
+        if overrides:
+            config = replace(config, **{section.name: _apply(current, overrides, "environment")})
+
+    return config.validate()
+
+
+_CONFIG = None
+
+
+def get_config():
+    """The active configuration (loaded on first use)."""
+    global _CONFIG
+    if _CONFIG is None:
+        _CONFIG = load_config()
+    return _CONFIG
+
+
+def set_config(config):
+    """Make `config` the active configuration (e.g. from a CLI --config flag)."""
+    global _CONFIG
+    _CONFIG = config.validate()
+    return _CONFIG
+
+
+def reset_config():
+    """Forget the active configuration so the next get_config() reloads it."""
+    global _CONFIG
+    _CONFIG = None
+
+
+def resolve_n_jobs(n_jobs=None, n_tasks=None):
+    """
+    Worker count: the explicit argument, else compute.n_jobs, else os.cpu_count(),
+    capped at the number of tasks.
+    """
+    n = n_jobs or get_config().compute.n_jobs or os.cpu_count() or 1
+    if n_tasks is not None:
+        n = min(n, n_tasks)
+    return max(1, n)
+
+
+def cache_dir(*parts):
+    """A directory under the configured cache directory (created)."""
+    path = Path(get_config().cache.directory, *parts)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def enforce_cache_limit(keep=()):
+    """
+    Delete the least recently modified files in the cache directory until it fits
+    cache.max_bytes (and the directories left empty). Paths under `keep` are never
+    deleted.
+
+    Returns:
+        int: Bytes freed.
+    """
+    cfg = get_config().cache
+    root = Path(cfg.directory)
+    if not root.exists():
+        return 0
+    keep = [Path(k).resolve() for k in keep]
+    files = [p for p in root.rglob("*") if p.is_file()]
+    total = sum(p.stat().st_size for p in files)
+    freed = 0
+    for p in sorted(files, key=lambda p: p.stat().st_mtime):
+        if total - freed <= cfg.max_bytes:
+            break
+        resolved = p.resolve()
+        if any(resolved == k or k in resolved.parents for k in keep):
+            continue
+        size = p.stat().st_size
+        p.unlink()
+        freed += size
+        # Drop directories the eviction emptied (e.g. a whole cached result), up to the root
+        parent = p.parent
+        while parent != root and not any(parent.iterdir()) and parent.resolve() not in keep:
+            parent.rmdir()
+            parent = parent.parent
+    if freed:
+        print(f"[WARN] Cache over {cfg.max_bytes / 1e6:,.0f} MB; removed {freed / 1e6:,.1f} MB of old files from {root}")
+    return freed
@@ -1,22 +1,148 @@
+import sys
+
 import pandas as pd
-import os
 import numpy as np
+from pandas.api.types import union_categoricals
 from datetime import datetime
+from config import get_config
+from profiling.instrumentation import instrumented
+
+__all__ = ["load_price_data", "memory_footprint", "is_date_symbol_sorted"]
+
+# df.attrs key set by compact loading: rows are ordered by (Date, Symbol)
+SORTED_ATTR = "sorted_by"
+_DATE_SYMBOL = ("Date", "Symbol")
+
+
+def is_date_symbol_sorted(df):
+    """True if df was produced (or filtered) from a (Date, Symbol)-sorted load."""
+    return tuple(df.attrs.get(SORTED_ATTR, ())) == _DATE_SYMBOL
+
+
+def memory_footprint(df, verbose=False):
+    """
+    Deep memory usage of a price frame, with an estimate of the same rows stored
+    the default way (float64 numerics, Python string objects).
+
+    Args:
+        df (DataFrame): Loaded price data.
+        verbose (bool): Print a one-line summary.
+
+    Returns:
+        dict: 'columns' (bytes per column), 'total', 'uncompact_estimate' and 'reduction'.
+    """
+    n = len(df)
+    columns = {c: int(b) for c, b in df.memory_usage(index=False, deep=True).items()}
+    estimate = 0
+    for c in df.columns:
+        col = df[c]
+        if isinstance(col.dtype, pd.CategoricalDtype):
+            counts = np.bincount(col.cat.codes.to_numpy()[col.cat.codes.to_numpy() >= 0],
+                                 minlength=len(col.cat.categories))
+            sizes = np.array([sys.getsizeof(str(v)) for v in col.cat.categories], dtype=np.int64)
+            estimate += n * 8 + int(counts @ sizes)
+        elif pd.api.types.is_float_dtype(col.dtype):
+            estimate += n * 8
+        else:
+            estimate += columns[c]
+    total = sum(columns.values())
+    report = {
+        "columns": columns,
+        "total": total,
+        "uncompact_estimate": estimate,
+        "reduction": estimate / total if total else float("nan"),
+    }
+    if verbose:
+        detail = ", ".join(f"{c} {b / 1e6:,.1f}" for c, b in columns.items())
+        print(f"[INFO] Price data: {n:,} rows, {total / 1e6:,.1f} MB ({detail} MB); "
+              f"~{estimate / 1e6:,.1f} MB uncompact, {report['reduction']:.1f}x smaller")
+    return report
 
+
+def _read_compact(filepath, asset_type, start_date, end_date, columns, price_dtype):
+    header = pd.read_csv(filepath, nrows=0).columns
+    keep = [c for c in header if c not in ("Date", "Symbol")]
+    if columns is not None:
+        keep = [c for c in keep if c in columns]
+    dtypes = {c: (np.float64 if c == "Volume" else price_dtype) for c in keep}
+    dtypes["Symbol"] = "category"
+    df = pd.read_csv(filepath, usecols=["Date", "Symbol", *keep], dtype=dtypes, parse_dates=["Date"])
+    mask = ((df['Date'] > start_date) & (df['Date'] <= end_date)).to_numpy()
+    df = df[mask]
+    df['AssetType'] = pd.Categorical.from_codes(np.zeros(len(df), dtype=np.int8), categories=[asset_type])
+    return df
+
+
+def _concat_compact(frames):
+    """Concatenate with one shared (sorted) symbol dictionary and order rows by (Date, Symbol)."""
+    for name in ("Symbol", "AssetType"):
+        shared = union_categoricals([f[name].array for f in frames], sort_categories=True).categories
+        for f in frames:
+            f[name] = f[name].cat.set_categories(shared)
+    df = pd.concat(frames, ignore_index=True)
+    del frames[:]
+    # Categories are sorted, so code order is symbol order
+    order = np.lexsort((df['Symbol'].cat.codes.to_numpy(), df['Date'].to_numpy()))
+    df = df.take(order).reset_index(drop=True)
+    df['Symbol'] = df['Symbol'].cat.remove_unused_categories()
+    df.attrs[SORTED_ATTR] = _DATE_SYMBOL
+    return df
+
+
+@instrumented("load_price_data")
 def load_price_data(
-    start_date='2020-01-01',
+    start_date=None,
     end_date=datetime.today(),
-    path="data\\master_stock_data.csv",
-    merge=True
+    path=None,
+    merge=True,
+    compact=False,
+    columns=None,
+    float32=None,
+    report_memory=False
 ):
+    """
+    Load the master price CSVs as one long frame.
+
+    The default mode keeps every column as read and sorts rows by Date. compact=True
+    reads only the requested columns, stores Symbol and AssetType as categoricals
+    sharing one sorted symbol dictionary across the files (integer codes), optionally
+    float32 prices, and orders rows by (Date, Symbol) so downstream pivots need no
+    re-sort (recorded in df.attrs['sorted_by'], see is_date_symbol_sorted).
+
+    Args:
+        start_date, end_date (str or datetime or None): Date bounds (start exclusive, end inclusive).
+        path (str or None): Stock CSV (None = configured data.stock_path).
+        merge (bool): Also load the configured bond and commodity files when present.
+        compact (bool): Memory-compact typed loading (see above).
+        columns (list or None): compact only; value columns to keep besides Date and Symbol
+                                (None = all, e.g. ['Close'] for the signal pipeline).
+        float32 (bool or None): compact only; store prices as float32 (None = configured
+                                compute.precision). Volume stays float64.
+        report_memory (bool): Print the memory footprint (see memory_footprint).
+
+    Returns:
+        pd.DataFrame: Long format with ['Date', 'Symbol', ..., 'AssetType'].
+    """
+    # Paths and the default start date come from the active configuration (config.DataConfig)
+    config = get_config()
+    data_cfg = config.data
+    if start_date is None:
+        start_date = data_cfg.start_date
+    if path is None:
+        path = data_cfg.stock_path
     if end_date is None:
         end_date = datetime.now()
+    if float32 is None:
+        float32 = config.compute.precision == "float32"
+    price_dtype = np.float32 if float32 else np.float64
 
     # Convert to Timestamps
     start_date = pd.to_datetime(start_date)
     end_date = pd.to_datetime(end_date)
 
     def load_and_filter(filepath, asset_type):
+        if compact:
+            return _read_compact(filepath, asset_type, start_date, end_date, columns, price_dtype)
         df = pd.read_csv(filepath, parse_dates=['Date'])
         df = df[(df['Date'] > start_date) & (df['Date'] <= end_date)]
         df['AssetType'] = asset_type
@@ -27,16 +153,21 @@ def load_price_data(
 
     if merge:
         try:
-            combined.append(load_and_filter("data\\master_bond_etf_data.csv", "Bond"))
+            combined.append(load_and_filter(data_cfg.bond_path, "Bond"))
         except FileNotFoundError:
             pass
         try:
-            combined.append(load_and_filter("data\\master_commodity_etf_data.csv", "Commodity"))
+            combined.append(load_and_filter(data_cfg.commodity_path, "Commodity"))
         except FileNotFoundError:
             pass
 
-    # Combine all into one DataFrame
-    final_df = pd.concat(combined, ignore_index=True)
-    final_df.sort_values(by="Date", inplace=True)
+    if compact:
+        final_df = _concat_compact(combined)
+    else:
+        # Combine all into one DataFrame
+        final_df = pd.concat(combined, ignore_index=True)
+        final_df.sort_values(by="Date", inplace=True)
 
-    return final_df
\ No newline at end of file
+    if report_memory:
+        memory_footprint(final_df, verbose=True)
+    return final_df
@@ -0,0 +1,389 @@
+import hashlib
+import json
+import tempfile
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+from config import ComputeConfig, get_config, cache_dir, enforce_cache_limit
+from profiling.instrumentation import instrumented, span as profile_span, count
+
+__all__ = [
+    "DEFAULT_MEMORY_BUDGET",
+    "build_memmap_panel",
+    "MemmapPanel",
+    "stream_ewma_momentum_signals",
+    "stream_rolling_volatility",
+    "stream_rolling_covariance",
+]
+
+DEFAULT_MEMORY_BUDGET = ComputeConfig.memory_budget  # bytes; the active value is compute.memory_budget
+
+
+@instrumented("build_memmap_panel")
+def build_memmap_panel(csv_paths, out_dir=None, columns=("Close",), dtype=None, csv_chunk_rows=1_000_000):
+    """
+    Convert long-format master CSVs into memory-mapped (dates x symbols) arrays,
+    one .npy file per price column, without ever holding the long table in memory.
+
+    Two streaming passes over the CSVs: the first collects the date and symbol
+    axes, the second scatters each CSV chunk into the memory-mapped arrays.
+    Rows are dates, so any time range is a contiguous slice on disk.
+
+    Without out_dir the panel goes to the cache directory, keyed by the CSVs
+    (path, size, modification time), columns and dtype: an unchanged source is
+    reopened instead of rebuilt, and old cache entries are evicted to keep the
+    cache within cache.max_bytes.
+
+    Args:
+        csv_paths (str or list): Master CSV file(s) with ['Date', 'Symbol', *columns].
+        out_dir (str or Path or None): Output directory (created; None = cache directory).
+        columns (tuple): Price columns to store.
+        dtype (str or None): Array dtype ('float64' or 'float32'; None = configured compute.precision).
+        csv_chunk_rows (int): Rows per pandas read_csv chunk.
+
+    Returns:
+        MemmapPanel: The opened panel.
+    """
+    if isinstance(csv_paths, (str, Path)):
+        csv_paths = [csv_paths]
+    dtype = dtype or get_config().compute.precision
+    cached = out_dir is None
+    if cached:
+        out_dir = cache_dir("panels", _panel_key(csv_paths, columns, dtype))
+        files = [out_dir / "meta.json", *(out_dir / f"{col}.npy" for col in columns)]
+        # Eviction removes files one by one, so reuse only a complete panel
+        if all(f.exists() for f in files):
+            for f in files:
+                f.touch()  # recently used: evicted last
+            count("out_of_core.panel_cache_hits")
+            return MemmapPanel(out_dir)
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    usecols = ["Date", "Symbol", *columns]
+
+    # Pass 1: axes
+    dates, symbols = set(), set()
+    for path in csv_paths:
+        for chunk in pd.read_csv(path, usecols=["Date", "Symbol"], chunksize=csv_chunk_rows):
+            dates.update(pd.to_datetime(chunk["Date"]).values)
+            symbols.update(chunk["Symbol"].unique())
+    dates = np.array(sorted(dates), dtype="datetime64[ns]")
+    symbols = sorted(symbols)
+    symbol_idx = pd.Index(symbols)
+
+    # Pass 2: scatter values into the memory-mapped arrays
+    arrays = {}
+    for col in columns:
+        arr = np.lib.format.open_memmap(out_dir / f"{col}.npy", mode="w+", dtype=dtype, shape=(len(dates), len(symbols)))
+        step = max(1, csv_chunk_rows // max(len(symbols), 1))
+        for start in range(0, len(dates), step):
+            arr[start:start + step] = np.nan
+        arrays[col] = arr
+
+    for path in csv_paths:
+        for chunk in pd.read_csv(path, usecols=usecols, chunksize=csv_chunk_rows):
+            rows = np.searchsorted(dates, pd.to_datetime(chunk["Date"]).values)
+            cols = symbol_idx.get_indexer(chunk["Symbol"])
+            for col in columns:
+                arrays[col][rows, cols] = chunk[col].values
+
+    for arr in arrays.values():
+        arr.flush()
+    del arrays
+
+    meta = {
+        "dates": [str(d) for d in dates.astype("datetime64[D]")] if _all_midnight(dates) else [str(d) for d in dates],
+        "symbols": symbols,
+        "columns": list(columns),
+        "dtype": str(np.dtype(dtype)),
+    }
+    # meta.json is written last, so a build interrupted midway is never reused from the cache
+    (out_dir / "meta.json").write_text(json.dumps(meta), encoding="utf-8")
+    if cached:
+        enforce_cache_limit(keep=[out_dir])
+    return MemmapPanel(out_dir)
+
+
+def _panel_key(csv_paths, columns, dtype):
+    """Cache key of a panel: source files (resolved path, size, mtime), columns and dtype."""
+    sources = []
+    for path in csv_paths:
+        stat = Path(path).stat()
+        sources.append([str(Path(path).resolve()), stat.st_size, stat.st_mtime_ns])
+    text = json.dumps([sources, list(columns), str(np.dtype(dtype))])
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def _all_midnight(dates):
+    return bool(len(dates) == 0 or (dates == dates.astype("datetime64[D]")).all())
+
+
+class MemmapPanel:
+    """
+    Read-only view of a panel written by build_memmap_panel. Arrays are opened
+    with mmap_mode='r', so only the pages that are actually touched are read.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        meta = json.loads((self.path / "meta.json").read_text(encoding="utf-8"))
+        self.dates = pd.DatetimeIndex(pd.to_datetime(meta["dates"]))
+        self.symbols = pd.Index(meta["symbols"])
+        self.columns = meta["columns"]
+        self.dtype = np.dtype(meta["dtype"])
+        self._arrays = {}
+
+    @property
+    def shape(self):
+        return len(self.dates), len(self.symbols)
+
+    def array(self, column="Close"):
+        if column not in self._arrays:
+            self._arrays[column] = np.load(self.path / f"{column}.npy", mmap_mode="r")
+        return self._arrays[column]
+
+    def chunk_rows(self, memory_budget=None, n_buffers=8):
+        """
+        Rows per time chunk so that n_buffers (dates x symbols) float64 work buffers
+        of one chunk fit in memory_budget bytes (None = configured compute.memory_budget).
+        """
+        memory_budget = memory_budget or get_config().compute.memory_budget
+        row_bytes = max(self.shape[1], 1) * 8 * n_buffers
+        return max(1, int(memory_budget // row_bytes))
+
+    def iter_chunks(self, column="Close", chunk_rows=None, overlap=0, memory_budget=None):
+        """
+        Yield (start, end, block) over time chunks. block holds rows
+        [start - overlap, end) as float64 (fewer leading rows at the start of the panel),
+        so rolling computations see the history they need from the previous chunk.
+        """
+        arr = self.array(column)
+        chunk_rows = chunk_rows or self.chunk_rows(memory_budget)
+        for start in range(0, arr.shape[0], chunk_rows):
+            end = min(start + chunk_rows, arr.shape[0])
+            yield start, end, np.asarray(arr[max(0, start - overlap):end], dtype=np.float64)
+
+    def to_frame(self, column="Close", start=None, end=None, symbols=None):
+        """Materialize a date range (label-based, inclusive) and optional symbols as a DataFrame."""
+        lo = 0 if start is None else self.dates.searchsorted(pd.Timestamp(start), side="left")
+        hi = len(self.dates) if end is None else self.dates.searchsorted(pd.Timestamp(end), side="right")
+        cols = slice(None) if symbols is None else self.symbols.get_indexer(symbols)
+        data = np.asarray(self.array(column)[lo:hi])[:, cols]
+        return pd.DataFrame(data, index=self.dates[lo:hi],
+                            columns=self.symbols if symbols is None else pd.Index(symbols))
+
+    def _output_dir(self, out_path, name):
+        """out_path, or a new directory for `name` results under the cache directory (None)."""
+        if out_path is not None:
+            return Path(out_path)
+        return Path(tempfile.mkdtemp(prefix=f"{name}_", dir=cache_dir("streams", self.path.name)))
+
+    def _output(self, out_path, name, shape=None, dtype=None):
+        out_path = Path(out_path)
+        out_path.mkdir(parents=True, exist_ok=True)
+        return np.lib.format.open_memmap(out_path / f"{name}.npy", mode="w+",
+                                         dtype=dtype or self.dtype, shape=shape or self.shape)
+
+
+@instrumented("stream_ewma_momentum_signals")
+def stream_ewma_momentum_signals(panel, out_path=None, span=None, threshold=None, min_days_above_thresh=None,
+                                 memory_budget=None):
+    """
+    Out-of-core ewma_momentum_signals: same log returns, EWMA (adjust=False,
+    pandas NaN handling) and rolling threshold counts, computed chunk by chunk.
+
+    State carried between chunks: the last price row, the EWMA value and weight per
+    symbol, and the last span - 1 rows of the above/below-threshold indicators.
+
+    Args:
+        panel (MemmapPanel): Input panel with a 'Close' array.
+        out_path (str or Path or None): Directory receiving momentum.npy and signals.npy
+                                        (None = a new directory in the cache).
+        span (int), threshold (float), min_days_above_thresh (int): As in ewma_momentum_signals
+                                                                    (None = configured strategy values).
+        memory_budget (int or None): Bytes available for per-chunk work buffers (None = configured).
+
+    Returns:
+        tuple: (momentum memmap, signals memmap), both (dates x symbols).
+    """
+    cfg = get_config().strategy
+    span = cfg.span if span is None else span
+    threshold = cfg.threshold if threshold is None else threshold
+    min_days_above_thresh = cfg.min_days_above_thresh if min_days_above_thresh is None else min_days_above_thresh
+    out_path = panel._output_dir(out_path, "momentum")
+    momentum_out = panel._output(out_path, "momentum")
+    signals_out = panel._output(out_path, "signals", dtype=np.int8)
+
+    n_symbols = panel.shape[1]
+    alpha = 2.0 / (span + 1.0)
+    old_wt_factor = 1.0 - alpha
+
+    prev_price = np.full(n_symbols, np.nan)
+    weighted = np.full(n_symbols, np.nan)
+    old_wt = np.ones(n_symbols)
+    pos_tail = np.zeros((0, n_symbols))
+    neg_tail = np.zeros((0, n_symbols))
+
+    for start, end, block in panel.iter_chunks("Close", memory_budget=memory_budget):
+        with profile_span("stream_ewma_momentum_signals.chunk"):
+            prices = np.vstack([prev_price[None, :], block])
+            with np.errstate(divide="ignore", invalid="ignore"):
+                log_ret = np.log(prices[1:] / prices[:-1])
+            prev_price = block[-1].copy()
+
+            momentum = np.empty_like(log_ret)
+            for i, cur in enumerate(log_ret):
+                obs = ~np.isnan(cur)
+                started = ~np.isnan(weighted)
+
+                # pandas ewm(adjust=False, ignore_na=False): decay the old weight on every row once started
+                old_wt = np.where(started, old_wt * old_wt_factor, old_wt)
+                upd = started & obs
+                weighted = np.where(upd, (old_wt * weighted + alpha * cur) / (old_wt + alpha), weighted)
+                old_wt = np.where(upd, 1.0, old_wt)
+
+                first = ~started & obs
+                weighted = np.where(first, cur, weighted)
+                old_wt = np.where(first, 1.0, old_wt)
+                momentum[i] = weighted
+
+            momentum_out[start:end] = momentum
+
+            pos = np.vstack([pos_tail, (momentum > threshold).astype(np.float64)])
+            neg = np.vstack([neg_tail, (momentum < -threshold).astype(np.float64)])
+            n_tail = len(pos_tail)
+
+            def window_counts(ind):
+                csum = np.vstack([np.zeros((1, n_symbols)), np.cumsum(ind, axis=0)])
+                idx = np.arange(n_tail, len(ind)) + 1
+                return csum[idx] - csum[np.maximum(idx - span, 0)]
+
+            # Global rows before span - 1 have no full window (rolling min_periods = span)
+            valid = (np.arange(start, end) >= span - 1)[:, None]
+            long_signal = valid & (window_counts(pos) >= min_days_above_thresh)
+            short_signal = valid & (window_counts(neg) >= min_days_above_thresh)
+            signals_out[start:end] = long_signal.astype(np.int8) - short_signal.astype(np.int8)
+
+            pos_tail = pos[-(span - 1):] if span > 1 else pos[:0]
+            neg_tail = neg[-(span - 1):] if span > 1 else neg[:0]
+
+    momentum_out.flush()
+    signals_out.flush()
+    enforce_cache_limit(keep=[out_path, panel.path])
+    return momentum_out, signals_out
+
+
+@instrumented("stream_rolling_volatility")
+def stream_rolling_volatility(panel, out_path=None, window=None, memory_budget=None):
+    """
+    Out-of-core rolling standard deviation of simple returns (pandas rolling(window).std(),
+    ddof=1, NaN unless the whole window is observed), streamed with a window-row overlap.
+
+    Args:
+        panel (MemmapPanel): Input panel with a 'Close' array.
+        out_path (str or Path or None): Directory receiving volatility.npy (None = a new
+                                        directory in the cache).
+        window (int or None): Rolling window in rows (None = configured strategy.vol_window).
+        memory_budget (int or None): Bytes available for per-chunk work buffers (None = configured).
+
+    Returns:
+        memmap: Rolling volatility (dates x symbols).
+    """
+    window = get_config().strategy.vol_window if window is None else window
+    out_path = panel._output_dir(out_path, "volatility")
+    out = panel._output(out_path, "volatility")
+    n_symbols = panel.shape[1]
+
+    for start, end, block in panel.iter_chunks("Close", overlap=window, memory_budget=memory_budget):
+        with profile_span("stream_rolling_volatility.chunk"):
+            lead = start - max(0, start - window)  # history rows included in block
+            returns = np.full_like(block, np.nan)
+            returns[1:] = block[1:] / block[:-1] - 1
+
+            valid = ~np.isnan(returns)
+            # Demean per column before the cumulative sums to limit cancellation
+            n_valid = valid.sum(axis=0)
+            center = np.where(valid, returns, 0.0).sum(axis=0) / np.maximum(n_valid, 1)
+            x = np.where(valid, returns - center, 0.0)
+
+            def rolling_sum(a):
+                csum = np.vstack([np.zeros((1, n_symbols)), np.cumsum(a, axis=0)])
+                hi = np.arange(lead, len(a)) + 1
+                return csum[hi] - csum[np.maximum(hi - window, 0)]
+
+            n = rolling_sum(valid.astype(np.float64))
+            s1 = rolling_sum(x)
+            s2 = rolling_sum(x * x)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                var = (s2 - s1 * s1 / n) / (n - 1)
+            var = np.where(n >= window, np.maximum(var, 0.0), np.nan)
+            out[start:end] = np.sqrt(var)
+
+    out.flush()
+    enforce_cache_limit(keep=[out_path, panel.path])
+    return out
+
+
+@instrumented("stream_rolling_covariance")
+def stream_rolling_covariance(panel, out_path=None, window=60, step=1, symbols=None, memory_budget=None):
+    """
+    Out-of-core rolling covariance of simple returns (pairwise-complete, like
+    DataFrame.cov) for windows ending every `step` rows.
+
+    Args:
+        panel (MemmapPanel): Input panel with a 'Close' array.
+        out_path (str or Path or None): Directory receiving covariance.npy (n_windows x N x N)
+                                        and covariance_dates.npy (window end dates)
+                                        (None = a new directory in the cache).
+        window (int): Window length in return rows.
+        step (int): Distance in rows between consecutive window ends.
+        symbols (list or None): Restrict to these symbols (the N x N stack grows quickly).
+        memory_budget (int or None): Bytes available for per-chunk work buffers (None = configured).
+
+    Returns:
+        tuple: (covariance memmap, DatetimeIndex of window end dates)
+    """
+    cols = np.arange(panel.shape[1]) if symbols is None else panel.symbols.get_indexer(symbols)
+    if (cols < 0).any():
+        raise ValueError("Unknown symbols requested.")
+    n = len(cols)
+
+    # First complete window ends at return row `window` (price row window)
+    ends = np.arange(window, panel.shape[0], step)
+    out_path = panel._output_dir(out_path, "covariance")
+    out = panel._output(out_path, "covariance", shape=(len(ends), n, n), dtype=np.float64)
+    np.save(out_path / "covariance_dates.npy", panel.dates[ends].values)
+
+    # Keep the (n x n) work buffers inside the budget as well
+    memory_budget = memory_budget or get_config().compute.memory_budget
+    row_budget = max(memory_budget - 6 * n * n * 8, memory_budget // 4)
+    chunk_rows = max(1, int(row_budget // (max(n, 1) * 8 * 4)))
+
+    k = 0
+    for start, end, block in panel.iter_chunks("Close", chunk_rows=chunk_rows, overlap=window):
+        block = block[:, cols]
+        lead = start - max(0, start - window)
+        returns = np.full_like(block, np.nan)
+        returns[1:] = block[1:] / block[:-1] - 1
+
+        with profile_span("stream_rolling_covariance.chunk"):
+            while k < len(ends) and ends[k] < end:
+                local_end = ends[k] - start + lead
+                win = returns[local_end - window + 1:local_end + 1]
+                mask = ~np.isnan(win)
+                x = np.where(mask, win, 0.0)
+                m = mask.astype(np.float64)
+
+                n_xy = m.T @ m
+                s_xy = x.T @ x
+                s_x = x.T @ m  # sum of x over rows where y is observed
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    cov = (s_xy - s_x * s_x.T / n_xy) / (n_xy - 1)
+                cov[n_xy < 2] = np.nan
+                out[k] = cov
+                k += 1
+
+    out.flush()
+    enforce_cache_limit(keep=[out_path, panel.path])
+    return out, panel.dates[ends]
@@ -0,0 +1,414 @@
+"""
+Local price service: loads the master price files once into shared memory and
+publishes the panel layout in a JSON manifest. Clients in other processes attach
+to the segment by name and read numpy views of it directly (no pickling, no
+network).
+
+Run the service with:
+    python -m data_loading.price_service --name afros_prices --poll 60
+"""
+import argparse
+import json
+import os
+import time
+import weakref
+from datetime import datetime
+from multiprocessing import shared_memory
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from config import get_config, cache_dir
+from data_loading.data_loading import load_price_data
+from profiling.instrumentation import span, count
+
+__all__ = [
+    "DEFAULT_SERVICE_NAME",
+    "PriceService",
+    "PriceClient",
+    "manifest_path",
+]
+
+DEFAULT_SERVICE_NAME = "afros_prices"
+PANEL_COLUMNS = ("Open", "High", "Low", "Close", "Volume")
+_PATH_ASSET_TYPES = ("Stock", "Bond", "Commodity")
+
+
+def _default_paths():
+    # Same files (and asset types) load_price_data reads with merge=True
+    data_cfg = get_config().data
+    return data_cfg.stock_path, data_cfg.bond_path, data_cfg.commodity_path
+
+
+# Segments created by a PriceService in this process (their tracker registration is kept)
+_OWNED_SEGMENTS = set()
+# Segments of closed clients that still had frames viewing them: (shm, weakrefs to the root arrays)
+_DETACHED_SEGMENTS = []
+
+
+def manifest_path(name=DEFAULT_SERVICE_NAME, manifest_dir=None):
+    """
+    Location of the manifest JSON a service publishes and clients read (by default
+    in the cache directory, so services and clients must share cache.directory).
+    """
+    manifest_dir = Path(manifest_dir) if manifest_dir else cache_dir("price_service")
+    return manifest_dir / f"{name}.json"
+
+
+def _attach_segment(shm_name):
+    """
+    Attach to an existing segment without letting this process's resource tracker
+    unlink it on exit (the service owns the segment's lifetime).
+    """
+    shm = shared_memory.SharedMemory(name=shm_name, create=False)
+    if os.name == "posix" and shm_name not in _OWNED_SEGMENTS:
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+    return shm
+
+
+def _close_unviewed(segments):
+    """
+    Close the segments none of whose root arrays are still alive (no frame or panel
+    views them any more) and return the others, which must stay mapped: unmapping
+    memory a numpy view still points into crashes the interpreter on the next read.
+    """
+    alive = []
+    for shm, roots in segments:
+        if any(r() is not None for r in roots):
+            alive.append((shm, roots))
+        else:
+            shm.close()
+    return alive
+
+
+class PriceService:
+    """
+    Owner of the shared price panel.
+
+    The segment holds the int64 date index (ns since epoch) followed by a float64
+    block of shape (n_columns, n_dates, n_symbols), so each column is a contiguous
+    dates x symbols panel. Every reload publishes a new generation in a new segment
+    and atomically replaces the manifest; the previous generation is kept until the
+    next reload so clients mid-read are never pulled out from under.
+
+    Args:
+        name (str): Service name (segment prefix and manifest file name).
+        paths (tuple or None): Master CSVs in (stock, bond, commodity) order; missing
+                               files are skipped. All are watched for changes.
+                               None = the configured data paths.
+        start_date (str or None): First date loaded (None = configured start date).
+        columns (tuple): OHLCV columns published (missing ones are skipped).
+        manifest_dir (str or None): Directory of the manifest (default: <cache.directory>/price_service).
+    """
+
+    def __init__(self, name=DEFAULT_SERVICE_NAME, paths=None, start_date=None,
+                 columns=PANEL_COLUMNS, manifest_dir=None):
+        self.name = name
+        self.paths = tuple(paths or _default_paths())
+        self.start_date = start_date or get_config().data.start_date
+        self.columns = tuple(columns)
+        self.manifest_file = manifest_path(name, manifest_dir)
+        self.generation = 0
+        self._segments = []
+        self._mtimes = None
+
+    def _file_mtimes(self):
+        return tuple(os.path.getmtime(p) if os.path.exists(p) else None for p in self.paths)
+
+    def load(self):
+        """Load the CSVs, publish a new generation and return its manifest."""
+        with span("price_service.load"):
+            frames = [load_price_data(start_date=self.start_date, end_date=None, path=p, merge=False)
+                      .assign(AssetType=t) for p, t in zip(self.paths, _PATH_ASSET_TYPES) if os.path.exists(p)]
+            if not frames:
+                raise FileNotFoundError(f"None of the price files exist: {self.paths}")
+            df = pd.concat(frames, ignore_index=True)
+            df = df.drop_duplicates(['Date', 'Symbol'], keep='last')
+            columns = [c for c in self.columns if c in df.columns]
+
+            symbols = np.sort(df['Symbol'].unique())
+            dates = np.sort(df['Date'].unique())
+            date_pos = np.searchsorted(dates, df['Date'].values)
+            sym_pos = np.searchsorted(symbols, df['Symbol'].values)
+            asset_types = (df.drop_duplicates('Symbol', keep='last').set_index('Symbol')['AssetType']
+                           .reindex(symbols).tolist())
+
+            n_dates, n_symbols = len(dates), len(symbols)
+            date_bytes = n_dates * 8
+            size = max(date_bytes + len(columns) * n_dates * n_symbols * 8, 1)
+
+            self.generation += 1
+            shm_name = f"{self.name}_g{self.generation}_{os.getpid()}"
+            shm = shared_memory.SharedMemory(name=shm_name, create=True, size=size)
+            _OWNED_SEGMENTS.add(shm_name)
+
+            np.ndarray((n_dates,), dtype=np.int64, buffer=shm.buf)[:] = \
+                pd.DatetimeIndex(dates).as_unit('ns').asi8
+            block = np.ndarray((len(columns), n_dates, n_symbols), dtype=np.float64,
+                               buffer=shm.buf, offset=date_bytes)
+            block[:] = np.nan
+            # Scatter the long rows straight into the panel (no pivot copies)
+            for k, col in enumerate(columns):
+                block[k, date_pos, sym_pos] = df[col].to_numpy(dtype=np.float64)
+
+        manifest = {
+            "name": self.name,
+            "generation": self.generation,
+            "shm_name": shm_name,
+            "n_dates": n_dates,
+            "n_symbols": n_symbols,
+            "columns": columns,
+            "symbols": symbols.tolist(),
+            "asset_types": asset_types,
+            "dates_offset": 0,
+            "data_offset": date_bytes,
+            "dtype": "float64",
+            "published": datetime.now().isoformat(timespec="seconds"),
+        }
+        self._publish(manifest)
+
+        self._segments.append(shm)
+        # Keep the current and the previous generation alive
+        while len(self._segments) > 2:
+            old = self._segments.pop(0)
+            old.close()
+            old.unlink()
+            _OWNED_SEGMENTS.discard(old.name)
+
+        count("price_service.reloads")
+        print(f"Published generation {self.generation}: {n_dates} dates x {n_symbols} symbols "
+              f"({size / 1e6:,.1f} MB) as {shm_name}")
+        return manifest
+
+    def _publish(self, manifest):
+        self.manifest_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.manifest_file.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(manifest), encoding="utf-8")
+        os.replace(tmp, self.manifest_file)
+
+    def reload_if_changed(self):
+        """Reload when any watched file's modification time changed. Returns True if reloaded."""
+        mtimes = self._file_mtimes()
+        if mtimes == self._mtimes:
+            if self.manifest_file.exists():
+                self.manifest_file.touch()  # in use: keep it last in line for cache eviction
+            return False
+        self.load()
+        self._mtimes = mtimes
+        return True
+
+    def serve_forever(self, poll_interval=60.0):
+        """Publish the panel and hot-reload it whenever ingestion updates the master files."""
+        self.reload_if_changed()
+        try:
+            while True:
+                time.sleep(poll_interval)
+                try:
+                    self.reload_if_changed()
+                except Exception as e:
+                    print(f"[WARN] Reload failed, keeping generation {self.generation}: {e}")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.close()
+
+    def close(self):
+        """Unlink all segments and remove the manifest."""
+        for shm in self._segments:
+            shm.close()
+            try:
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+            _OWNED_SEGMENTS.discard(shm.name)
+        self._segments = []
+        try:
+            self.manifest_file.unlink()
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        if not self._segments:
+            self.reload_if_changed()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class PriceClient:
+    """
+    Read-only, zero-copy view of a running PriceService.
+
+    Panels are numpy views on the shared segment (dates x symbols); as-of and date
+    range selections are slices of those views. Selecting a subset of symbols is a
+    gather and copies only the selected columns.
+
+    Frames returned before a refresh() or close() stay valid: a generation's segment
+    is only unmapped once no array viewing it is left.
+
+    Args:
+        name (str): Service name.
+        manifest_dir (str or None): Directory of the manifest (default: <cache.directory>/price_service).
+    """
+
+    def __init__(self, name=DEFAULT_SERVICE_NAME, manifest_dir=None):
+        self.manifest_file = manifest_path(name, manifest_dir)
+        self._shm = None
+        self._roots = ()
+        self._retired = []
+        self.manifest = None
+        self.attach()
+
+    def attach(self):
+        """(Re)attach to the generation currently published in the manifest."""
+        if not self.manifest_file.exists():
+            raise FileNotFoundError(f"No price service manifest at {self.manifest_file}. Is the service running?")
+        manifest = json.loads(self.manifest_file.read_text(encoding="utf-8"))
+        shm = _attach_segment(manifest["shm_name"])
+
+        self._retire()
+        self._shm = shm
+        self.manifest = manifest
+
+        n_dates, n_symbols = manifest["n_dates"], manifest["n_symbols"]
+        raw_dates = np.ndarray((n_dates,), dtype=np.int64, buffer=shm.buf, offset=manifest["dates_offset"])
+        self.dates = pd.DatetimeIndex(raw_dates.view("datetime64[ns]"))
+        self.symbols = pd.Index(manifest["symbols"], name="Symbol")
+        self.columns = manifest["columns"]
+        self._block = np.ndarray((len(self.columns), n_dates, n_symbols), dtype=manifest["dtype"],
+                                 buffer=shm.buf, offset=manifest["data_offset"])
+        self._block.flags.writeable = False
+        # Every view of the segment keeps one of these alive
+        self._roots = (weakref.ref(raw_dates), weakref.ref(self._block))
+        return self
+
+    def _retire(self):
+        """Drop the current generation; its segment is closed once no frame views it."""
+        if self._shm is not None:
+            self._retired.append((self._shm, self._roots))
+        self._shm, self._roots, self._block, self.dates = None, (), None, None
+        self._retired = _close_unviewed(self._retired)
+
+    @property
+    def generation(self):
+        return self.manifest["generation"]
+
+    def refresh(self):
+        """Attach to a newer generation if the service reloaded. Returns True if it did."""
+        try:
+            latest = json.loads(self.manifest_file.read_text(encoding="utf-8"))["generation"]
+        except (FileNotFoundError, json.JSONDecodeError):
+            return False
+        if latest == self.generation:
+            return False
+        self.attach()
+        return True
+
+    def panel(self, column="Close"):
+        """Zero-copy dates x symbols array of one column."""
+        return self._block[self.columns.index(column)]
+
+    def _slice(self, column, lo, hi, symbols):
+        values = self.panel(column)[lo:hi]
+        cols = self.symbols
+        if symbols is not None:
+            idx = self.symbols.get_indexer(symbols)
+            if (idx < 0).any():
+                missing = [s for s, i in zip(symbols, idx) if i < 0]
+                print(f"[WARN] Symbols not in price service: {missing}")
+            idx = idx[idx >= 0]
+            values, cols = values[:, idx], self.symbols[idx]
+        return pd.DataFrame(values, index=self.dates[lo:hi].rename("Date"), columns=cols, copy=False)
+
+    def frame(self, column="Close", start=None, end=None, symbols=None):
+        """
+        Wide DataFrame (index=Date, columns=Symbol) over a date range and optional
+        symbol subset, wrapping the shared view where possible.
+
+        Args:
+            column (str): Price column.
+            start, end (str or datetime or None): Inclusive date bounds.
+            symbols (list or None): Subset of symbols (copies those columns).
+
+        Returns:
+            pd.DataFrame
+        """
+        lo = 0 if start is None else self.dates.searchsorted(pd.Timestamp(start), side='left')
+        hi = len(self.dates) if end is None else self.dates.searchsorted(pd.Timestamp(end), side='right')
+        return self._slice(column, lo, hi, symbols)
+
+    def asof(self, date, column="Close", lookback=None, symbols=None):
+        """
+        Point-in-time panel: rows on or before `date` (optionally only the last `lookback` rows).
+
+        Returns:
+            pd.DataFrame: index=Date, columns=Symbol.
+        """
+        hi = self.dates.searchsorted(pd.Timestamp(date), side='right')
+        lo = 0 if lookback is None else max(0, hi - lookback)
+        return self._slice(column, lo, hi, symbols)
+
+    def long_frame(self, start=None, end=None, symbols=None):
+        """
+        Long format like load_price_data (Date, Symbol, OHLCV, AssetType), for the
+        functions that take the long table. This materializes a copy.
+        """
+        frames = {c: self.frame(c, start, end, symbols) for c in self.columns}
+        first = next(iter(frames.values()))
+        n_dates, n_syms = first.shape
+        out = pd.DataFrame({
+            "Date": np.repeat(first.index.values, n_syms),
+            "Symbol": np.tile(first.columns.values, n_dates),
+        })
+        for c, f in frames.items():
+            out[c] = f.to_numpy().ravel()
+        asset_types = pd.Series(self.manifest["asset_types"], index=self.symbols)
+        out["AssetType"] = asset_types.reindex(first.columns).to_numpy()[np.tile(np.arange(n_syms), n_dates)]
+        # Drop (date, symbol) cells where the symbol did not trade
+        return out[out["Close" if "Close" in frames else self.columns[0]].notna()].reset_index(drop=True)
+
+    def close(self):
+        """Detach; segments still viewed by returned frames stay mapped until those are gone."""
+        global _DETACHED_SEGMENTS
+        self._retire()
+        _DETACHED_SEGMENTS = _close_unviewed(_DETACHED_SEGMENTS + self._retired)
+        self._retired = []
+
+    def __del__(self):
+        # A dropped client must not unmap segments that returned frames still view
+        if getattr(self, "_retired", None) is not None:
+            self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the master price panel from shared memory.")
+    parser.add_argument("--name", default=DEFAULT_SERVICE_NAME, help="Service name used by clients.")
+    parser.add_argument("--start-date", default=None, help="First date loaded (default: configured start date).")
+    parser.add_argument("--poll", type=float, default=60.0, help="Seconds between checks for updated files.")
+    parser.add_argument("--manifest-dir", default=None, help="Directory of the manifest file (default: in the cache directory).")
+    parser.add_argument("--paths", nargs="+", default=None,
+                        help="Master CSVs in stock, bond, commodity order (default: configured paths).")
+    args = parser.parse_args(argv)
+
+    service = PriceService(name=args.name, paths=args.paths, start_date=args.start_date,
+                           manifest_dir=args.manifest_dir)
+    print(f"Price service '{args.name}' manifest: {service.manifest_file}")
+    service.serve_forever(poll_interval=args.poll)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,24 @@
 import numpy as np
 
+from functions.sparse_weights import SparseWeights
+
+__all__ = ["apply_signal_mask"]
+
 def apply_signal_mask(weights_df, signal_df):
     """
     Zero out weights for symbols not in the signal.
 
     Args:
-        weights_df: DataFrame of raw weights (dates x tickers).
+        weights_df: DataFrame or SparseWeights of raw weights (dates x tickers).
         signal_df: Binary DataFrame (dates x tickers), 1 = investable.
 
     Returns:
-        masked_weights_df: Filtered weights with non-signal symbols zeroed.
+        masked_weights_df: Filtered weights with non-signal symbols zeroed
+                           (a SparseWeights for SparseWeights input).
     """
+    if isinstance(weights_df, SparseWeights):
+        return weights_df.mask(signal_df.fillna(0).astype(int)).normalize()
+
     # Align signal_df index to weights_df
     signal_df = signal_df.reindex_like(weights_df).fillna(0).astype(int)
 
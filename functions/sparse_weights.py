@@ -0,0 +1,280 @@
+"""
+Sparse (CSR by date) storage for date x symbol weight matrices.
+
+After signal masking and the long-only clip most weights are zero, yet a dense
+float64 DataFrame stores every cell. SparseWeights keeps only the non-zero
+entries of each date row:
+
+    data[indptr[i]:indptr[i + 1]]     weights of row i
+    indices[indptr[i]:indptr[i + 1]]  their symbol positions (ascending)
+
+Masking, normalization, the backtest's row-wise dot with a dense returns panel
+and turnover work directly on these arrays. backtest_close_to_close,
+scale_to_target_volatility and apply_signal_mask accept a SparseWeights wherever
+they take a weights DataFrame.
+"""
+import numpy as np
+import pandas as pd
+
+__all__ = ["SparseWeights", "as_frame"]
+
+
+class SparseWeights:
+    """
+    Row-compressed weights: one row per date, only non-zero entries stored.
+
+    Args:
+        data (ndarray): Non-zero weights, row by row.
+        indices (ndarray): Symbol position of each weight (ascending within a row).
+        indptr (ndarray): Row start offsets into data, length n_dates + 1.
+        dates (Index): Row labels.
+        symbols (Index): Column labels.
+    """
+
+    def __init__(self, data, indices, indptr, dates, symbols):
+        self.data = np.asarray(data, dtype=float)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.dates = pd.Index(dates)
+        self.symbols = pd.Index(symbols)
+        if len(self.indptr) != len(self.dates) + 1 or self.indptr[-1] != len(self.data):
+            raise ValueError("indptr does not match the dates and data")
+
+    # ------------------------------------------------------------------ #
+    # Conversion
+    # ------------------------------------------------------------------ #
+    @classmethod
+    def from_dense(cls, values, dates, symbols, keep=None):
+        """
+        Build from a (dates x symbols) array.
+
+        Args:
+            values (ndarray): Weights; NaN counts as zero.
+            dates, symbols (Index): Labels.
+            keep (ndarray or None): bool array of the entries to store (None = non-zero).
+
+        Returns:
+            SparseWeights
+        """
+        values = np.asarray(values, dtype=float)
+        if keep is None:
+            keep = np.nan_to_num(values) != 0
+        else:
+            keep = np.asarray(keep, dtype=bool) & (np.nan_to_num(values) != 0)
+        rows, cols = np.nonzero(keep)  # row-major, so already CSR order
+        indptr = np.zeros(values.shape[0] + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=values.shape[0]), out=indptr[1:])
+        return cls(values[rows, cols], cols, indptr, dates, symbols)
+
+    @classmethod
+    def from_frame(cls, df):
+        """Build from a wide weights DataFrame (index=Date, columns=Symbols)."""
+        return cls.from_dense(df.to_numpy(dtype=float), df.index, df.columns)
+
+    def to_dense(self):
+        """(dates x symbols) float array."""
+        out = np.zeros(self.shape)
+        out[self.row_ids(), self.indices] = self.data
+        return out
+
+    def to_frame(self):
+        """Wide weights DataFrame, zeros where nothing is stored."""
+        return pd.DataFrame(self.to_dense(), index=self.dates, columns=self.symbols)
+
+    def to_scipy(self):
+        """The same matrix as a scipy.sparse.csr_matrix."""
+        from scipy.sparse import csr_matrix
+        return csr_matrix((self.data, self.indices, self.indptr), shape=self.shape)
+
+    # ------------------------------------------------------------------ #
+    # Shape and size
+    # ------------------------------------------------------------------ #
+    @property
+    def shape(self):
+        return len(self.dates), len(self.symbols)
+
+    @property
+    def index(self):
+        """Dates, as on a weights DataFrame."""
+        return self.dates
+
+    @property
+    def columns(self):
+        """Symbols, as on a weights DataFrame."""
+        return self.symbols
+
+    @property
+    def nnz(self):
+        return len(self.data)
+
+    @property
+    def density(self):
+        n = self.shape[0] * self.shape[1]
+        return self.nnz / n if n else 0.0
+
+    @property
+    def nbytes(self):
+        """Bytes held by the data, indices and indptr arrays."""
+        return self.data.nbytes + self.indices.nbytes + self.indptr.nbytes
+
+    def __repr__(self):
+        return (f"SparseWeights({self.shape[0]} dates x {self.shape[1]} symbols, "
+                f"nnz={self.nnz}, density={self.density:.1%})")
+
+    def row_ids(self):
+        """Row position of each stored entry."""
+        return np.repeat(np.arange(self.shape[0]), np.diff(self.indptr))
+
+    def row_sums(self):
+        """Sum of the weights of each row."""
+        return np.bincount(self.row_ids(), weights=self.data, minlength=self.shape[0])
+
+    # ------------------------------------------------------------------ #
+    # Row selection and alignment
+    # ------------------------------------------------------------------ #
+    def take_rows(self, positions):
+        """Rows at the given positions (-1 = an empty row), in that order, with their dates."""
+        positions = np.asarray(positions, dtype=np.int64)
+        starts = np.where(positions >= 0, self.indptr[positions], 0)
+        lengths = np.where(positions >= 0, self.indptr[positions + 1] - starts, 0)
+        indptr = np.zeros(len(positions) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        gather = np.repeat(starts - indptr[:-1], lengths) + np.arange(indptr[-1])
+        dates = self.dates.take(np.maximum(positions, 0)) if len(self.dates) else self.dates[:0]
+        return SparseWeights(self.data[gather], self.indices[gather], indptr, dates, self.symbols)
+
+    def reindex(self, dates=None, symbols=None):
+        """
+        Align to new row and/or column labels; missing labels are empty (zero weights).
+
+        Args:
+            dates (list or Index or None): New row labels (None = keep).
+            symbols (list or Index or None): New column labels (None = keep).
+
+        Returns:
+            SparseWeights
+        """
+        out = self
+        if dates is not None:
+            dates = pd.Index(dates)
+            out = out.take_rows(out.dates.get_indexer(dates))
+            out.dates = dates
+        if symbols is not None:
+            symbols = pd.Index(symbols)
+            new_pos = symbols.get_indexer(out.symbols)  # old column -> new column (-1 = dropped)
+            col = new_pos[out.indices]
+            kept = col >= 0
+            rows = out.row_ids()[kept]
+            col = col[kept]
+            order = np.lexsort((col, rows))
+            indptr = np.zeros(out.shape[0] + 1, dtype=np.int64)
+            np.cumsum(np.bincount(rows, minlength=out.shape[0]), out=indptr[1:])
+            out = SparseWeights(out.data[kept][order], col[order], indptr, out.dates, symbols)
+        return out
+
+    # ------------------------------------------------------------------ #
+    # Transformations (each returns a new SparseWeights)
+    # ------------------------------------------------------------------ #
+    def _filtered(self, keep, data=None):
+        data = self.data if data is None else data
+        rows = self.row_ids()[keep]
+        indptr = np.zeros(self.shape[0] + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=self.shape[0]), out=indptr[1:])
+        return SparseWeights(data[keep], self.indices[keep], indptr, self.dates, self.symbols)
+
+    def mask(self, signal):
+        """
+        Entry-wise product with a signal, as weights_df * signal_df in apply_signal_mask:
+        entries where the signal is 0 (or missing) are dropped.
+
+        Args:
+            signal (DataFrame or SparseWeights): Signal / investable flags (dates x symbols);
+                                                 missing dates / symbols count as 0.
+
+        Returns:
+            SparseWeights
+        """
+        if isinstance(signal, SparseWeights):
+            signal = signal.reindex(self.dates, self.symbols)
+            # Match stored entries on sorted (row, column) keys
+            n = self.shape[1]
+            own = self.row_ids() * n + self.indices
+            other = signal.row_ids() * n + signal.indices
+            pos = np.minimum(np.searchsorted(other, own), max(len(other) - 1, 0))
+            hit = (other[pos] == own) if len(other) else np.zeros(self.nnz, dtype=bool)
+            factors = np.where(hit, signal.data[pos] if len(other) else 0.0, 0.0)
+        else:
+            dense = signal.reindex(index=self.dates, columns=self.symbols).fillna(0).to_numpy(dtype=float)
+            factors = dense[self.row_ids(), self.indices]
+        data = self.data * factors
+        return self._filtered(data != 0, data)
+
+    def clip(self, lower=None, upper=None):
+        """Clip the stored weights; entries clipped to zero are dropped."""
+        data = np.clip(self.data, lower, upper)
+        return self._filtered(data != 0, data)
+
+    def scale_rows(self, factors):
+        """Multiply each row by a factor (array of length n_dates)."""
+        factors = np.asarray(factors, dtype=float)
+        data = self.data * factors[self.row_ids()]
+        return self._filtered(data != 0, data)
+
+    def normalize(self):
+        """Rows divided by their sum; rows summing to zero become empty (apply_signal_mask rule)."""
+        sums = self.row_sums()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            factors = np.where(sums != 0, 1.0 / sums, 0.0)
+        return self.scale_rows(factors)
+
+    def shift(self, periods=1):
+        """Rows moved `periods` dates later (leading rows empty), like DataFrame.shift."""
+        n = self.shape[0]
+        positions = np.arange(n) - periods
+        positions[(positions < 0) | (positions >= n)] = -1
+        out = self.take_rows(positions)
+        out.dates = self.dates
+        return out
+
+    # ------------------------------------------------------------------ #
+    # Products
+    # ------------------------------------------------------------------ #
+    def row_dot(self, dense):
+        """
+        Row-wise dot product with a dense (dates x symbols) array; NaN counts as zero.
+
+        Args:
+            dense (ndarray): Same shape as the weights (e.g. asset returns).
+
+        Returns:
+            ndarray: One value per row.
+        """
+        dense = np.asarray(dense)
+        if dense.shape != self.shape:
+            raise ValueError(f"dense shape {dense.shape} does not match {self.shape}")
+        rows = self.row_ids()
+        values = dense[rows, self.indices]
+        values = np.where(np.isnan(values), 0.0, values)
+        return np.bincount(rows, weights=self.data * values, minlength=self.shape[0])
+
+    def turnover(self):
+        """
+        Sum of absolute weight changes between consecutive rows (row 0: its gross weight).
+
+        Returns:
+            ndarray: One value per row.
+        """
+        n_rows, n_cols = self.shape
+        rows = self.row_ids()
+        keys = np.concatenate([rows * n_cols + self.indices, (rows + 1) * n_cols + self.indices])
+        values = np.concatenate([self.data, -self.data])
+        inside = keys < n_rows * n_cols
+        keys, values = keys[inside], values[inside]
+        unique, inverse = np.unique(keys, return_inverse=True)
+        change = np.abs(np.bincount(inverse, weights=values, minlength=len(unique)))
+        return np.bincount(unique // n_cols, weights=change, minlength=n_rows)
+
+
+def as_frame(weights):
+    """A weights DataFrame for either a DataFrame or a SparseWeights."""
+    return weights.to_frame() if isinstance(weights, SparseWeights) else weights
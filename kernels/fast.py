@@ -0,0 +1,216 @@
+"""
+Compiled implementations of the sequential kernels (numba).
+
+Same signatures and outputs as kernels.reference; each public function prepares
+contiguous arrays and calls a JIT-compiled loop. Importing this module raises
+ImportError when numba is not installed (kernels.get_backend then falls back to
+the reference backend). Functions compile on first call and are cached on disk.
+"""
+import numpy as np
+from numba import njit
+
+__all__ = [
+    "ewma",
+    "rolling_count",
+    "drawdown_recovery",
+    "drawdown_stop_path",
+    "rebalance_hold_index",
+    "no_trade_band",
+]
+
+
+@njit(cache=True)
+def _ewma(x, alpha, out):
+    n_rows, n_cols = x.shape
+    decay = 1.0 - alpha
+    for j in range(n_cols):
+        weighted = x[0, j]
+        old_wt = 1.0
+        out[0, j] = weighted
+        for i in range(1, n_rows):
+            cur = x[i, j]
+            if weighted == weighted:
+                old_wt *= decay
+                if cur == cur:
+                    if weighted != cur:
+                        weighted = (old_wt * weighted + alpha * cur) / (old_wt + alpha)
+                    old_wt = 1.0
+            elif cur == cur:
+                weighted = cur
+            out[i, j] = weighted
+
+
+def ewma(values, alpha):
+    x = np.ascontiguousarray(values, dtype=np.float64)
+    out = np.empty_like(x)
+    if x.shape[0]:
+        _ewma(x, float(alpha), out)
+    return out
+
+
+@njit(cache=True)
+def _rolling_count(f, window, out):
+    n_rows, n_cols = f.shape
+    for j in range(n_cols):
+        total = 0
+        for i in range(n_rows):
+            total += f[i, j]
+            if i >= window:
+                total -= f[i - window, j]
+            if i >= window - 1:
+                out[i, j] = total
+
+
+def rolling_count(flags, window):
+    f = np.ascontiguousarray(flags, dtype=np.int64)
+    out = np.full(f.shape, np.nan)
+    if f.shape[0] >= window:
+        _rolling_count(f, int(window), out)
+    return out
+
+
+@njit(cache=True)
+def _drawdown_recovery(w):
+    n = len(w)
+    peak = w[0]
+    peak_pos = 0
+    max_dd = 0.0
+    start = 0
+    trough = 0
+    for i in range(n):
+        if w[i] >= peak:
+            peak = w[i]
+            peak_pos = i
+        dd = w[i] / peak - 1.0
+        if dd < max_dd:
+            max_dd = dd
+            start = peak_pos
+            trough = i
+    recovery = -1
+    for i in range(trough, n):
+        if w[i] >= w[start]:
+            recovery = i
+            break
+    return max_dd, start, trough, recovery
+
+
+def drawdown_recovery(wealth):
+    w = np.ascontiguousarray(wealth, dtype=np.float64)
+    if len(w) == 0:
+        return 0.0, -1, -1, -1
+    max_dd, start, trough, recovery = _drawdown_recovery(w)
+    return float(max_dd), int(start), int(trough), int(recovery)
+
+
+@njit(cache=True)
+def _drawdown_stop_path(returns, kelly, limit, resume_recovery, min_stop_days, scale_by_kelly,
+                        drawdown, stopped, exposure):
+    value = 1.0
+    peak = 1.0
+    is_stopped = False
+    shadow = 1.0
+    trough = 1.0
+    stop_days = 0
+    for t in range(len(returns)):
+        dd = value / peak - 1
+        if not is_stopped:
+            if dd <= limit[t]:
+                is_stopped = True
+                shadow = 1.0
+                trough = 1.0
+                stop_days = 0
+        elif stop_days >= min_stop_days and shadow >= trough * (1 + resume_recovery):
+            is_stopped = False
+            peak = value
+            dd = 0.0
+
+        drawdown[t] = dd
+        stopped[t] = is_stopped
+        if is_stopped:
+            exposure[t] = 0.0
+        elif scale_by_kelly:
+            exposure[t] = kelly[t]
+        else:
+            exposure[t] = 1.0
+
+        value *= 1 + exposure[t] * returns[t]
+        peak = max(peak, value)
+        if is_stopped:
+            shadow *= 1 + returns[t]
+            trough = min(trough, shadow)
+            stop_days += 1
+
+
+def drawdown_stop_path(returns, kelly, limit, resume_recovery, min_stop_days, scale_by_kelly):
+    returns = np.ascontiguousarray(returns, dtype=np.float64)
+    n = len(returns)
+    drawdown = np.empty(n)
+    stopped = np.zeros(n, dtype=np.bool_)
+    exposure = np.empty(n)
+    _drawdown_stop_path(returns, np.ascontiguousarray(kelly, dtype=np.float64),
+                        np.ascontiguousarray(limit, dtype=np.float64), float(resume_recovery),
+                        int(min_stop_days), bool(scale_by_kelly), drawdown, stopped, exposure)
+    return drawdown, stopped, exposure
+
+
+@njit(cache=True)
+def _rebalance_hold_index(ok, rebalance_freq, held):
+    current = 0 if ok[0] else -1
+    last = 0
+    held[0] = -1
+    for i in range(1, len(ok)):
+        if i - last >= rebalance_freq:
+            if ok[i - 1]:
+                current = i - 1
+                last = i
+            else:
+                current = -1
+        held[i] = current
+
+
+def rebalance_hold_index(ok, rebalance_freq):
+    ok = np.ascontiguousarray(ok, dtype=np.bool_)
+    held = np.full(len(ok), -1, dtype=np.int64)
+    if len(ok):
+        _rebalance_hold_index(ok, int(rebalance_freq), held)
+    return held
+
+
+@njit(cache=True)
+def _no_trade_band(targets, returns, band, to_edge, held, trades):
+    n_strats, n_dates, n_syms = targets.shape
+    w = np.zeros(n_syms)
+    for s in range(n_strats):
+        w[:] = 0.0
+        for t in range(n_dates):
+            if t > 0:
+                growth = 1.0
+                for j in range(n_syms):
+                    growth += w[j] * returns[t, j]
+                if growth > 0:
+                    for j in range(n_syms):
+                        w[j] = w[j] * (1.0 + returns[t, j]) / growth
+            for j in range(n_syms):
+                target = targets[s, t, j]
+                dev = target - w[j]
+                new = w[j]
+                if target == 0:
+                    new = 0.0
+                elif abs(dev) > band:
+                    if to_edge:
+                        new = target - band if dev > 0 else target + band
+                    else:
+                        new = target
+                trades[s, t, j] = new - w[j]
+                held[s, t, j] = new
+                w[j] = new
+
+
+def no_trade_band(targets, returns, band, to_edge):
+    targets = np.ascontiguousarray(targets, dtype=np.float64)
+    held = np.zeros_like(targets)
+    trades = np.zeros_like(targets)
+    if targets.size:
+        _no_trade_band(targets, np.ascontiguousarray(returns, dtype=np.float64), float(band),
+                       bool(to_edge), held, trades)
+    return held, trades
@@ -0,0 +1,217 @@
+"""
+Kernel dispatch for the sequential loops of the pipeline.
+
+Two interchangeable backends implement the same functions:
+
+    reference  pure NumPy (kernels.reference), always available
+    fast       numba JIT-compiled loops (kernels.fast), optional
+
+The backend is chosen per call (backend=...) or by compute.backend in the run
+configuration. Asking for 'fast' without numba installed falls back to the
+reference kernels with a warning. check_kernels() runs every kernel on both
+backends and compares the outputs; tests/test_kernels.py runs the same comparison
+(and checks the reference against pandas and plain loops) under pytest.
+"""
+import numpy as np
+
+from config import get_config
+from kernels import reference
+from profiling.instrumentation import span
+
+__all__ = [
+    "KERNEL_NAMES",
+    "get_backend",
+    "available_backends",
+    "ewma",
+    "rolling_count",
+    "drawdown_recovery",
+    "drawdown_stop_path",
+    "rebalance_hold_index",
+    "no_trade_band",
+    "check_kernels",
+]
+
+KERNEL_NAMES = ("ewma", "rolling_count", "drawdown_recovery", "drawdown_stop_path", "rebalance_hold_index",
+                "no_trade_band")
+
+_BACKENDS = {"reference": reference}
+
+
+def _load_fast():
+    if "fast" not in _BACKENDS:
+        try:
+            from kernels import fast
+        except ImportError as e:
+            print(f"[WARN] Compiled kernels unavailable ({e}); using the reference backend.")
+            fast = None
+        _BACKENDS["fast"] = fast
+    return _BACKENDS["fast"]
+
+
+def get_backend(backend=None):
+    """
+    Kernel module for a backend name (None = configured compute.backend).
+
+    Args:
+        backend (str or None): 'reference' or 'fast'.
+
+    Returns:
+        module: kernels.reference or kernels.fast.
+    """
+    backend = backend or get_config().compute.backend
+    if backend == "reference":
+        return reference
+    if backend == "fast":
+        return _load_fast() or reference
+    raise ValueError("backend must be 'reference' or 'fast'")
+
+
+def available_backends():
+    """Names of the backends that can run here."""
+    return ["reference"] + (["fast"] if _load_fast() is not None else [])
+
+
+def ewma(values, span=None, alpha=None, backend=None):
+    """
+    Column-wise EWMA with pandas' ewm(adjust=False).mean() semantics.
+
+    Args:
+        values (ndarray): (rows, columns) float array, NaN = missing.
+        span (float or None): EWMA span (alpha = 2 / (span + 1)).
+        alpha (float or None): Smoothing factor, if span is not given.
+        backend (str or None): Kernel backend (None = configured).
+
+    Returns:
+        ndarray: Same shape as values.
+    """
+    if alpha is None:
+        if span is None:
+            raise ValueError("Give span or alpha.")
+        alpha = 2.0 / (span + 1.0)
+    values = np.asarray(values, dtype=float)
+    squeeze = values.ndim == 1
+    out = get_backend(backend).ewma(values[:, None] if squeeze else values, alpha)
+    return out[:, 0] if squeeze else out
+
+
+def rolling_count(flags, window, backend=None):
+    """Trailing count of True flags per column (NaN for the first window - 1 rows)."""
+    return get_backend(backend).rolling_count(np.asarray(flags, dtype=bool), window)
+
+
+def drawdown_recovery(wealth, backend=None):
+    """(max_dd, start, trough, recovery) positions of a wealth path (recovery -1 if none)."""
+    return get_backend(backend).drawdown_recovery(np.asarray(wealth, dtype=float))
+
+
+def drawdown_stop_path(returns, kelly, limit, resume_recovery, min_stop_days, scale_by_kelly, backend=None):
+    """(drawdown, stopped, exposure) of the risk_overlay stop rule (see kernels.reference)."""
+    return get_backend(backend).drawdown_stop_path(
+        np.asarray(returns, dtype=float), np.asarray(kelly, dtype=float), np.asarray(limit, dtype=float),
+        resume_recovery, min_stop_days, scale_by_kelly)
+
+
+def rebalance_hold_index(ok, rebalance_freq, backend=None):
+    """Weights row held on each day under the rebalancing schedule (-1 = no position)."""
+    return get_backend(backend).rebalance_hold_index(np.asarray(ok, dtype=bool), rebalance_freq)
+
+
+def no_trade_band(targets, returns, band, to_edge=False, backend=None):
+    """
+    (held, trades) under a no-trade band around the target weights (see kernels.reference).
+
+    Args:
+        targets (ndarray): (dates, symbols) or (strategies, dates, symbols) target weights.
+        returns (ndarray): (dates, symbols) close-to-close returns (row 0 is ignored).
+        band (float): Band half-width in weight units.
+        to_edge (bool): Trade to the band edge instead of the target.
+        backend (str or None): Kernel backend (None = configured).
+
+    Returns:
+        tuple: (held, trades) with the shape of targets.
+    """
+    targets = np.nan_to_num(np.asarray(targets, dtype=float))
+    returns = np.nan_to_num(np.asarray(returns, dtype=float))
+    squeeze = targets.ndim == 2
+    held, trades = get_backend(backend).no_trade_band(
+        targets[None] if squeeze else targets, returns, float(band), bool(to_edge))
+    return (held[0], trades[0]) if squeeze else (held, trades)
+
+
+def _check_cases(n_rows, n_cols, seed):
+    rng = np.random.default_rng(seed)
+    values = rng.normal(0, 0.01, (n_rows, n_cols))
+    values[rng.random(values.shape) < 0.1] = np.nan
+    values[:rng.integers(1, 20), 0] = np.nan  # late start
+    values[:, -1] = np.nan                    # never observed
+    returns = rng.normal(0.0003, 0.015, n_rows)
+    returns[n_rows // 3:n_rows // 3 + 20] = -0.03  # force a stop
+    kelly = rng.uniform(0, 1, n_rows)
+    ok = rng.random(n_rows) > 0.05
+    targets = np.abs(rng.normal(0, 1, (3, n_rows, 10)))
+    targets /= targets.sum(axis=2, keepdims=True)
+    targets[:, :, 0] *= rng.random(n_rows) > 0.2  # exits
+    band_returns = np.nan_to_num(values[:, :10])
+    return {
+        "ewma": lambda k: k.ewma(values, 2.0 / 61.0),
+        "rolling_count": lambda k: k.rolling_count(values > 0.002, 60),
+        "drawdown_recovery": lambda k: np.array(k.drawdown_recovery(np.cumprod(1 + returns)), dtype=float),
+        "drawdown_stop_path": lambda k: np.column_stack(
+            k.drawdown_stop_path(returns, kelly, -0.10 * (1 - 0.5 * kelly), 0.05, 1, True)).astype(float),
+        "rebalance_hold_index": lambda k: np.column_stack(
+            [k.rebalance_hold_index(ok, f) for f in (1, 5, 21)] +
+            [k.rebalance_hold_index(np.ones(n_rows, dtype=bool), f) for f in (1, 5, 21)]).astype(float),
+        "no_trade_band": lambda k: np.concatenate(
+            [np.concatenate(k.no_trade_band(targets, band_returns, 0.02, e), axis=2) for e in (False, True)], axis=2),
+    }
+
+
+def check_kernels(backends=None, n_rows=1000, n_cols=50, seed=0, atol=1e-12):
+    """
+    Run every kernel on random data with missing values under each backend and
+    compare with the reference backend (and, for the reference itself, with the
+    pandas / loop formulations it replaces).
+
+    Args:
+        backends (list or None): Backends to check (None = available_backends()).
+        n_rows, n_cols (int): Size of the random panels.
+        seed (int): Random seed.
+        atol (float): Maximum absolute difference allowed (NaN must match NaN).
+
+    Returns:
+        tuple: (bool all equal, dict backend -> {kernel: max abs difference})
+    """
+    import pandas as pd
+
+    cases = _check_cases(n_rows, n_cols, seed)
+    expected = {name: case(reference) for name, case in cases.items()}
+
+    # The reference against the pandas formulations used before the kernel layer
+    rng = np.random.default_rng(seed)
+    panel = pd.DataFrame(rng.normal(0, 0.01, (n_rows, n_cols)))
+    panel[panel.abs() > 0.02] = np.nan
+    pandas_checks = {
+        "ewma": (reference.ewma(panel.to_numpy(), 2.0 / 61.0), panel.ewm(span=60, adjust=False).mean().to_numpy()),
+        "rolling_count": (reference.rolling_count(panel.to_numpy() > 0.002, 60),
+                          (panel > 0.002).astype(int).rolling(window=60).sum().to_numpy()),
+    }
+
+    def max_diff(a, b):
+        a, b = np.asarray(a, dtype=float), np.asarray(b, dtype=float)
+        if a.shape != b.shape or not np.array_equal(np.isnan(a), np.isnan(b)):
+            return float("inf")
+        both = ~np.isnan(a)
+        return float(np.max(np.abs(a[both] - b[both]), initial=0.0))
+
+    report = {"pandas": {name: max_diff(a, b) for name, (a, b) in pandas_checks.items()}}
+    for name in backends or available_backends():
+        if name == "reference":
+            continue
+        module = get_backend(name)
+        with span("kernels.check", backend=name):
+            report[name] = {k: max_diff(case(module), expected[k]) for k, case in cases.items()}
+
+    ok = all(d <= atol for diffs in report.values() for d in diffs.values())
+    if not ok:
+        print(f"[WARN] Kernel backends disagree: {report}")
+    return ok, report
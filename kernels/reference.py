@@ -0,0 +1,235 @@
+"""
+Reference (pure NumPy) implementations of the sequential kernels.
+
+Recursions that cannot be vectorized over time loop over rows with numpy
+operations across columns; everything else is closed-form array code. These
+define the expected outputs that the compiled backend must reproduce.
+"""
+import numpy as np
+
+__all__ = [
+    "ewma",
+    "rolling_count",
+    "drawdown_recovery",
+    "drawdown_stop_path",
+    "rebalance_hold_index",
+    "no_trade_band",
+]
+
+
+def ewma(values, alpha):
+    """
+    Column-wise exponentially weighted mean with pandas' ewm(alpha=alpha, adjust=False)
+    semantics (ignore_na=False): a missing value keeps the previous mean and decays its
+    weight, so the next observation counts for more.
+
+    Args:
+        values (ndarray): (rows, columns) float array, NaN = missing.
+        alpha (float): Smoothing factor in (0, 1].
+
+    Returns:
+        ndarray: Same shape; NaN before each column's first observation.
+    """
+    x = np.asarray(values, dtype=float)
+    out = np.empty_like(x)
+    if x.shape[0] == 0:
+        return out
+    weighted = x[0].copy()
+    old_wt = np.ones(x.shape[1:])
+    out[0] = weighted
+    decay = 1.0 - alpha
+    for i in range(1, x.shape[0]):
+        cur = x[i]
+        obs = ~np.isnan(cur)
+        has = ~np.isnan(weighted)
+        old_wt = np.where(has, old_wt * decay, old_wt)
+        update = has & obs
+        with np.errstate(invalid='ignore'):
+            blended = (old_wt * weighted + alpha * cur) / (old_wt + alpha)
+            weighted = np.where(update & (weighted != cur), blended, weighted)
+        old_wt = np.where(update, 1.0, old_wt)
+        weighted = np.where(~has & obs, cur, weighted)
+        out[i] = weighted
+    return out
+
+
+def rolling_count(flags, window):
+    """
+    Number of True flags in the last `window` rows of each column, as
+    DataFrame(flags.astype(int)).rolling(window).sum().
+
+    Args:
+        flags (ndarray): (rows, columns) bool array.
+        window (int): Window length in rows.
+
+    Returns:
+        ndarray: float counts; NaN for the first window - 1 rows.
+    """
+    f = np.asarray(flags, dtype=bool)
+    out = np.full(f.shape, np.nan)
+    if f.shape[0] < window:
+        return out
+    csum = np.cumsum(f, axis=0, dtype=np.int64)
+    out[window - 1] = csum[window - 1]
+    out[window:] = csum[window:] - csum[:-window]
+    return out
+
+
+def drawdown_recovery(wealth):
+    """
+    Maximum drawdown of a wealth path and the positions of its peak, trough and
+    recovery (first point at or above the peak after the trough).
+
+    Args:
+        wealth (ndarray): 1-D positive wealth path.
+
+    Returns:
+        tuple: (max_dd <= 0, start, trough, recovery); recovery is -1 if never recovered.
+    """
+    w = np.asarray(wealth, dtype=float)
+    if len(w) == 0:
+        return 0.0, -1, -1, -1
+    running_max = np.maximum.accumulate(w)
+    drawdown = w / running_max - 1.0
+    trough = int(np.argmin(drawdown))
+    at_peak = np.flatnonzero(w[:trough + 1] == running_max[:trough + 1])
+    start = int(at_peak[-1]) if len(at_peak) else 0
+    recovered = np.flatnonzero(w[trough:] >= w[start])
+    recovery = trough + int(recovered[0]) if len(recovered) else -1
+    return float(drawdown[trough]), start, trough, recovery
+
+
+def drawdown_stop_path(returns, kelly, limit, resume_recovery, min_stop_days, scale_by_kelly):
+    """
+    Path of the drawdown stop of risk_overlay.
+
+    Before each day the stop rule of check_stop_loss is evaluated on the overlay's
+    own equity. Once stopped, exposure is zero until the strategy's (un-overlaid)
+    equity has risen `resume_recovery` above its low since the stop, for at least
+    `min_stop_days` days; on resuming, the running max restarts at the current
+    value so the old drawdown cannot re-trigger the stop (hysteresis).
+
+    Args:
+        returns (ndarray): Daily strategy returns.
+        kelly (ndarray): Kelly fraction per day.
+        limit (ndarray): Drawdown limit per day (negative).
+        resume_recovery (float): Rise from the low while stopped needed to resume.
+        min_stop_days (int): Minimum number of days spent stopped.
+        scale_by_kelly (bool): Exposure = Kelly fraction while active (else 1).
+
+    Returns:
+        tuple: (drawdown, stopped, exposure) arrays.
+    """
+    n = len(returns)
+    drawdown = np.empty(n)
+    stopped = np.zeros(n, dtype=bool)
+    exposure = np.empty(n)
+
+    value = peak = 1.0
+    is_stopped = False
+    shadow = trough = 1.0
+    stop_days = 0
+    for t in range(n):
+        dd = value / peak - 1
+        if not is_stopped:
+            if dd <= limit[t]:
+                is_stopped = True
+                shadow = trough = 1.0
+                stop_days = 0
+        elif stop_days >= min_stop_days and shadow >= trough * (1 + resume_recovery):
+            is_stopped = False
+            peak = value
+            dd = 0.0
+
+        drawdown[t] = dd
+        stopped[t] = is_stopped
+        exposure[t] = 0.0 if is_stopped else (kelly[t] if scale_by_kelly else 1.0)
+
+        value *= 1 + exposure[t] * returns[t]
+        peak = max(peak, value)
+        if is_stopped:
+            shadow *= 1 + returns[t]
+            trough = min(trough, shadow)
+            stop_days += 1
+
+    return drawdown, stopped, exposure
+
+
+def rebalance_hold_index(ok, rebalance_freq):
+    """
+    Which weights row is held on each day under backtest_with_rebalancing's schedule.
+
+    Weights computed on day 0 are held first; on day i, once rebalance_freq days have
+    passed since the last successful rebalance, the weights of day i - 1 replace them.
+    A failed rebalance (ok False) leaves no position and is retried the next day.
+
+    Args:
+        ok (ndarray): bool per day, True if that day's weights are available.
+        rebalance_freq (int): Days between rebalances.
+
+    Returns:
+        ndarray: int per day, the row held for the return into that day (-1 = no position;
+                 always -1 on day 0).
+    """
+    ok = np.asarray(ok, dtype=bool)
+    n = len(ok)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    if ok.all():
+        # No failures: rebalance on days freq, 2 * freq, ... using the previous day's weights
+        held = (np.arange(n, dtype=np.int64) // rebalance_freq) * rebalance_freq - 1
+        held[held < 0] = 0
+        held[0] = -1
+        return held
+
+    held = np.full(n, -1, dtype=np.int64)
+    current = 0 if ok[0] else -1
+    last = 0
+    for i in range(1, n):
+        if i - last >= rebalance_freq:
+            if ok[i - 1]:
+                current = i - 1
+                last = i
+            else:
+                current = -1
+        held[i] = current
+    return held
+
+
+def no_trade_band(targets, returns, band, to_edge):
+    """
+    Holdings under a no-trade band around the target weights.
+
+    Between closes the held weights drift with the asset returns. At each close an
+    asset is traded only if its held weight is more than `band` away from its target,
+    either all the way to the target or (to_edge) to the nearest band edge. A target
+    of exactly zero always closes the position.
+
+    Args:
+        targets (ndarray): (strategies, dates, symbols) target weights, no NaN.
+        returns (ndarray): (dates, symbols) close-to-close returns, row 0 and missing = 0.
+        band (float): Band half-width in weight units.
+        to_edge (bool): Trade to the band edge instead of the target.
+
+    Returns:
+        tuple: (held, trades), both (strategies, dates, symbols): weights after each
+               close's trades and the trades themselves.
+    """
+    n_strats, n_dates, n_syms = targets.shape
+    held = np.zeros_like(targets)
+    trades = np.zeros_like(targets)
+    w = np.zeros((n_strats, n_syms))
+    for t in range(n_dates):
+        if t > 0:
+            growth = 1.0 + w @ returns[t]
+            ok = growth > 0
+            w[ok] = w[ok] * (1.0 + returns[t]) / growth[ok, None]
+        target = targets[:, t]
+        dev = target - w
+        trade = (np.abs(dev) > band) | ((target == 0) & (w != 0))
+        goal = target - np.sign(dev) * band if to_edge else target
+        new = np.where(trade, np.where(target == 0, 0.0, goal), w)
+        trades[:, t] = new - w
+        held[:, t] = new
+        w = new
+    return held, trades
@@ -1,59 +1,91 @@
-from optimize.optimisation import *
-from backtest.backtest import *
-from metrics.metrics import *
-from data_loading.data_loading import *
-from functions.functions import *
-from strategy.strategy import *
-import numpy as np
-import re
-
-def run_pipeline(date):
-    # ... your existing logic to produce `returns` (pd.Series) ...
-    df = load_price_data()
-    # Make sure Date is a column
-    date = pd.to_datetime(date)
-    df.index = pd.to_datetime(df.index)
-    df = df[df.index <= date]
-    safe_assets = filter_by_var(df)
-    price_df = df[df['Symbol'].isin(safe_assets)]
-
-    # Step 2: Filter by volatility
-    stable_assets = filter_by_volatility(price_df=price_df)
-    price_df = price_df[price_df['Symbol'].isin(stable_assets)]
-
-    # Step 3: Filter by trend
-    trending_assets = filter_by_var(price_df=price_df)
-    price_df = price_df[price_df['Symbol'].isin(trending_assets)]
-
-    # Step 4: Filter by correlation
-    final_assets, corr_matrix = filter_by_correlation(price_df, corr_threshold=0.3)
-    final_price_df = price_df[price_df['Symbol'].isin(final_assets)]
-
-    momentum_df, signals = ewma_momentum_signals(final_price_df, span=60, threshold=0.002, min_days_above_thresh=5)
-    long_signals = signals.clip(lower=0)
-
-    weights = inverse_volatility_weights(final_price_df)
-    final_weights = long_signals * weights
-    final_weights = final_weights.div(final_weights.sum(axis=1).replace(0, np.nan), axis=0).fillna(0)
-
-    returns, metrics = backtest_metrics_close_to_close(price_df, final_weights)
+import argparse
+import sys
+from pathlib import Path
+
+from backtest.backtest import backtest_metrics_close_to_close
+from config import load_config, set_config
+from data_loading.data_loading import load_price_data
+from pipeline.stages import point_in_time, select_universe, compute_signal_weights
+from profiling import instrumentation
+from profiling.instrumentation import span
+
+# Heavy backends (riskfolio, scipy.optimize, scipy.stats, matplotlib,
+# pandas_market_calendars) are imported on demand by the functions that need
+# them, so a run that never optimizes or plots does not pay for them at startup.
+
+
+def run_pipeline(date, profile_path=None, plot=True):
+    """
+    Run the end-to-end pipeline up to `date`.
+
+    Args:
+        date (str or datetime): As-of date.
+        profile_path (str or None): If given, record stage timings, peak memory and
+                                    counters, write a JSON trace there and print a summary.
+        plot (bool): Save the performance chart and update the README.
+
+    Returns:
+        tuple: (daily returns Series, metrics dict)
+    """
+    if profile_path is not None:
+        instrumentation.reset()
+        instrumentation.enable(trace_memory=True)
+
+    try:
+        with span("pipeline.load"):
+            df = load_price_data(compact=True, columns=["Close"])
+            df = point_in_time(df, date)
+
+        with span("pipeline.filters"):
+            final_assets, final_price_df, _ = select_universe(df)
+
+        momentum_df, signals, final_weights = compute_signal_weights(final_price_df, sparse=True)
+
+        with span("pipeline.backtest"):
+            returns, metrics = backtest_metrics_close_to_close(final_price_df, final_weights)
+    finally:
+        # A failing stage must not leave instrumentation (and tracemalloc) running
+        if profile_path is not None:
+            instrumentation.disable()
+
+    if profile_path is not None:
+        trace_path = instrumentation.export_trace(profile_path)
+        instrumentation.print_summary()
+        print(f"Saved profile trace to: {trace_path}")
+
+    if not plot:
+        return returns, metrics
 
     # Save plot and update README
-    assets_dir = Path("charts")
-    img_name = f"strategy_performance.png"
-    img_path = assets_dir / img_name
+    from reports.plotting import plot_performance, update_readme_with_image
 
     saved = plot_performance(returns, save_path="charts/perf_dd.png", show=False)
     if saved:
         # Use relative path in README (adjust if your README is in a different folder)
         readme_path = Path("README.md")
-        rel_path = str(img_path.as_posix())
-        update_readme_with_image(readme_path="README.md", image_path="charts/perf_dd.png", section_header="## 📈 Strategy Performance")
+        update_readme_with_image(readme_path="README.md", image_rel_path="charts/perf_dd.png", section_header="## 📈 Strategy Performance")
         print(f"Saved performance image to: {saved}")
         print(f"Updated README at: {readme_path.resolve()}")
     else:
         print("Plot not saved (no save_path provided).")
 
+    return returns, metrics
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the AFROS strategy pipeline for one as-of date.")
+    parser.add_argument("--date", default="2025-01-01", help="as-of date (YYYY-MM-DD)")
+    parser.add_argument("--profile", default=None, metavar="TRACE_JSON", help="record a profiling trace to this path")
+    parser.add_argument("--no-plot", action="store_true", help="skip the chart and README update (no matplotlib import)")
+    parser.add_argument("--config", default=None, metavar="FILE", help="run profile (.toml or .json); default $AFROS_CONFIG")
+    args = parser.parse_args(argv)
+    set_config(load_config(args.config))
+
+    _, metrics = run_pipeline(date=args.date, profile_path=args.profile, plot=not args.no_plot)
+    for name, value in metrics.items():
+        print(f"{name}: {value:.4f}")
+    return 0
+
+
 if __name__ == "__main__":
-    run_pipeline(date="2025-01-01")
-    
\ No newline at end of file
+    sys.exit(main())
@@ -1,6 +1,37 @@
 import numpy as np
+import pandas as pd
 
-def performance_metrics(returns, freq=252, risk_free_rate=0.0):
+__all__ = ["performance_metrics", "periods_per_year"]
+
+
+def periods_per_year(bar_size=None, trading_days=252, session_minutes=390):
+    """
+    Annualization factor for returns sampled at a given bar size.
+
+    Intraday bars are counted over regular trading hours (390 minutes per session
+    by default), so 5-minute bars give 252 * 78 periods per year. Bar sizes of a
+    day or more count sessions.
+
+    Args:
+        bar_size (str or Timedelta or None): e.g. '1min', '5min', '1h', '1D', '5D'. None = daily.
+        trading_days (int): Sessions per year.
+        session_minutes (int): Length of a regular session in minutes.
+
+    Returns:
+        float: Number of bars per year.
+    """
+    if bar_size is None:
+        return float(trading_days)
+    bar = pd.Timedelta(bar_size)
+    if bar >= pd.Timedelta(days=1):
+        return trading_days / (bar / pd.Timedelta(days=1))
+    # A final partial bar still counts as a bar
+    return trading_days * np.ceil(pd.Timedelta(minutes=session_minutes) / bar)
+
+
+def performance_metrics(returns, freq=252, risk_free_rate=0.0, bar_size=None):
+    if bar_size is not None:
+        freq = periods_per_year(bar_size)
     cumulative = (1 + returns).prod() - 1
     annualized = (1 + cumulative)**(freq / len(returns)) - 1
     volatility = returns.std() * np.sqrt(freq)
@@ -0,0 +1,463 @@
+"""
+Batched long-only mean-variance optimization over rolling windows.
+
+For every estimation window the long-only, fully invested efficient frontier is
+traced parametrically: for a grid of risk-aversion trade-offs lambda,
+
+    minimize  w' S w - lambda * mu' w   subject to  w >= 0, sum(w) = 1
+
+(lambda = 0 is the minimum-variance portfolio, large lambda the highest-mean
+asset). All frontier points of a chunk of windows are solved together by
+accelerated projected gradient (FISTA) with a batched projection onto the simplex;
+once the iterations have found which assets are held, the KKT system on that
+support is solved exactly (the critical-line step) and accepted when optimal.
+Each chunk first tries the supports of the last solved window's frontier, since
+consecutive windows share all but one return and their supports rarely change.
+
+The moments come from rolling_moments, one (windows x N x N) covariance stack
+built with batched matrix products (pairwise-complete, like DataFrame.cov), which
+the frontier, the max-Sharpe selection and black_litterman all take as input.
+"""
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from config import get_config
+from profiling.instrumentation import instrumented, span, count
+
+__all__ = [
+    "rolling_moments",
+    "project_simplex",
+    "frontier_weights",
+    "black_litterman",
+    "rolling_efficient_frontier",
+    "rolling_frontier_max_sharpe",
+]
+
+
+def _wide_returns(df, price_column="Close"):
+    df = df.reset_index() if df.index.name == 'Date' else df
+    price_df = df.pivot(index='Date', columns='Symbol', values=price_column).sort_index().sort_index(axis=1)
+    return price_df.pct_change(fill_method=None).iloc[1:]
+
+
+def rolling_moments(returns, window=60, step=1, chunk_size=None, shrinkage=0.0):
+    """
+    Mean vector and covariance matrix of every rolling window of returns.
+
+    Window k covers rows ends[k] - window .. ends[k] - 1, so its moments only use
+    returns before row ends[k] (the row the resulting weights apply to).
+    Missing returns are skipped pairwise, as DataFrame.cov does.
+
+    With more assets than returns per window the sample covariance is singular and
+    long-only minimum-variance problems become degenerate; shrinkage blends it with
+    (trace / N) * I, either with a fixed intensity or the Ledoit-Wolf (2004) estimate
+    per window (computed on the demeaned, zero-filled window).
+
+    Args:
+        returns (ndarray): (dates x symbols) simple returns, NaN = missing.
+        window (int): Returns per window.
+        step (int): Rows between consecutive window ends.
+        chunk_size (int or None): Windows per batched product (None = configured compute.chunk_size).
+        shrinkage (float or str): Intensity in [0, 1], or 'ledoit_wolf'.
+
+    Returns:
+        tuple: (ends, mu, cov, n_obs) with ends (windows,), mu (windows x N),
+               cov (windows x N x N; NaN for pairs with fewer than 2 common returns)
+               and n_obs (windows x N) observations per asset.
+    """
+    returns = np.asarray(returns, dtype=float)
+    n_rows, n = returns.shape
+    ends = np.arange(window, n_rows + 1, step)
+    chunk_size = chunk_size or get_config().compute.chunk_size
+
+    mask = ~np.isnan(returns)
+    x = np.where(mask, returns, 0.0)
+    m = mask.astype(float)
+    x_win = sliding_window_view(x, window, axis=0)  # (n_rows - window + 1, N, window), no copy
+    m_win = sliding_window_view(m, window, axis=0)
+
+    mu = np.empty((len(ends), n))
+    cov = np.empty((len(ends), n, n))
+    n_obs = np.empty((len(ends), n))
+    for a in range(0, len(ends), chunk_size):
+        starts = ends[a:a + chunk_size] - window
+        xs, ms = x_win[starts], m_win[starts]
+        with span("frontier.moments", windows=len(starts)):
+            counts = ms.sum(axis=2)
+            if counts.min(initial=window) == window and window > 1:
+                # No missing returns: one centered product
+                mu[a:a + chunk_size] = xs.mean(axis=2)
+                centered = xs - mu[a:a + chunk_size, :, None]
+                c = centered @ centered.transpose(0, 2, 1) / (window - 1)
+            else:
+                n_xy = ms @ ms.transpose(0, 2, 1)
+                s_xy = xs @ xs.transpose(0, 2, 1)
+                s_x = xs @ ms.transpose(0, 2, 1)  # sum of x over rows where y is observed
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    c = (s_xy - s_x * s_x.transpose(0, 2, 1) / n_xy) / (n_xy - 1)
+                    mu[a:a + chunk_size] = xs.sum(axis=2) / counts
+                c[n_xy < 2] = np.nan
+            if shrinkage == "ledoit_wolf" or shrinkage > 0:
+                c = _shrink(c, xs, ms, mu[a:a + chunk_size], shrinkage)
+            cov[a:a + chunk_size] = c
+            n_obs[a:a + chunk_size] = counts
+    return ends, mu, cov, n_obs
+
+
+def _shrink(cov, xs, ms, mu, shrinkage):
+    """(1 - d) * cov + d * (trace / N) * I per window, d fixed or Ledoit-Wolf."""
+    n, t = xs.shape[1], xs.shape[2]
+    diag = np.diagonal(cov, axis1=-2, axis2=-1)
+    target = np.nanmean(np.where(np.isfinite(diag), diag, np.nan), axis=-1) if n else np.zeros(len(cov))
+    if shrinkage == "ledoit_wolf":
+        X = (xs - np.nan_to_num(mu)[:, :, None]) * ms
+        sq = (X * X).sum(axis=1)                                   # (windows, t)
+        trace = sq.sum(axis=-1) / t
+        m = trace / n
+        beta_ = (sq * sq).sum(axis=-1)
+        delta_ = ((X @ X.transpose(0, 2, 1)) ** 2).sum(axis=(-2, -1)) / t ** 2
+        beta = (beta_ / t - delta_) / (n * t)
+        delta = (delta_ - 2.0 * m * trace + n * m * m) / n
+        d = np.where(delta > 0, np.minimum(beta, delta) / np.where(delta > 0, delta, 1.0), 0.0)
+    else:
+        d = np.full(len(cov), float(shrinkage))
+    d = np.clip(d, 0.0, 1.0)[:, None, None]
+    return (1.0 - d) * cov + d * target[:, None, None] * np.eye(n)
+
+
+def project_simplex(v, valid=None):
+    """
+    Euclidean projection of each row (last axis) onto {w >= 0, sum(w) = 1}.
+
+    Args:
+        v (ndarray): (..., N) points.
+        valid (ndarray or None): (..., N) bool; invalid entries are forced to 0.
+
+    Returns:
+        ndarray: Same shape as v.
+    """
+    v = np.asarray(v, dtype=float)
+    if valid is not None:
+        v = np.where(valid, v, -np.inf)
+    u = -np.sort(-v, axis=-1)
+    with np.errstate(invalid="ignore"):
+        css = np.cumsum(u, axis=-1) - 1.0
+        k = np.arange(1, v.shape[-1] + 1)
+        support = u - css / k > 0
+    rho = v.shape[-1] - 1 - np.argmax(support[..., ::-1], axis=-1)
+    theta = np.take_along_axis(css, rho[..., None], axis=-1) / (rho[..., None] + 1)
+    with np.errstate(invalid="ignore"):
+        w = np.maximum(v - theta, 0.0)
+    return np.where(np.isnan(w), 0.0, w)  # rows without any valid entry
+
+
+def _lipschitz(cov, n_iter=30):
+    """Largest |eigenvalue| of each matrix of a stack, by batched power iteration."""
+    x = np.ones(cov.shape[:-1])
+    x /= np.linalg.norm(x, axis=-1, keepdims=True)
+    est = np.zeros(cov.shape[:-2])
+    for _ in range(n_iter):
+        y = (cov @ x[..., None])[..., 0]
+        est = np.linalg.norm(y, axis=-1)
+        x = y / np.where(est > 0, est, 1.0)[..., None]
+    return est
+
+
+def _solve_supports(S, linear, ci, pi, support, scale, ridge):
+    """KKT solutions of the QPs restricted to the given supports, and their optimality check."""
+    k, n = support.shape
+    k_max = max(int(support.sum(axis=1).max()), 1)
+    diag = np.arange(k_max)
+    cols = np.argsort(~support, axis=1, kind="stable")[:, :k_max]  # support positions first
+    in_sup = np.take_along_axis(support, cols, axis=1)
+    # Padding rows/columns (beyond each support) are identity rows with zero right-hand side
+    masked = np.where(in_sup, cols, n)
+    S_pad = np.zeros((len(S), n + 1, n + 1))
+    S_pad[:, :n, :n] = 2.0 * S
+    A = np.zeros((k, k_max + 1, k_max + 1))
+    A[:, :k_max, :k_max] = S_pad[ci[:, None, None], masked[:, :, None], masked[:, None, :]]
+    A[:, diag, diag] += np.where(in_sup, ridge * scale[ci, None], 1.0)
+    A[:, :k_max, k_max] = in_sup
+    A[:, k_max, :k_max] = in_sup
+    lin = linear[ci, pi]
+    rhs = np.concatenate([np.where(in_sup, np.take_along_axis(lin, cols, axis=1), 0.0), np.ones((k, 1))], axis=1)
+    sol = np.linalg.solve(A, rhs[:, :, None])[:, :, 0]
+    x = np.zeros((k, n))
+    np.put_along_axis(x, cols, np.where(in_sup, sol[:, :k_max], 0.0), axis=1)
+    nu = sol[:, k_max:]
+    # Multipliers of the w >= 0 constraints of the excluded assets must be >= 0
+    full = np.zeros(linear.shape)
+    full[ci, pi] = x
+    slack = 2.0 * (full @ S)[ci, pi] - lin + nu
+    tol = 1e-9 * (np.abs(lin).max(axis=-1, keepdims=True) + scale[ci, None] + np.abs(nu))
+    slack = np.where(support, 0.0, slack + tol)
+    return x, slack, np.isfinite(sol).all(axis=-1)
+
+
+def _polish(S, linear, w, valid, pending, ridge=1e-12, swaps=5):
+    """
+    Exact solutions on the current supports (the critical-line step).
+
+    For each pending problem the KKT system of the equality-constrained QP restricted
+    to the assets currently held is solved directly. A solution is accepted where it
+    is feasible (weights >= 0) and optimal (no excluded asset would lower the
+    objective); otherwise up to `swaps` active-set corrections are tried (drop the
+    assets that went negative, else add the most attractive excluded one) before the
+    projected-gradient iterations continue.
+
+    Args:
+        S (ndarray): (chunk x N x N) covariances.
+        linear (ndarray): (chunk x points x N) lambda * mu.
+        w (ndarray): (chunk x points x N) current iterates.
+        valid (ndarray): (chunk x N) eligible assets.
+        pending (ndarray): (chunk x points) problems to try.
+
+    Returns:
+        tuple: (weights (chunk x points x N), exact (chunk x points) bool)
+    """
+    out = w.copy()
+    exact = np.zeros(w.shape[:2], dtype=bool)
+    scale = np.maximum(np.abs(np.diagonal(S, axis1=-2, axis2=-1)).max(axis=-1), 1e-18)
+    ci, pi = np.nonzero(pending)
+    support = (w[ci, pi] > 0) & valid[ci]
+    keep = support.any(axis=1)
+    ci, pi, support = ci[keep], pi[keep], support[keep]
+    for _ in range(swaps + 1):
+        if len(ci) == 0:
+            break
+        try:
+            x, slack, finite = _solve_supports(S, linear, ci, pi, support, scale, ridge)
+        except np.linalg.LinAlgError:
+            break
+        negative = x < -1e-12
+        slack = np.where(valid[ci], slack, 0.0)
+        ok = finite & ~negative.any(axis=1) & (slack.min(axis=1) >= 0)
+        xs = np.maximum(x[ok], 0.0)
+        out[ci[ok], pi[ok]] = xs / xs.sum(axis=-1, keepdims=True)
+        exact[ci[ok], pi[ok]] = True
+
+        retry = finite & ~ok
+        support = support[retry]
+        negative, slack, ci, pi = negative[retry], slack[retry], ci[retry], pi[retry]
+        has_negative = negative.any(axis=1)
+        support[has_negative] &= ~negative[has_negative]
+        enter = np.argmin(slack, axis=1)
+        rows = np.flatnonzero(~has_negative)
+        support[rows, enter[rows]] = True
+        keep = support.any(axis=1)
+        ci, pi, support = ci[keep], pi[keep], support[keep]
+    return out, exact
+
+
+def _default_lambdas(mu, cov, valid, n_points):
+    """Per-window trade-off grid: 0, then geometric steps in units of (mean variance / max |mu|)."""
+    diag = np.where(valid, np.diagonal(cov, axis1=-2, axis2=-1), 0.0)
+    mean_var = diag.sum(axis=-1) / np.maximum(valid.sum(axis=-1), 1)
+    scale = mean_var / np.maximum(np.where(valid, np.abs(mu), 0.0).max(axis=-1, initial=0.0), 1e-12)
+    grid = np.concatenate([[0.0], np.geomspace(1e-2, 1e3, n_points - 1)])
+    return scale[:, None] * grid
+
+
+def frontier_weights(mu, cov, n_points=20, lambdas=None, valid=None, tol=1e-9, max_iter=5000,
+                     chunk_size=8, warm_start=True, polish_every=10):
+    """
+    Long-only efficient frontier of each (mu, cov) pair of a stack.
+
+    Args:
+        mu (ndarray): (windows x N) expected returns.
+        cov (ndarray): (windows x N x N) covariances (NaN entries are treated as 0).
+        n_points (int): Frontier points per window, if lambdas is not given.
+        lambdas (ndarray or None): (points,) or (windows x points) risk-aversion trade-offs
+                                   (None = 0 plus a geometric grid scaled per window).
+        valid (ndarray or None): (windows x N) bool, assets allowed in each window
+                                 (None = assets with a finite mean and variance).
+        tol (float): Stop when no weight moves more than this in an iteration.
+        max_iter (int): Iteration cap per chunk.
+        chunk_size (int): Windows solved together. Smaller chunks let more windows start
+                          from their predecessor's supports; larger ones batch more work.
+        warm_start (bool): Start each chunk from the last solved window's supports.
+        polish_every (int): Iterations between active-set polishing steps (see _polish).
+
+    Returns:
+        dict: 'weights' (windows x points x N), 'mean' and 'volatility' (windows x points)
+              of each frontier portfolio, 'lambdas' (windows x points), 'iterations' (chunks,).
+    """
+    mu = np.asarray(mu, dtype=float)
+    cov = np.asarray(cov, dtype=float)
+    n_win, n = mu.shape
+    if valid is None:
+        valid = np.isfinite(mu) & np.isfinite(np.diagonal(cov, axis1=-2, axis2=-1))
+    if lambdas is None:
+        lambdas = _default_lambdas(mu, cov, valid, n_points)
+    lambdas = np.broadcast_to(np.asarray(lambdas, dtype=float), (n_win, np.shape(lambdas)[-1]))
+    n_pts = lambdas.shape[1]
+
+    mu0 = np.where(valid, np.nan_to_num(mu), 0.0)
+    cov0 = np.nan_to_num(cov) * (valid[:, :, None] & valid[:, None, :])
+    weights = np.zeros((n_win, n_pts, n))
+    iterations = []
+    previous = None
+    for a in range(0, n_win, chunk_size):
+        b = min(a + chunk_size, n_win)
+        S, m, lam, ok = cov0[a:b], mu0[a:b], lambdas[a:b], valid[a:b, None, :]
+        step = 1.0 / (2.0 * 1.05 * np.maximum(_lipschitz(S), 1e-18))[:, None, None]
+        linear = lam[:, :, None] * m[:, None, :]  # (chunk, points, N)
+
+        w = project_simplex(np.zeros((b - a, n_pts, n)), ok)
+        done = np.zeros((b - a, n_pts), dtype=bool)
+        tried = np.zeros((b - a, n_pts, n), dtype=bool)  # support of the last polishing attempt
+        if warm_start and previous is not None:
+            # Start from the previous window's supports: where they (nearly) still hold the
+            # active-set step finishes the problem before any gradient iteration
+            start = np.broadcast_to(previous, (b - a, n_pts, n)) * ok
+            polished, done = _polish(S, linear, start, valid[a:b], ~done)
+            w[done] = polished[done]
+        y, t = w.copy(), np.ones((b - a, n_pts, 1))
+        it, moved = 0, np.inf
+        with span("frontier.solve", windows=b - a, points=n_pts):
+            while not done.all() and moved >= tol and it < max_iter:
+                it += 1
+                grad = 2.0 * (y @ S) - linear  # S is symmetric
+                w_next = project_simplex(y - step * grad, ok)
+                w_next[done] = w[done]
+                # FISTA momentum, restarted where it stops pointing downhill
+                restart = np.sum((y - w_next) * (w_next - w), axis=-1, keepdims=True) > 0
+                t = np.where(restart, 1.0, t)
+                t_next = 0.5 * (1.0 + np.sqrt(1.0 + 4.0 * t * t))
+                y = w_next + ((t - 1.0) / t_next) * (w_next - w)
+                moved = np.max(np.abs(w_next - w), initial=0.0)
+                w, t = w_next, t_next
+                if it % polish_every == 0:
+                    held = w > 0
+                    pending = ~done & np.any(held != tried, axis=-1)
+                    if pending.any():
+                        tried[pending] = held[pending]
+                        polished, exact = _polish(S, linear, w, valid[a:b], pending)
+                        w[exact] = y[exact] = polished[exact]
+                        done |= exact
+        if not done.all() and moved >= tol:
+            count("frontier.unconverged_chunks")
+        count("frontier.iterations", it)
+        iterations.append(it)
+        weights[a:b] = w
+        previous = w[-1]
+
+    port_mean = np.einsum('wpn,wn->wp', weights, mu0)
+    port_var = np.sum((weights @ cov0) * weights, axis=-1)
+    return {
+        "weights": weights,
+        "mean": port_mean,
+        "volatility": np.sqrt(np.maximum(port_var, 0.0)),
+        "lambdas": lambdas,
+        "iterations": np.array(iterations),
+    }
+
+
+def black_litterman(cov, market_weights, P, Q, omega=None, tau=0.05, risk_aversion=2.5):
+    """
+    Black-Litterman posterior moments for a stack of covariance matrices.
+
+    Equilibrium returns pi = risk_aversion * S w_mkt are blended with the views
+    P mu = Q (uncertainty omega) for all windows at once:
+
+        mu_bl = pi + tau S P' (P tau S P' + omega)^-1 (Q - P pi)
+        S_bl  = S + tau S - tau S P' (P tau S P' + omega)^-1 P tau S
+
+    Args:
+        cov (ndarray): (windows x N x N) or (N x N) covariances.
+        market_weights (ndarray): (N,) or (windows x N) market-capitalization weights.
+        P (ndarray): (views x N) view portfolios.
+        Q (ndarray): (views,) or (windows x views) view returns.
+        omega (ndarray or None): (views x views) or (windows x views x views) view covariance
+                                 (None = diag(P tau S P'), proportional to the prior).
+        tau (float): Uncertainty scale of the prior.
+        risk_aversion (float): Market risk aversion.
+
+    Returns:
+        tuple: (mu_bl, cov_bl) with shapes (windows x N) and (windows x N x N)
+               (no windows axis for a single covariance matrix).
+    """
+    cov = np.asarray(cov, dtype=float)
+    single = cov.ndim == 2
+    S = cov[None] if single else cov
+    P = np.asarray(P, dtype=float)
+    w_mkt = np.broadcast_to(np.asarray(market_weights, dtype=float), S.shape[:2])
+    Q = np.broadcast_to(np.asarray(Q, dtype=float), (S.shape[0], P.shape[0]))
+
+    pi = risk_aversion * np.einsum('wij,wj->wi', S, w_mkt)
+    tS_Pt = tau * np.einsum('wij,kj->wik', S, P)        # tau S P'  (windows x N x views)
+    P_tS_Pt = np.einsum('kj,wjl->wkl', P, tS_Pt)        # P tau S P'
+    if omega is None:
+        omega = np.eye(P.shape[0]) * np.diagonal(P_tS_Pt, axis1=-2, axis2=-1)[:, :, None]
+    A = P_tS_Pt + np.broadcast_to(omega, P_tS_Pt.shape)
+    with span("frontier.black_litterman", windows=S.shape[0], views=P.shape[0]):
+        gain = np.linalg.solve(A, np.concatenate(
+            [(Q - np.einsum('kj,wj->wk', P, pi))[:, :, None], tS_Pt.transpose(0, 2, 1)], axis=2))
+    mu_bl = pi + np.einsum('wik,wk->wi', tS_Pt, gain[:, :, 0])
+    cov_bl = S + tau * S - np.einsum('wik,wkj->wij', tS_Pt, gain[:, :, 1:])
+    return (mu_bl[0], cov_bl[0]) if single else (mu_bl, cov_bl)
+
+
+@instrumented("rolling_efficient_frontier")
+def rolling_efficient_frontier(df, window=60, n_points=20, step=1, price_column="Close", min_obs=None,
+                               shrinkage=0.0, **solver):
+    """
+    Long-only efficient frontier for every rolling window of a price history.
+
+    Args:
+        df (DataFrame): Long format with ['Date', 'Symbol', price_column] (Date may be the index).
+        window (int): Returns per estimation window.
+        n_points (int): Frontier points per window.
+        step (int): Rows between consecutive windows.
+        price_column (str): Price column to use.
+        min_obs (int or None): Returns an asset needs in a window to be eligible (None = window).
+        shrinkage (float or str): Covariance shrinkage (see rolling_moments); use 'ledoit_wolf'
+                                  when the universe is not much smaller than the window.
+        **solver: Passed to frontier_weights (lambdas, tol, max_iter, chunk_size, warm_start).
+
+    Returns:
+        dict: 'dates' (DatetimeIndex; window k holds returns before dates[k]), 'symbols',
+              'mu', 'cov' and the frontier_weights outputs.
+    """
+    returns = _wide_returns(df, price_column)
+    if len(returns) <= window:
+        raise ValueError(f"Need more than {window} returns, got {len(returns)}")
+    ends, mu, cov, n_obs = rolling_moments(returns.to_numpy(dtype=float), window, step=step, shrinkage=shrinkage)
+    ends, mu, cov, n_obs = ends[:-1], mu[:-1], cov[:-1], n_obs[:-1]  # last window has no next date
+    valid = (n_obs >= (min_obs or window)) & np.isfinite(np.diagonal(cov, axis1=-2, axis2=-1))
+    if not shrinkage and len(valid) and valid.sum(axis=1).max() >= window:
+        print(f"[WARN] Up to {valid.sum(axis=1).max()} assets over {window}-return windows: the sample "
+              f"covariance is singular; consider shrinkage='ledoit_wolf'")
+    result = frontier_weights(mu, cov, n_points=n_points, valid=valid, **solver)
+    result.update({"dates": returns.index[ends], "symbols": returns.columns, "mu": mu, "cov": cov})
+    return result
+
+
+@instrumented("rolling_frontier_max_sharpe")
+def rolling_frontier_max_sharpe(df, window=60, risk_free_rate=0.0, n_points=50, price_column="Close",
+                                shrinkage=0.0, **solver):
+    """
+    rolling_max_sharpe from the batched frontier: per window, the frontier point with
+    the highest Sharpe ratio (exact up to the spacing of the frontier grid).
+
+    Args:
+        df (DataFrame): Long format with ['Date', 'Symbol', price_column].
+        window (int): Lookback window for rolling estimation.
+        risk_free_rate (float): Annualized risk free rate (daily returns assumed).
+        n_points (int): Frontier points per window.
+        price_column (str): Price column name.
+        shrinkage (float or str): Covariance shrinkage (see rolling_moments).
+        **solver: Passed to frontier_weights.
+
+    Returns:
+        pd.DataFrame: Weights with Date index and Symbols as columns.
+    """
+    frontier = rolling_efficient_frontier(df, window=window, n_points=n_points, price_column=price_column,
+                                          shrinkage=shrinkage, **solver)
+    vol = frontier["volatility"]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe = np.where(vol > 1e-8, (frontier["mean"] - risk_free_rate / 252) / vol, -np.inf)
+    best = np.argmax(sharpe, axis=1)
+    weights = frontier["weights"][np.arange(len(best)), best]
+    return pd.DataFrame(weights, index=frontier["dates"], columns=frontier["symbols"])
@@ -0,0 +1,250 @@
+"""
+Hierarchical risk parity (Lopez de Prado, 2016) over rolling windows.
+
+HRP never inverts the covariance matrix, so it stays usable when the universe is
+larger than the estimation window (where the sample covariance is singular):
+
+1. cluster the assets on the correlation distance sqrt((1 - rho) / 2),
+2. order them along the dendrogram leaves (quasi-diagonalization), so similar
+   assets sit next to each other and the covariance is close to block diagonal,
+3. split the ordered list in halves recursively, sharing each parent's weight
+   between its halves in inverse proportion to their inverse-variance cluster
+   variance.
+
+The cluster variance of a contiguous block [a, b) of the ordered assets with
+inverse-variance weights is
+
+    V(a, b) = sum_{i,j in [a,b)} C_ij / (d_i d_j) / (sum_{i in [a,b)} 1 / d_i)^2
+
+with d the variances, so 2-D prefix sums of C_ij / (d_i d_j) give every block of
+a bisection level at once; a level costs O(#clusters) instead of one small
+quadratic form per cluster. Windows with the same number of eligible assets run
+as one batch.
+
+In rolling mode the covariance stack is built chunk by chunk with
+optimize.frontier.rolling_moments and the dendrogram is reused while the
+correlation matrix stays within reuse_tol (mean absolute change) of the one it was
+built from; only the cheap bisection then runs for the new window.
+"""
+import numpy as np
+import pandas as pd
+
+from config import get_config
+from optimize.frontier import rolling_moments, _wide_returns
+from profiling.instrumentation import instrumented, span, count
+
+__all__ = [
+    "LINKAGE_METHODS",
+    "correlation_distance",
+    "quasi_diagonal_order",
+    "recursive_bisection",
+    "hrp_weights",
+    "hierarchical_risk_parity",
+]
+
+LINKAGE_METHODS = ("single", "complete", "average", "ward")
+
+
+def _correlation(cov):
+    """Correlation matrix (stack) of a covariance matrix (stack)."""
+    sd = np.sqrt(np.diagonal(cov, axis1=-2, axis2=-1))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = cov / (sd[..., :, None] * sd[..., None, :])
+    return np.clip(corr, -1.0, 1.0)
+
+
+def correlation_distance(corr):
+    """sqrt((1 - rho) / 2) for a correlation matrix (stack): 0 for rho = 1, 1 for rho = -1."""
+    return np.sqrt(np.clip((1.0 - np.asarray(corr, dtype=float)) / 2.0, 0.0, 1.0))
+
+
+def quasi_diagonal_order(corr, method=None):
+    """
+    Dendrogram leaf order of the assets of one correlation matrix.
+
+    Args:
+        corr (ndarray): (N x N) correlation matrix.
+        method (str or None): scipy linkage method (None = configured optimizer.hrp_linkage).
+
+    Returns:
+        ndarray: Asset positions in quasi-diagonal order.
+    """
+    from scipy.cluster.hierarchy import linkage, leaves_list
+    from scipy.spatial.distance import squareform
+
+    method = method or get_config().optimizer.hrp_linkage
+    if method not in LINKAGE_METHODS:
+        raise ValueError(f"method must be one of {LINKAGE_METHODS}")
+    n = len(corr)
+    if n < 3:
+        return np.arange(n)
+    dist = correlation_distance(corr)
+    np.fill_diagonal(dist, 0.0)
+    return leaves_list(linkage(squareform(dist, checks=False), method=method))
+
+
+def recursive_bisection(cov):
+    """
+    HRP weights of covariance matrices whose assets are already in quasi-diagonal order.
+
+    Args:
+        cov (ndarray): (N x N) or (windows x N x N) ordered covariances, positive variances.
+
+    Returns:
+        ndarray: Weights in the same order, shape (N,) or (windows x N); each row sums to 1.
+    """
+    cov = np.asarray(cov, dtype=float)
+    single = cov.ndim == 2
+    cov = cov[None] if single else cov
+    k, n = cov.shape[:2]
+    P = np.empty((k, n + 1, n + 1))
+    P[:, 1:, 1:] = cov
+    w = _bisect_padded(P)
+    return w[0] if single else w
+
+
+def _bisect_padded(P):
+    """recursive_bisection on covariances stored in P[:, 1:, 1:]; P is overwritten."""
+    k, n = P.shape[0], P.shape[1] - 1
+    P[:, 0, :] = 0.0
+    P[:, :, 0] = 0.0
+    block = P[:, 1:, 1:]
+    inv = 1.0 / np.diagonal(block, axis1=-2, axis2=-1)
+
+    # Prefix sums: block sums of C_ij / (d_i d_j) and of 1 / d_i over any [a, b)
+    block *= inv[:, :, None]
+    block *= inv[:, None, :]
+    np.cumsum(block, axis=1, out=block)
+    np.cumsum(block, axis=2, out=block)
+    Q = np.zeros((k, n + 1))
+    Q[:, 1:] = inv.cumsum(axis=1)
+
+    def variance(a, b):
+        block = P[:, b, b] - P[:, a, b] - P[:, b, a] + P[:, a, a]
+        return block / (Q[:, b] - Q[:, a]) ** 2
+
+    w = np.ones((k, n))
+    starts, stops = np.array([0] if n > 1 else [], dtype=int), np.array([n] if n > 1 else [], dtype=int)
+    positions = np.arange(n)
+    while len(starts):
+        mids = starts + (stops - starts) // 2
+        v_left, v_right = variance(starts, mids), variance(mids, stops)
+        alpha = 1.0 - v_left / (v_left + v_right)  # (k, clusters) share of the left half
+        seg = np.searchsorted(stops, positions, side="right")
+        inside = seg < len(stops)
+        seg = np.minimum(seg, len(stops) - 1)
+        inside &= positions >= starts[seg]
+        left = positions < mids[seg]
+        factor = np.where(left, alpha[:, seg], 1.0 - alpha[:, seg])
+        w *= np.where(inside, factor, 1.0)
+        # Halves with more than one asset are split at the next level
+        starts, stops = np.concatenate([starts, mids]), np.concatenate([mids, stops])
+        split = stops - starts > 1
+        order = np.argsort(starts[split])
+        starts, stops = starts[split][order], stops[split][order]
+    return w
+
+
+def hrp_weights(cov, orders):
+    """
+    HRP weights for a stack of covariances and their quasi-diagonal orders.
+
+    Args:
+        cov (ndarray): (windows x N x N) covariances.
+        orders (list of ndarray): Per window, the positions of its eligible assets in
+                                  quasi-diagonal order (assets left out get weight 0).
+
+    Returns:
+        ndarray: (windows x N) weights, 0 for assets not in the window's order.
+    """
+    k, n = cov.shape[:2]
+    out = np.zeros((k, n))
+    sizes = np.array([len(o) for o in orders])
+    # Windows with the same number of eligible assets share one batched bisection
+    for size in np.unique(sizes):
+        rows = np.flatnonzero(sizes == size)
+        if size == 0:
+            continue
+        idx = np.stack([orders[r] for r in rows])
+        padded = np.empty((len(rows), size + 1, size + 1))
+        for j, r in enumerate(rows):  # two takes per window beat one 3-D fancy index
+            padded[j, 1:, 1:] = cov[r].take(idx[j], axis=0).take(idx[j], axis=1)
+        out[rows[:, None], idx] = _bisect_padded(padded)
+    return out
+
+
+@instrumented("hierarchical_risk_parity")
+def hierarchical_risk_parity(df, window=60, rolling=False, price_column="Close", step=1, min_obs=None,
+                             method=None, reuse_tol=None, chunk_size=None):
+    """
+    Hierarchical risk parity weights from the sample covariance of returns.
+
+    Same windows and output layout as optimize.optimisation.risk_parity. Assets need
+    min_obs returns and a positive variance in a window to be eligible; the others
+    get weight 0.
+
+    Args:
+        df (DataFrame): Long format with ['Date', 'Symbol', price_column] (Date may be the index).
+        window (int): Number of returns in each estimation window.
+        rolling (bool): Weights for every date after the first window (else the last window only).
+        price_column (str): Price column to use.
+        step (int): Rows between consecutive windows (rolling only).
+        min_obs (int or None): Returns an asset needs in a window (None = window).
+        method (str or None): Linkage method (None = configured optimizer.hrp_linkage).
+        reuse_tol (float or None): Largest mean absolute correlation change for which the
+                                   previous dendrogram is reused (None = configured
+                                   optimizer.hrp_reuse_tol, 0 = recluster every window).
+        chunk_size (int or None): Windows per covariance batch (None = configured compute.chunk_size,
+                                  reduced to fit compute.memory_budget).
+
+    Returns:
+        DataFrame: rolling=True: index=Date, columns=Symbols. Otherwise index=Symbols
+                   with a single 'weights' column.
+    """
+    cfg = get_config()
+    method = method or cfg.optimizer.hrp_linkage
+    reuse_tol = cfg.optimizer.hrp_reuse_tol if reuse_tol is None else reuse_tol
+
+    returns = _wide_returns(df, price_column)
+    values = returns.to_numpy(dtype=float)
+    # About eight (N x N) float64 buffers per window (covariance, correlation, prefix sums, temporaries)
+    chunk_size = chunk_size or max(1, min(cfg.compute.chunk_size,
+                                          cfg.compute.memory_budget // (64 * max(values.shape[1], 1) ** 2)))
+    if len(values) < window + (1 if rolling else 0):
+        raise ValueError(f"Need at least {window + (1 if rolling else 0)} returns, got {len(values)}")
+    # Window ending before row e; rolling: every row after the first window, else the last window
+    ends = np.arange(window, len(values), step) if rolling else np.array([len(values)])
+
+    weights = np.zeros((len(ends), values.shape[1]))
+    ref_corr, ref_valid, ref_order = None, None, None
+    for a in range(0, len(ends), chunk_size):
+        chunk = ends[a:a + chunk_size]
+        first = chunk[0] - window
+        with span("hrp.moments", windows=len(chunk)):
+            _, _, cov, n_obs = rolling_moments(values[first:chunk[-1]], window, step=step, chunk_size=chunk_size)
+        var = np.diagonal(cov, axis1=-2, axis2=-1)
+        valid = (n_obs >= (min_obs or window)) & np.isfinite(var) & (var > 0)
+        corr = _correlation(cov)
+
+        orders = []
+        with span("hrp.cluster", windows=len(chunk)):
+            for i in range(len(chunk)):
+                v = valid[i]
+                c = corr[i] if v.all() else corr[i][np.ix_(v, v)]
+                reuse = (ref_order is not None and reuse_tol > 0 and np.array_equal(v, ref_valid)
+                         and np.abs(c - ref_corr).mean() <= reuse_tol)
+                if reuse:
+                    count("hrp.reused_dendrograms")
+                else:
+                    idx = np.flatnonzero(v)
+                    ref_corr = c
+                    ref_order = idx[quasi_diagonal_order(ref_corr, method)]
+                    ref_valid = v
+                    count("hrp.dendrograms")
+                orders.append(ref_order)
+        with span("hrp.bisection", windows=len(chunk)):
+            weights[a:a + len(chunk)] = hrp_weights(cov, orders)
+
+    if rolling:
+        return pd.DataFrame(weights, index=returns.index[ends], columns=returns.columns)
+    return pd.DataFrame({"weights": weights[0]}, index=returns.columns)
@@ -1,12 +1,71 @@
 import pandas as pd
-import os
-import matplotlib.pyplot as plt
 import numpy as np
-from riskfolio.Portfolio import Portfolio
-import scipy.optimize as sco
-from asset_selection.selection_functions import *
+from config import get_config
+from functions.sparse_weights import SparseWeights
+from profiling.instrumentation import instrumented, span, count
+
+# riskfolio and scipy.optimize are imported inside the functions that use them,
+# so importing this module does not pay for solver backends it may never call.
+
+__all__ = [
+    "risk_parity",
+    "construct_kelly_portfolio",
+    "scale_to_target_volatility",
+    "inverse_volatility_weights",
+    "rolling_max_sharpe",
+]
+
+def _equal_risk_contribution(cov, tol=1e-10, max_iter=500):
+    """
+    Long-only, fully invested equal-risk-contribution weights by cyclical coordinate
+    descent on 0.5 * y'Σy - sum(log y) (Spinu), then y / sum(y).
+    """
+    cov = np.asarray(cov, dtype=float)
+    diag = np.maximum(np.diag(cov), 1e-18)
+    y = 1 / np.sqrt(diag)
+    for _ in range(max_iter):
+        y_prev = y.copy()
+        for i in range(len(y)):
+            off = cov[i] @ y - diag[i] * y[i]
+            y[i] = (-off + np.sqrt(off * off + 4 * diag[i])) / (2 * diag[i])
+        if np.max(np.abs(y - y_prev) / y) < tol:
+            break
+    return y / y.sum()
+
+
+@instrumented("risk_parity")
+def risk_parity(df, window=60, rolling=False, price_column="Close", backend=None):
+    """
+    Equal-risk-contribution (risk parity) weights from sample covariance of returns.
+
+    Args:
+        df (DataFrame): Long format with ['Date', 'Symbol', price_column].
+        window (int): Number of returns in each estimation window.
+        rolling (bool): Weights for every date after the first window (else the last window only).
+        price_column (str): Price column to use.
+        backend (str or None): 'riskfolio' or 'numpy' (None = configured optimizer.risk_parity_backend).
+
+    Returns:
+        DataFrame: rolling=True: index=Date, columns=Symbols. Otherwise index=Symbols
+                   with a single 'weights' column.
+    """
+    from config import get_config
+
+    backend = backend or get_config().optimizer.risk_parity_backend
+    if backend not in ("riskfolio", "numpy"):
+        raise ValueError("backend must be 'riskfolio' or 'numpy'")
+    if backend == "riskfolio":
+        from riskfolio.Portfolio import Portfolio
+
+        def solve(window_data):
+            port = Portfolio(returns=window_data)
+            port.assets_stats(method_mu='hist', method_cov='hist')
+            return port.rp_optimization(model='Classic', rm='MV')
+    else:
+        def solve(window_data):
+            w = _equal_risk_contribution(window_data.cov().to_numpy())
+            return pd.DataFrame({"weights": w}, index=window_data.columns)
 
-def risk_parity(df, window=60, rolling=False, price_column="Close"):
     df = df.reset_index()
     price_df = df.pivot(index='Date', columns='Symbol', values=price_column)
     price_df = price_df.sort_index().sort_index(axis=1)
@@ -16,18 +75,15 @@ def risk_parity(df, window=60, rolling=False, price_column="Close"):
         weights_list = []
         dates = []
         for i in range(window, len(returns)):
-            window_data = returns.iloc[i - window:i]
-            port = Portfolio(returns=window_data)
-            port.assets_stats(method_mu='hist', method_cov='hist')
-            w = port.rp_optimization(model='Classic', rm='MV')
+            with span("risk_parity.window"):
+                w = solve(returns.iloc[i - window:i])
             weights_list.append(w.values.flatten())
             dates.append(returns.index[i])
         return pd.DataFrame(weights_list, index=dates, columns=returns.columns)
 
-    port = Portfolio(returns=returns.iloc[-window:])
-    port.assets_stats(method_mu='hist', method_cov='hist')
-    return port.rp_optimization(model='Classic', rm='MV')
+    return solve(returns.iloc[-window:])
 
+@instrumented("construct_kelly_portfolio")
 def construct_kelly_portfolio(df, window=60, cap=1.0, price_column="Close", scale=False, target_vol=None):
     df = df.reset_index()
     price_df = df.pivot(index='Date', columns='Symbol', values=price_column)
@@ -44,6 +100,7 @@ def construct_kelly_portfolio(df, window=60, cap=1.0, price_column="Close", scal
             kelly_weights = np.linalg.solve(sigma, mu)
         except np.linalg.LinAlgError:
             kelly_weights = np.zeros(len(mu))
+            count("construct_kelly_portfolio.singular_windows")
 
         kelly_weights = np.clip(kelly_weights, 0, cap)
         if kelly_weights.sum() > 0:
@@ -62,20 +119,23 @@ def construct_kelly_portfolio(df, window=60, cap=1.0, price_column="Close", scal
 
 
 
+@instrumented("scale_to_target_volatility")
 def scale_to_target_volatility(weights_df, df, price_column="Close", target_vol=0.10, freq=252):
     """
     Scale portfolio weights to achieve a target annualized volatility.
 
     Args:
-        weights_df (DataFrame): Raw portfolio weights (dates x assets).
+        weights_df (DataFrame or SparseWeights): Raw portfolio weights (dates x assets).
         long_df (DataFrame): Long-format price data with Date index and 'Symbol' column.
         price_column (str): Which price column to use for returns calculation.
         target_vol (float): Target annualized volatility (e.g. 0.10 = 10%).
         freq (int): Frequency of trading (default: 252 for daily).
 
     Returns:
-        DataFrame: Scaled weights.
+        DataFrame: Scaled weights (a SparseWeights for SparseWeights input).
     """
+    sparse = isinstance(weights_df, SparseWeights)
+
     # Prepare price_df wide-format from long_df
     price_df = df.reset_index().pivot(index='Date', columns='Symbol', values=price_column)
 
@@ -83,7 +143,10 @@ def scale_to_target_volatility(weights_df, df, price_column="Close", target_vol=
     returns_df = price_df.pct_change().loc[weights_df.index, weights_df.columns]
 
     # Calculate portfolio returns (weights shifted by 1 to avoid lookahead bias)
-    port_returns = (returns_df * weights_df.shift(1)).sum(axis=1)
+    if sparse:
+        port_returns = pd.Series(weights_df.shift(1).row_dot(returns_df.to_numpy(dtype=float)), index=weights_df.index)
+    else:
+        port_returns = (returns_df * weights_df.shift(1)).sum(axis=1)
 
     # Calculate rolling volatility of portfolio returns (21-day window)
     rolling_vol = port_returns.rolling(window=21).std() * np.sqrt(freq)
@@ -92,6 +155,9 @@ def scale_to_target_volatility(weights_df, df, price_column="Close", target_vol=
     scaling_factors = target_vol / rolling_vol
     scaling_factors = scaling_factors.clip(upper=2.0).fillna(1.0)  # Avoid too high leverage or NaNs
 
+    if sparse:
+        return weights_df.scale_rows(scaling_factors.to_numpy()).normalize()
+
     # Apply scaling to weights
     scaled_weights = weights_df.mul(scaling_factors, axis=0)
 
@@ -102,19 +168,21 @@ def scale_to_target_volatility(weights_df, df, price_column="Close", target_vol=
 
 
 
-def inverse_volatility_weights(df, lookback=60, price_column="Close", epsilon=1e-8):
+@instrumented("inverse_volatility_weights")
+def inverse_volatility_weights(df, lookback=None, price_column="Close", epsilon=1e-8):
     """
     Compute inverse volatility weights based on rolling volatility of returns.
 
     Args:
         df (pd.DataFrame): Long format DataFrame with at least ['Date', 'Symbol', price_column].
-        lookback (int): Lookback window for rolling volatility.
+        lookback (int or None): Lookback window for rolling volatility (None = configured strategy.lookback).
         price_column (str): Column name for price data.
         epsilon (float): Small value to avoid division by zero.
 
     Returns:
         pd.DataFrame: Weights with Date index and Symbols as columns.
     """
+    lookback = get_config().strategy.lookback if lookback is None else lookback
     df = df.reset_index() if df.index.name == 'Date' else df.copy()
 
     price_df = df.pivot(index='Date', columns='Symbol', values=price_column).sort_index()
@@ -131,6 +199,7 @@ def inverse_volatility_weights(df, lookback=60, price_column="Close", epsilon=1e
 
 
 
+@instrumented("rolling_max_sharpe")
 def rolling_max_sharpe(df, window=60, risk_free_rate=0.0, price_column="Close", epsilon=1e-8):
     """
     Compute rolling portfolio weights by maximizing Sharpe ratio over a rolling window.
@@ -146,6 +215,7 @@ def rolling_max_sharpe(df, window=60, risk_free_rate=0.0, price_column="Close",
         pd.DataFrame: DataFrame of weights with Date index and Symbols as columns.
                       Starts from the first date where rolling window is available.
     """
+    import scipy.optimize as sco
 
     df = df.reset_index() if df.index.name == 'Date' else df.copy()
     df = df.sort_values('Date')
@@ -178,13 +248,16 @@ def rolling_max_sharpe(df, window=60, risk_free_rate=0.0, price_column="Close",
         constraints = {'type': 'eq', 'fun': lambda w: np.sum(w) - 1}
         initial_guess = np.array([1 / num_assets] * num_assets)
 
-        result = sco.minimize(objective_function, initial_guess, method='SLSQP', bounds=bounds, constraints=constraints)
+        with span("rolling_max_sharpe.window"):
+            result = sco.minimize(objective_function, initial_guess, method='SLSQP', bounds=bounds, constraints=constraints)
+        count("rolling_max_sharpe.solver_iterations", result.nit)
 
         if result.success:
             weights = result.x
         else:
             # fallback: equal weights
             weights = np.full(num_assets, 1 / num_assets)
+            count("rolling_max_sharpe.solver_failures")
 
         weights_list.append(weights)
         dates.append(returns.index[i])
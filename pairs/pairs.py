@@ -0,0 +1,310 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from config import resolve_n_jobs
+from profiling.instrumentation import instrumented, span, count
+
+__all__ = [
+    "close_panel",
+    "screen_pairs",
+    "batched_hedge_ratios",
+    "cointegration_table",
+    "test_cointegration_on_pairs",
+    "pair_zscore_signals",
+    "backtest_pairs_panel",
+]
+
+
+def close_panel(price_df):
+    """
+    Wide Close panel (index=Date sorted, columns=Symbol) from long price data.
+
+    Args:
+        price_df (DataFrame): Long format with ['Date', 'Symbol', 'Close'] (Date as a column
+                              or as the index, optionally with Symbol as a second index level).
+
+    Returns:
+        pd.DataFrame
+    """
+    if 'Date' not in price_df.columns or 'Symbol' not in price_df.columns:
+        price_df = price_df.reset_index()
+    df = price_df[['Date', 'Symbol', 'Close']]
+    return df.pivot(index='Date', columns='Symbol', values='Close').sort_index()
+
+
+def _pair_positions(columns, pairs):
+    idx = pd.Index(columns).get_indexer([p[0] for p in pairs]), pd.Index(columns).get_indexer([p[1] for p in pairs])
+    if (idx[0] < 0).any() or (idx[1] < 0).any():
+        missing = sorted({s for p in pairs for s in p} - set(columns))
+        raise KeyError(f"Symbols not in price data: {missing}")
+    return idx
+
+
+@instrumented("screen_pairs")
+def screen_pairs(price_df, corr_threshold=-0.3):
+    """
+    Vectorized candidate-pair screen on the return correlation matrix: every pair
+    (a, b), a before b in column order, with corr(a, b) <= corr_threshold.
+
+    Same pairs, in the same order, as the double loop of the notebook's
+    filter_by_correlation(pairs=True).
+
+    Args:
+        price_df (DataFrame): Long format with ['Date', 'Symbol', 'Close'].
+        corr_threshold (float): Maximum return correlation of a candidate pair.
+
+    Returns:
+        tuple: (list of (sym1, sym2) pairs, correlation matrix of the symbols in any pair)
+    """
+    returns = close_panel(price_df).pct_change().dropna()
+    corr_matrix = returns.corr()
+    corr = corr_matrix.to_numpy()
+
+    i, j = np.triu_indices(len(corr), k=1)
+    keep = corr[i, j] <= corr_threshold
+    symbols = corr_matrix.columns
+    pairs = list(zip(symbols[i[keep]], symbols[j[keep]]))
+
+    selected = symbols[np.unique(np.concatenate([i[keep], j[keep]]))]
+    return pairs, corr_matrix.loc[selected, selected]
+
+
+def batched_hedge_ratios(prices, pairs):
+    """
+    OLS of sym1 on sym2 with intercept for all pairs at once, each pair fitted on
+    the dates where both symbols have a price.
+
+    Args:
+        prices (DataFrame): Wide Close panel (see close_panel).
+        pairs (list): (sym1, sym2) tuples.
+
+    Returns:
+        tuple: (alpha ndarray, beta ndarray, residuals ndarray of shape (n_dates, n_pairs),
+                NaN where the pair has no common price)
+    """
+    values = prices.to_numpy(dtype=float)
+    i1, i2 = _pair_positions(prices.columns, pairs)
+    y, x = values[:, i1], values[:, i2]
+    valid = ~(np.isnan(y) | np.isnan(x))
+    n = valid.sum(axis=0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_x = np.where(valid, x, 0).sum(axis=0) / n
+        mean_y = np.where(valid, y, 0).sum(axis=0) / n
+        dx = np.where(valid, x - mean_x, 0)
+        dy = np.where(valid, y - mean_y, 0)
+        beta = (dx * dy).sum(axis=0) / (dx * dx).sum(axis=0)
+    alpha = mean_y - beta * mean_x
+
+    resid = y - (alpha + beta * x)
+    resid[~valid] = np.nan
+    return alpha, beta, resid
+
+
+def _adf_columns(resid_columns):
+    from statsmodels.tsa.stattools import adfuller
+
+    out = []
+    for r in resid_columns:
+        r = r[~np.isnan(r)]
+        try:
+            stat, p_value = adfuller(r)[:2]
+        except Exception:
+            stat, p_value = np.nan, np.nan
+        out.append((stat, p_value))
+    return out
+
+
+@instrumented("cointegration_table")
+def cointegration_table(price_df, pairs, significance=0.05, n_jobs=None):
+    """
+    Engle-Granger test for many pairs: batched hedge-ratio regressions, then the
+    ADF test on each residual series spread over worker processes.
+
+    The regression is sym1 on sym2 (the same orientation as the signals), so
+    'beta' is the hedge ratio used by pair_zscore_signals and backtest_pairs_panel.
+
+    Args:
+        price_df (DataFrame): Long format with ['Date', 'Symbol', 'Close'].
+        pairs (list): (sym1, sym2) tuples.
+        significance (float): ADF p-value below which a pair counts as cointegrated.
+        n_jobs (int or None): Worker processes (None = configured n_jobs, 1 = in-process).
+
+    Returns:
+        pd.DataFrame: Index (sym1, sym2); columns alpha, beta, n_obs, adf_stat, p_value, is_cointegrated.
+    """
+    index = pd.MultiIndex.from_tuples(pairs, names=['sym1', 'sym2'])
+    if not pairs:
+        return pd.DataFrame(columns=['alpha', 'beta', 'n_obs', 'adf_stat', 'p_value', 'is_cointegrated'], index=index)
+
+    with span("cointegration.ols", n_pairs=len(pairs)):
+        alpha, beta, resid = batched_hedge_ratios(close_panel(price_df), pairs)
+
+    columns = [resid[:, k] for k in range(resid.shape[1])]
+    n_jobs = resolve_n_jobs(n_jobs, len(columns))
+    with span("cointegration.adf", n_pairs=len(pairs), n_jobs=n_jobs):
+        if n_jobs == 1:
+            stats = _adf_columns(columns)
+        else:
+            # Contiguous batches per task keep the pickling overhead per pair small
+            size = -(-len(columns) // (4 * n_jobs))
+            batches = [columns[k:k + size] for k in range(0, len(columns), size)]
+            with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+                stats = [s for batch in pool.map(_adf_columns, batches) for s in batch]
+
+    stats = np.array(stats, dtype=float).reshape(-1, 2)
+    table = pd.DataFrame({
+        'alpha': alpha,
+        'beta': beta,
+        'n_obs': (~np.isnan(resid)).sum(axis=0),
+        'adf_stat': stats[:, 0],
+        'p_value': stats[:, 1],
+    }, index=index)
+    table['is_cointegrated'] = table['p_value'] < significance
+
+    failed = int(table['p_value'].isna().sum())
+    count("cointegration.failed", failed)
+    if failed:
+        print(f"[WARN] ADF test failed for {failed} pair(s).")
+    return table
+
+
+def test_cointegration_on_pairs(price_df, selected_pairs, significance=0.05, n_jobs=None):
+    """
+    Cointegrated pairs and their hedge ratios (drop-in for the notebook helper).
+
+    Returns:
+        tuple: (list of cointegrated pairs, dict pair -> beta)
+    """
+    table = cointegration_table(price_df, selected_pairs, significance=significance, n_jobs=n_jobs)
+    coint = table[table['is_cointegrated']]
+    pairs = list(coint.index)
+    return pairs, dict(zip(pairs, coint['beta']))
+
+
+def _compact(values, valid):
+    """Move each column's valid rows to the top (stable), so rolling windows count observations."""
+    order = np.argsort(~valid, axis=0, kind='stable')
+    return np.take_along_axis(values, order, axis=0), order
+
+
+def _uncompact(values, order, valid):
+    out = np.empty_like(values)
+    np.put_along_axis(out, order, values, axis=0)
+    out[~valid] = np.nan
+    return out
+
+
+@instrumented("pair_zscore_signals")
+def pair_zscore_signals(price_df, pairs, window=20, entry_threshold=2.0, exit_threshold=0.5):
+    """
+    Rolling z-score pair signals for all pairs as one (date x pair) panel.
+
+    Per pair, the spread is the residual of sym1 on sym2 over the dates where both
+    trade; the rolling mean/std run over those dates only. Signals follow the
+    notebook's generate_signals_for_pairs: enter on the lagged z-score beyond
+    +-entry_threshold (short spread above, long below), hold by forward fill, and
+    flatten when the lagged z-score is back inside +-exit_threshold. Pairs with
+    fewer than `window` common dates are dropped.
+
+    Args:
+        price_df (DataFrame): Long format with ['Date', 'Symbol', 'Close'].
+        pairs (list): (sym1, sym2) tuples.
+        window (int): Rolling window for the z-score.
+        entry_threshold (float): Z-score entry threshold.
+        exit_threshold (float): Z-score exit threshold.
+
+    Returns:
+        dict: 'signals', 'spread', 'z_score' DataFrames (index=Date, columns=(sym1, sym2),
+              NaN where the pair has no common price) and 'alpha', 'beta' Series by pair.
+    """
+    prices = close_panel(price_df)
+    alpha, beta, spread = batched_hedge_ratios(prices, pairs)
+    valid = ~np.isnan(spread)
+
+    keep = valid.sum(axis=0) >= window
+    if not keep.all():
+        count("pairs.skipped_short_history", int((~keep).sum()))
+    pairs = [p for p, k in zip(pairs, keep) if k]
+    alpha, beta, spread, valid = alpha[keep], beta[keep], spread[:, keep], valid[:, keep]
+
+    with span("pairs.zscore", n_pairs=len(pairs)):
+        compact, order = _compact(spread, valid)
+        rolling = pd.DataFrame(compact).rolling(window=window)
+        z = ((compact - rolling.mean().to_numpy()) / rolling.std().to_numpy())
+
+        # Lag by one observation of the pair (the previous common date)
+        z_lag = np.full_like(z, np.nan)
+        z_lag[1:] = z[:-1]
+
+        entries = np.zeros_like(z)
+        entries[z_lag > entry_threshold] = -1
+        entries[z_lag < -entry_threshold] = 1
+
+        # Hold the last entry until the next one
+        held = pd.DataFrame(np.where(entries == 0, np.nan, entries)).ffill().fillna(0).to_numpy(copy=True)
+        held[(held == 1) & (z_lag > -exit_threshold)] = 0
+        held[(held == -1) & (z_lag < exit_threshold)] = 0
+
+    columns = pd.MultiIndex.from_tuples(pairs, names=['sym1', 'sym2']) if pairs else pd.MultiIndex.from_arrays(
+        [[], []], names=['sym1', 'sym2'])
+    frame = lambda a: pd.DataFrame(a, index=prices.index, columns=columns)
+    return {
+        'signals': frame(_uncompact(held, order, valid)),
+        'spread': frame(spread),
+        'z_score': frame(_uncompact(z, order, valid)),
+        'alpha': pd.Series(alpha, index=columns),
+        'beta': pd.Series(beta, index=columns),
+    }
+
+
+@instrumented("backtest_pairs_panel")
+def backtest_pairs_panel(price_df, signals, beta, capital_allocations=None, return_pair_returns=False):
+    """
+    Pair backtest over the (date x pair) panel, equivalent to the notebook's
+    backtest_pair_trading_with_capital without its date x pair loop.
+
+    The return of a pair from t to t+1 is signal_t * (r_sym1 - beta * r_sym2); pairs
+    with a zero/missing signal or a missing price at t or t+1 contribute nothing.
+    The portfolio return is the capital-weighted sum divided by the total capital.
+
+    Args:
+        price_df (DataFrame): Long format with ['Date', 'Symbol', 'Close'].
+        signals (DataFrame): index=Date, columns=(sym1, sym2) pairs (e.g. pair_zscore_signals()['signals']).
+        beta (Series or dict): Hedge ratio per pair.
+        capital_allocations (dict or None): Capital per pair (None = equal capital). Pairs
+                                            without signals still count towards the total.
+        return_pair_returns (bool): Also return the per-pair return panel.
+
+    Returns:
+        pd.Series: Portfolio returns indexed by date (from the second date on),
+                   or (Series, DataFrame of pair returns) if return_pair_returns.
+    """
+    prices = close_panel(price_df)
+    pairs = list(signals.columns)
+    if capital_allocations is None:
+        capital_allocations = {p: 1.0 for p in pairs}
+    total_capital = sum(capital_allocations.values())
+
+    values = prices.to_numpy(dtype=float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        returns = values[1:] / values[:-1] - 1
+    i1, i2 = _pair_positions(prices.columns, pairs)
+    betas = np.array([beta[p] for p in pairs], dtype=float)
+    caps = np.array([capital_allocations.get(p, 0) for p in pairs], dtype=float)
+
+    held = signals.reindex(prices.index).to_numpy(dtype=float)[:-1]
+    pair_returns = held * (returns[:, i1] - betas * returns[:, i2])
+    pair_returns[~np.isfinite(pair_returns)] = 0.0
+
+    if total_capital > 0:
+        portfolio = pair_returns @ caps / total_capital
+    else:
+        portfolio = np.zeros(len(pair_returns))
+
+    portfolio = pd.Series(portfolio, index=prices.index[1:])
+    if return_pair_returns:
+        return portfolio, pd.DataFrame(pair_returns, index=prices.index[1:], columns=signals.columns)
+    return portfolio
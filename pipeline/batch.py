@@ -0,0 +1,172 @@
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+from config import resolve_n_jobs
+from data_loading.data_loading import load_price_data, is_date_symbol_sorted
+from pipeline.stages import default_params, point_in_time, select_universe
+from profiling.instrumentation import span, count
+from strategy.strategy import ewma_momentum_signals
+
+__all__ = ["prepare_batch_panels", "run_asof_batch"]
+
+# Per-process state shared by all dates a worker evaluates (set once by _init_worker)
+_STATE = {}
+
+
+def prepare_batch_panels(df, params=None):
+    """
+    Compute the date-independent panels once for the full history.
+
+    EWMA momentum, the rolling threshold counts and the rolling volatility are all
+    causal per symbol, so their value on date d from the full-history panel equals
+    the value recomputed on data truncated at d. Only the filters (which depend on
+    the whole window up to d) and the cross-sectional normalization are date-specific.
+    This holds when symbols share one trading calendar; a symbol's row on a date
+    where it did not trade is NaN in the panel either way.
+
+    Args:
+        df (DataFrame): Long format with ['Date', 'Symbol', 'Close'], sorted by Date.
+        params (dict or None): Overrides of the configured strategy parameters.
+
+    Returns:
+        dict: 'momentum', 'signals' and 'inv_vol' wide DataFrames (dates x symbols).
+    """
+    p = {**default_params(), **(params or {})}
+
+    momentum, signals = ewma_momentum_signals(df, span=p["span"], threshold=p["threshold"],
+                                              min_days_above_thresh=p["min_days_above_thresh"])
+
+    # Same rolling volatility as inverse_volatility_weights, left un-normalized so each
+    # as-of date can normalize over its own universe
+    prices = df.pivot(index='Date', columns='Symbol', values='Close').sort_index()
+    rolling_vol = prices.pct_change().rolling(window=p["lookback"]).std().shift(1)
+    inv_vol = 1 / rolling_vol.clip(lower=1e-8)
+
+    return {"momentum": momentum, "signals": signals, "inv_vol": inv_vol}
+
+
+def _init_worker(df, panels, params):
+    _STATE["df"] = df
+    _STATE["panels"] = panels
+    _STATE["params"] = params
+
+
+def _run_date(as_of):
+    df = _STATE["df"]
+    panels = _STATE["panels"]
+    params = _STATE["params"]
+
+    record = {"AsOfDate": as_of, "error": None}
+    try:
+        with span("batch.date"):
+            hist = point_in_time(df, as_of)
+            if hist.empty:
+                raise ValueError("no data on or before as-of date")
+
+            final_assets, _, counts = select_universe(hist, params)
+            record.update(counts)
+
+            # Last panel row on or before the as-of date
+            row = panels["signals"].index.searchsorted(pd.Timestamp(as_of), side='right') - 1
+            date = panels["signals"].index[row]
+
+            long_signal = panels["signals"].iloc[row].reindex(final_assets).clip(lower=0)
+            # Inverse-vol normalization cancels in the final renormalization of the masked weights
+            raw = long_signal * panels["inv_vol"].iloc[row].reindex(final_assets)
+            total = raw.sum()
+            weights = (raw / total if total else raw * 0).fillna(0)
+
+            rows = pd.DataFrame({
+                "AsOfDate": as_of,
+                "Date": date,
+                "Symbol": final_assets,
+                "Weight": weights.values,
+                "Signal": panels["signals"].iloc[row].reindex(final_assets).values,
+                "Momentum": panels["momentum"].iloc[row].reindex(final_assets).values,
+            })
+            record["n_long"] = int((weights > 0).sum())
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+        rows = None
+    return record, rows
+
+
+def _write_store(df, path):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.suffix == ".parquet":
+        df.to_parquet(path, index=False)
+    elif path.suffix in (".pkl", ".pickle"):
+        df.to_pickle(path)
+    else:
+        df.to_csv(path, index=False)
+    return path.resolve()
+
+
+def run_asof_batch(dates, df=None, params=None, n_jobs=None, store_path="results/asof_weights.csv", load_kwargs=None):
+    """
+    Run the filter / signal / weight stages of the pipeline for many as-of dates
+    with a single data load.
+
+    The long price table is loaded and Date-sorted once, the causal panels (momentum,
+    signals, rolling volatility) are computed once, and each as-of date only runs the
+    filters on its point-in-time slice and reads one panel row. Dates are spread over
+    worker processes that receive the data once each (via the pool initializer).
+
+    Args:
+        dates (iterable): As-of dates.
+        df (DataFrame or None): Long price data; loaded with load_price_data if None.
+        params (dict or None): Overrides of the configured strategy parameters.
+        n_jobs (int or None): Worker processes (None = configured n_jobs, 1 = in-process).
+        store_path (str or None): Consolidated output (.csv, .parquet or .pkl). None skips writing.
+        load_kwargs (dict or None): Passed to load_price_data when df is None.
+
+    Returns:
+        tuple: (weights DataFrame with one row per as-of date and symbol,
+                summary DataFrame with one row per as-of date: stage counts and errors)
+    """
+    params = {**default_params(), **(params or {})}
+    dates = sorted(pd.to_datetime(list(dates)))
+    if not dates:
+        raise ValueError("No as-of dates given.")
+
+    with span("batch.load"):
+        if df is None:
+            df = load_price_data(end_date=max(dates), **(load_kwargs or {}))
+        if 'Date' not in df.columns:
+            df = df.reset_index()
+        df = df[df['Date'] <= max(dates)]
+        if not is_date_symbol_sorted(df):
+            df = df.sort_values('Date', kind='stable')
+        df = df.reset_index(drop=True)
+
+    with span("batch.panels"):
+        panels = prepare_batch_panels(df, params)
+
+    n_jobs = resolve_n_jobs(n_jobs, len(dates))
+    with span("batch.dates", n_dates=len(dates), n_jobs=n_jobs):
+        if n_jobs == 1:
+            _init_worker(df, panels, params)
+            outputs = [_run_date(d) for d in dates]
+        else:
+            chunksize = max(1, len(dates) // (4 * n_jobs))
+            with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                                     initargs=(df, panels, params)) as pool:
+                outputs = list(pool.map(_run_date, dates, chunksize=chunksize))
+
+    summary = pd.DataFrame([record for record, _ in outputs])
+    frames = [rows for _, rows in outputs if rows is not None]
+    weights = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(
+        columns=["AsOfDate", "Date", "Symbol", "Weight", "Signal", "Momentum"])
+
+    failed = summary[summary["error"].notna()]
+    count("batch.failed_dates", len(failed))
+    for _, r in failed.iterrows():
+        print(f"[WARN] As-of {r['AsOfDate'].date()} failed: {r['error']}")
+
+    if store_path is not None:
+        print(f"Saved {len(weights)} weight rows for {len(dates)} dates to: {_write_store(weights, store_path)}")
+
+    return weights, summary
@@ -0,0 +1,130 @@
+from dataclasses import asdict
+
+import numpy as np
+import pandas as pd
+
+from config import StrategyConfig, get_config
+from functions.sparse_weights import SparseWeights
+from asset_selection.selection_functions import filter_by_var, filter_by_volatility, filter_by_correlation
+from optimize.optimisation import inverse_volatility_weights
+from profiling.instrumentation import span
+from strategy.strategy import ewma_momentum_signals
+
+__all__ = [
+    "DEFAULT_PARAMS",
+    "default_params",
+    "point_in_time",
+    "select_universe",
+    "compute_signal_weights",
+    "combine_signal_weights",
+]
+
+# Built-in stage parameters of main.run_pipeline (config.StrategyConfig defaults)
+DEFAULT_PARAMS = asdict(StrategyConfig())
+
+
+def default_params():
+    """Stage parameters of the active configuration (strategy section)."""
+    return asdict(get_config().strategy)
+
+
+def point_in_time(df, date):
+    """
+    Rows of a Date-sorted long DataFrame up to and including `date`.
+    Uses a binary search on the Date column instead of a boolean mask, so the
+    result is a cheap positional slice.
+
+    Args:
+        df (DataFrame): Long format with a 'Date' column sorted ascending.
+        date (datetime or str): As-of date.
+
+    Returns:
+        DataFrame: df rows with Date <= date.
+    """
+    end = np.searchsorted(df['Date'].values, np.datetime64(pd.to_datetime(date)), side='right')
+    return df.iloc[:end]
+
+
+def select_universe(price_df, params=None):
+    """
+    Apply the VaR, volatility, trend and correlation filters of the pipeline.
+
+    Args:
+        price_df (DataFrame): Long format with ['Date', 'Symbol', 'Close'].
+        params (dict or None): Overrides of the configured strategy parameters.
+
+    Returns:
+        tuple: (final_assets list, price_df restricted to final assets, dict of asset counts per stage)
+    """
+    p = {**default_params(), **(params or {})}
+    counts = {}
+
+    safe_assets = filter_by_var(price_df, confidence_level=p["var_confidence"],
+                                var_threshold=p["var_threshold"], lookback=p["var_lookback"])
+    price_df = price_df[price_df['Symbol'].isin(safe_assets)]
+    counts["n_var"] = len(safe_assets)
+
+    # Step 2: Filter by volatility
+    stable_assets = filter_by_volatility(price_df=price_df, window=p["vol_window"],
+                                         min_vol=p["min_vol"], max_vol=p["max_vol"])
+    price_df = price_df[price_df['Symbol'].isin(stable_assets)]
+    counts["n_vol"] = len(stable_assets)
+
+    # Step 3: Filter by trend
+    trending_assets = filter_by_var(price_df=price_df, confidence_level=p["var_confidence"],
+                                    var_threshold=p["var_threshold"], lookback=p["var_lookback"])
+    price_df = price_df[price_df['Symbol'].isin(trending_assets)]
+    counts["n_trend"] = len(trending_assets)
+
+    # Step 4: Filter by correlation
+    final_assets, _ = filter_by_correlation(price_df, corr_threshold=p["corr_threshold"])
+    counts["n_corr"] = len(final_assets)
+
+    return final_assets, price_df[price_df['Symbol'].isin(final_assets)], counts
+
+
+def compute_signal_weights(final_price_df, params=None, sparse=False):
+    """
+    EWMA momentum signals combined with inverse-volatility weights (long only).
+
+    Args:
+        final_price_df (DataFrame): Long format with ['Date', 'Symbol', 'Close'].
+        params (dict or None): Overrides of the configured strategy parameters.
+        sparse (bool): Return final_weights as a SparseWeights.
+
+    Returns:
+        tuple: (momentum_df, signals, final_weights) wide DataFrames (dates x symbols).
+    """
+    p = {**default_params(), **(params or {})}
+
+    with span("pipeline.signals"):
+        momentum_df, signals = ewma_momentum_signals(final_price_df, span=p["span"], threshold=p["threshold"],
+                                                     min_days_above_thresh=p["min_days_above_thresh"])
+
+    with span("pipeline.weights"):
+        weights = inverse_volatility_weights(final_price_df, lookback=p["lookback"])
+        final_weights = combine_signal_weights(signals, weights, sparse=sparse)
+
+    return momentum_df, signals, final_weights
+
+
+def combine_signal_weights(signals, weights, sparse=False):
+    """
+    Long-only signals times inverse-volatility weights, renormalized per date.
+
+    Args:
+        signals (DataFrame): Wide signals (1 / 0 / -1), dates x symbols.
+        weights (DataFrame): Wide inverse-volatility weights, dates x symbols.
+        sparse (bool): Build a SparseWeights from the long entries only, without
+                       materializing the dense product.
+
+    Returns:
+        DataFrame or SparseWeights: Weights summing to 1 on dates with any long signal, else 0.
+    """
+    if sparse:
+        weights = weights.reindex(index=signals.index, columns=signals.columns)
+        values = weights.to_numpy(dtype=float)
+        long_only = signals.to_numpy(dtype=float) > 0
+        return SparseWeights.from_dense(values, signals.index, signals.columns, keep=long_only).normalize()
+    final_weights = signals.clip(lower=0) * weights
+    return final_weights.div(final_weights.sum(axis=1).replace(0, np.nan), axis=0).fillna(0)
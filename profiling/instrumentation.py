@@ -0,0 +1,303 @@
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from pathlib import Path
+
+__all__ = [
+    "enable",
+    "disable",
+    "is_enabled",
+    "reset",
+    "span",
+    "count",
+    "instrumented",
+    "register_hook",
+    "unregister_hook",
+    "get_counters",
+    "get_events",
+    "export_trace",
+    "summary_table",
+    "print_summary",
+]
+
+# Global switch. Every public entry point checks this first so that the
+# disabled path costs one global lookup and, for spans, a shared no-op context.
+_ENABLED = False
+_TRACE_MEMORY = False
+# True while tracemalloc runs because enable() started it (disable() stops only that session)
+_OWNS_TRACEMALLOC = False
+
+_events = []
+_counters = defaultdict(float)
+_hooks = []
+_lock = threading.Lock()
+_local = threading.local()
+_origin = time.perf_counter()
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("name", "attrs", "start", "mem_base", "max_peak")
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        stack = _stack()
+        if _TRACE_MEMORY and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            # Hand the peak seen so far to the enclosing span before resetting it
+            if stack:
+                stack[-1].max_peak = max(stack[-1].max_peak, peak)
+            tracemalloc.reset_peak()
+            self.mem_base = current
+            self.max_peak = current
+        else:
+            self.mem_base = None
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        stack = _stack()
+        stack.pop()
+
+        peak_bytes = None
+        if self.mem_base is not None and tracemalloc.is_tracing():
+            peak = max(self.max_peak, tracemalloc.get_traced_memory()[1])
+            peak_bytes = peak - self.mem_base
+            if stack:
+                stack[-1].max_peak = max(stack[-1].max_peak, peak)
+
+        event = {
+            "type": "span",
+            "name": self.name,
+            "start": self.start - _origin,
+            "duration": end - self.start,
+            "peak_memory": peak_bytes,
+            "depth": len(stack),
+            "thread": threading.get_ident(),
+            "error": None if exc_type is None else exc_type.__name__,
+            "attrs": self.attrs,
+        }
+        with _lock:
+            _events.append(event)
+        _dispatch(event)
+        return False
+
+
+def _stack():
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def _dispatch(event):
+    for hook in list(_hooks):
+        try:
+            hook(event)
+        except Exception as e:
+            print(f"[WARN] Instrumentation hook {hook!r} failed: {e}")
+
+
+def enable(trace_memory=False):
+    """
+    Turn instrumentation on.
+
+    Args:
+        trace_memory (bool): Also record peak Python memory per span via tracemalloc
+                             (noticeably slower, so off by default).
+    """
+    global _ENABLED, _TRACE_MEMORY, _OWNS_TRACEMALLOC
+    _ENABLED = True
+    _TRACE_MEMORY = trace_memory
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _OWNS_TRACEMALLOC = True
+
+
+def disable():
+    """
+    Turn instrumentation off (recorded events are kept until reset()). A tracemalloc
+    session started by the caller before enable() keeps running.
+    """
+    global _ENABLED, _TRACE_MEMORY, _OWNS_TRACEMALLOC
+    _ENABLED = False
+    if _OWNS_TRACEMALLOC and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _OWNS_TRACEMALLOC = False
+    _TRACE_MEMORY = False
+
+
+def is_enabled():
+    return _ENABLED
+
+
+def reset():
+    """Drop all recorded spans and counters."""
+    global _origin
+    with _lock:
+        _events.clear()
+        _counters.clear()
+    _origin = time.perf_counter()
+
+
+def span(name, **attrs):
+    """
+    Context manager timing a block (and its peak memory when enabled with trace_memory).
+
+    Usage:
+        with span("pipeline.signals", n_symbols=len(symbols)):
+            ...
+    """
+    if not _ENABLED:
+        return _NULL_SPAN
+    return _Span(name, attrs)
+
+
+def count(name, value=1):
+    """Increment a named counter (e.g. solver iterations, skipped days)."""
+    if not _ENABLED:
+        return
+    with _lock:
+        _counters[name] += value
+    if _hooks:
+        _dispatch({"type": "counter", "name": name, "value": value, "total": _counters[name]})
+
+
+def instrumented(name=None):
+    """
+    Decorator wrapping every call of a function in a span. The enabled flag is
+    checked at call time, so decorated functions can be toggled without re-importing.
+    """
+    def decorator(fn):
+        span_name = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _ENABLED:
+                return fn(*args, **kwargs)
+            with _Span(span_name, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def register_hook(callback):
+    """
+    Register a callable invoked with an event dict whenever a span finishes
+    ({'type': 'span', 'name', 'duration', 'peak_memory', ...}) or a counter is
+    incremented ({'type': 'counter', 'name', 'value', 'total'}).
+    """
+    if callback not in _hooks:
+        _hooks.append(callback)
+    return callback
+
+
+def unregister_hook(callback):
+    if callback in _hooks:
+        _hooks.remove(callback)
+
+
+def get_counters():
+    with _lock:
+        return dict(_counters)
+
+
+def get_events():
+    with _lock:
+        return list(_events)
+
+
+def export_trace(path):
+    """
+    Write recorded spans and counters as a Chrome trace-event JSON file
+    (viewable in chrome://tracing or Perfetto).
+
+    Args:
+        path (str or Path): Output JSON path.
+
+    Returns:
+        Path: Resolved output path.
+    """
+    pid = os.getpid()
+    events = get_events()
+    trace_events = []
+    for e in events:
+        args = {k: v for k, v in e["attrs"].items()}
+        if e["peak_memory"] is not None:
+            args["peak_memory_bytes"] = e["peak_memory"]
+        if e["error"] is not None:
+            args["error"] = e["error"]
+        trace_events.append({
+            "name": e["name"],
+            "ph": "X",
+            "ts": e["start"] * 1e6,
+            "dur": e["duration"] * 1e6,
+            "pid": pid,
+            "tid": e["thread"],
+            "args": args,
+        })
+
+    end_ts = max((e["start"] + e["duration"] for e in events), default=0.0) * 1e6
+    for name, total in get_counters().items():
+        trace_events.append({"name": name, "ph": "C", "ts": end_ts, "pid": pid, "args": {"value": total}})
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({"traceEvents": trace_events, "counters": get_counters()}, default=str), encoding="utf-8")
+    return path.resolve()
+
+
+def summary_table():
+    """
+    Aggregate recorded spans by name.
+
+    Returns:
+        pd.DataFrame: calls, total/mean/max seconds and max peak memory (MB) per span
+                      name, sorted by total time; counters are returned in df.attrs['counters'].
+    """
+    import pandas as pd
+
+    events = get_events()
+    columns = ["calls", "total_s", "mean_ms", "max_ms", "peak_memory_mb"]
+    if not events:
+        table = pd.DataFrame(columns=columns)
+    else:
+        df = pd.DataFrame(events)
+        grouped = df.groupby("name")
+        table = pd.DataFrame({
+            "calls": grouped.size(),
+            "total_s": grouped["duration"].sum(),
+            "mean_ms": grouped["duration"].mean() * 1e3,
+            "max_ms": grouped["duration"].max() * 1e3,
+            "peak_memory_mb": grouped["peak_memory"].max() / 1e6,
+        }).sort_values("total_s", ascending=False)
+    table.attrs["counters"] = get_counters()
+    return table
+
+
+def print_summary():
+    table = summary_table()
+    print(table.to_string(float_format=lambda x: f"{x:,.3f}"))
+    for name, total in table.attrs["counters"].items():
+        print(f"{name}: {total:g}")
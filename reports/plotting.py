@@ -1,10 +1,24 @@
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Dict, List, Optional, Tuple
+import html
 import re
 
+from config import resolve_n_jobs
+from kernels import kernels
+
+__all__ = [
+    "plot_performance",
+    "update_readme_with_image",
+    "downsample_minmax",
+    "render_performance_fast",
+    "render_reports_batch",
+]
+
 
 def _max_drawdown_info(wealth: pd.Series) -> Tuple[float, pd.Timestamp, pd.Timestamp, pd.Timestamp]:
     """
@@ -15,28 +29,11 @@ def _max_drawdown_info(wealth: pd.Series) -> Tuple[float, pd.Timestamp, pd.Times
     if wealth.empty:
         return 0.0, None, None, None
 
-    running_max = wealth.cummax()
-    drawdown = wealth / running_max - 1.0  # negative or zero
-    trough_idx = drawdown.idxmin()
-    max_dd = drawdown.min()
-
-    # start = last time before trough where wealth == running_max
-    pre_trough = wealth.loc[:trough_idx]
-    try:
-        start_idx = pre_trough[pre_trough == pre_trough.cummax()].index[-1]
-    except IndexError:
-        start_idx = wealth.index[0]
-
-    # recovery end = first index after trough where wealth >= previous running max
-    post_trough = wealth.loc[trough_idx:]
-    recovery_idx = None
-    prev_peak_value = wealth.loc[start_idx]
-    for idx, val in post_trough.items():
-        if val >= prev_peak_value:
-            recovery_idx = idx
-            break
-
-    return float(max_dd), start_idx, trough_idx, recovery_idx
+    # start = last time before trough where wealth == running max,
+    # recovery end = first index after trough where wealth >= that peak
+    max_dd, start, trough, recovery = kernels.drawdown_recovery(wealth.to_numpy(dtype=float))
+    index = wealth.index
+    return float(max_dd), index[start], index[trough], (index[recovery] if recovery >= 0 else None)
 
 
 def plot_performance(
@@ -79,6 +76,8 @@ def plot_performance(
     max_dd, dd_start, dd_trough, dd_recovery = _max_drawdown_info(wealth)
 
     # --- Plotting ---
+    import matplotlib.pyplot as plt  # pyplot state machine only for the interactive path
+
     fig, (ax_ret, ax_dd) = plt.subplots(
         2, 1, figsize=(12, 8), sharex=True, gridspec_kw={"height_ratios": [2, 1]}
     )
@@ -181,4 +180,266 @@ def update_readme_with_image(readme_path: Path, image_rel_path: str, section_hea
         new_readme = readme_text + "\n" + replacement
 
     readme_path.write_text(new_readme, encoding='utf-8')
-    return readme_path.resolve()
\ No newline at end of file
+    return readme_path.resolve()
+
+
+def downsample_minmax(series: pd.Series, n_buckets: int) -> pd.Series:
+    """
+    Shape-preserving downsampling: keep the first, last, minimum and maximum point
+    of each of n_buckets equal-width buckets, so peaks and troughs (e.g. the max
+    drawdown) survive. Series shorter than 2 * n_buckets are returned unchanged.
+
+    Args:
+        series (pd.Series): Series to downsample (no NaNs).
+        n_buckets (int): Number of buckets, typically the plot width in pixels / 2.
+
+    Returns:
+        pd.Series: Subset of the original points in original order.
+    """
+    n = len(series)
+    if n_buckets <= 0 or n <= 2 * n_buckets:
+        return series
+
+    size = int(np.ceil(n / n_buckets))
+    n_rows = int(np.ceil(n / size))
+    values = series.to_numpy(dtype=float)
+
+    # Pad the last bucket with its final value so every row has `size` entries
+    padded = np.pad(values, (0, n_rows * size - n), mode="edge").reshape(n_rows, size)
+    offsets = np.arange(n_rows) * size
+    keep = np.concatenate([
+        offsets,
+        offsets + padded.argmin(axis=1),
+        offsets + padded.argmax(axis=1),
+        np.minimum(offsets + size - 1, n - 1),
+    ])
+    keep = np.unique(np.clip(keep, 0, n - 1))
+    return series.iloc[keep]
+
+
+class _PerformanceFigureTemplate:
+    """
+    Reusable two-panel performance figure drawn with the Agg canvas directly
+    (no pyplot state machine). Static elements (axes, labels, grids, line artists)
+    are created once; each render only swaps data and the per-strategy overlays.
+    """
+
+    def __init__(self, figsize: Tuple[float, float] = (12, 8), dpi: int = 100):
+        self.dpi = dpi
+        self.fig = Figure(figsize=figsize, dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.fig)
+        self.ax_ret, self.ax_dd = self.fig.subplots(
+            2, 1, sharex=True, gridspec_kw={"height_ratios": [2, 1]}
+        )
+
+        (self.ret_line,) = self.ax_ret.plot([], [], linewidth=2, color="#2b8cbe")
+        self.ax_ret.set_ylabel("Cumulative Return")
+        self.ax_ret.grid(alpha=0.4, linestyle="--")
+
+        (self.dd_line,) = self.ax_dd.plot([], [], color="#a50f15", linewidth=1)
+        self.ax_dd.set_ylabel("Drawdown")
+        self.ax_dd.set_xlabel("Date")
+        self.ax_dd.grid(alpha=0.4, linestyle="--")
+
+        self._overlays = []
+        self.width_px = int(figsize[0] * dpi)
+
+    def render(self, portfolio_returns: pd.Series, out_path: Path, title: str = "Strategy Performance") -> Dict[str, float]:
+        for artist in self._overlays:
+            artist.remove()
+        self._overlays = []
+
+        portfolio_returns = portfolio_returns.sort_index().dropna()
+        if portfolio_returns.empty:
+            raise ValueError("portfolio_returns is empty after dropping NaNs.")
+
+        wealth = (1.0 + portfolio_returns).cumprod()
+        cumulative_returns = wealth - 1.0
+        drawdown = wealth / wealth.cummax() - 1.0
+        max_dd, dd_start, dd_trough, dd_recovery = _max_drawdown_info(wealth)
+
+        # Two points per bucket, roughly one bucket per two pixels
+        n_buckets = max(self.width_px // 2, 1)
+        ret_plot = downsample_minmax(cumulative_returns, n_buckets)
+        dd_plot = downsample_minmax(drawdown, n_buckets)
+
+        self.ret_line.set_data(ret_plot.index, ret_plot.values)
+        self.dd_line.set_data(dd_plot.index, dd_plot.values)
+        self.ax_ret.set_title(title)
+
+        self._overlays.append(self.ax_dd.fill_between(dd_plot.index, dd_plot.values, 0, color="#d73027", alpha=0.35))
+        if dd_start is not None and dd_trough is not None:
+            self._overlays.append(self.ax_ret.axvspan(
+                dd_start, dd_recovery if dd_recovery is not None else dd_trough, color="#fde725", alpha=0.15
+            ))
+            points = [(dd_start, "#e6550d", "Drawdown start"), (dd_trough, "#d73027", "Trough")]
+            if dd_recovery is not None:
+                points.append((dd_recovery, "#2ca25f", "Recovery"))
+            for x, color, label in points:
+                self._overlays.append(self.ax_ret.scatter([x], [cumulative_returns.loc[x]], color=color, zorder=5, label=label))
+            self._overlays.append(self.ax_ret.legend(loc="upper left", fontsize=9))
+            self._overlays.append(self.ax_dd.annotate(
+                f"Max Drawdown: {(max_dd * 100):.2f}%",
+                xy=(dd_trough, drawdown.loc[dd_trough]),
+                xytext=(20, -40),
+                textcoords="offset points",
+                bbox=dict(boxstyle="round,pad=0.4", fc="white", alpha=0.9),
+                arrowprops=dict(arrowstyle="->", color="#555555"),
+                fontsize=9,
+            ))
+
+        for ax in (self.ax_ret, self.ax_dd):
+            ax.relim()
+            ax.autoscale_view()
+
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        self.fig.savefig(out_path, dpi=self.dpi)
+
+        return {
+            "cumulative_return": float(cumulative_returns.iloc[-1]),
+            "max_drawdown": float(max_dd),
+            "n_points": int(len(portfolio_returns)),
+        }
+
+
+# One template per worker process, keyed by (figsize, dpi)
+_TEMPLATE_CACHE: Dict[Tuple, _PerformanceFigureTemplate] = {}
+
+
+def _get_template(figsize: Tuple[float, float], dpi: int) -> _PerformanceFigureTemplate:
+    key = (tuple(figsize), dpi)
+    if key not in _TEMPLATE_CACHE:
+        _TEMPLATE_CACHE[key] = _PerformanceFigureTemplate(figsize=figsize, dpi=dpi)
+    return _TEMPLATE_CACHE[key]
+
+
+def _safe_filename(name: str) -> str:
+    return re.sub(r"[^\w.-]+", "_", str(name)).strip("_") or "strategy"
+
+
+def _unique_filenames(names, fmt: str) -> List[str]:
+    """Safe image file names, suffixed _2, _3, ... where names collide (case-insensitively)."""
+    used, files = set(), []
+    for name in names:
+        stem = base = _safe_filename(name)
+        n = 1
+        while stem.lower() in used:
+            n += 1
+            stem = f"{base}_{n}"
+        used.add(stem.lower())
+        files.append(f"{stem}.{fmt}")
+    return files
+
+
+def render_performance_fast(
+    portfolio_returns: pd.Series,
+    save_path: Path | str,
+    title: str = "Strategy Performance",
+    dpi: int = 100,
+    figsize: Tuple[float, float] = (12, 8),
+) -> Dict[str, float]:
+    """
+    Batch-mode counterpart of plot_performance: non-interactive Agg rendering,
+    min/max downsampling to the plot's pixel width and a reused figure template.
+
+    Args:
+        portfolio_returns (pd.Series): Daily portfolio returns indexed by date.
+        save_path (Path|str): Output image path.
+        title (str): Figure title.
+        dpi (int): Output DPI.
+        figsize (tuple): Figure size in inches.
+
+    Returns:
+        dict: Summary stats of the rendered series.
+    """
+    if not isinstance(portfolio_returns, pd.Series):
+        raise ValueError("portfolio_returns must be a pandas Series indexed by date.")
+    return _get_template(figsize, dpi).render(portfolio_returns, Path(save_path), title=title)
+
+
+def _render_chunk(items, out_dir, dpi, figsize) -> List[Tuple[str, str, Optional[Dict[str, float]], Optional[str]]]:
+    results = []
+    for name, file_name, returns in items:
+        try:
+            stats = render_performance_fast(returns, Path(out_dir) / file_name, title=str(name), dpi=dpi, figsize=figsize)
+            results.append((name, file_name, stats, None))
+        except Exception as e:
+            results.append((name, file_name, None, str(e)))
+    return results
+
+
+def _write_report_index(out_dir: Path, results) -> Path:
+    rows = []
+    for name, file_name, stats, error in results:
+        if error is not None:
+            rows.append(f"<tr><td>{html.escape(str(name))}</td><td colspan='3'>Failed: {html.escape(error)}</td></tr>")
+            continue
+        rows.append(
+            f"<tr><td>{html.escape(str(name))}</td>"
+            f"<td>{stats['cumulative_return'] * 100:.2f}%</td>"
+            f"<td>{stats['max_drawdown'] * 100:.2f}%</td>"
+            f"<td><a href='{html.escape(file_name)}'><img src='{html.escape(file_name)}' width='480'></a></td></tr>"
+        )
+
+    page = (
+        "<!DOCTYPE html>\n<html><head><meta charset='utf-8'><title>Strategy Reports</title>"
+        "<style>body{font-family:sans-serif}td,th{padding:4px 8px;border-bottom:1px solid #ddd}</style>"
+        "</head><body>\n<h1>Strategy Reports</h1>\n<table>\n"
+        "<tr><th>Strategy</th><th>Cumulative Return</th><th>Max Drawdown</th><th>Chart</th></tr>\n"
+        + "\n".join(rows)
+        + "\n</table></body></html>\n"
+    )
+    index_path = out_dir / "index.html"
+    index_path.write_text(page, encoding="utf-8")
+    return index_path
+
+
+def render_reports_batch(
+    strategy_returns: Dict[str, pd.Series],
+    out_dir: Path | str = "charts/reports",
+    n_jobs: Optional[int] = None,
+    dpi: int = 100,
+    figsize: Tuple[float, float] = (12, 8),
+    fmt: str = "png",
+) -> Path:
+    """
+    Render performance charts for many strategies in parallel worker processes and
+    write an index.html linking all of them.
+
+    Args:
+        strategy_returns (dict): Strategy name -> daily returns Series.
+        out_dir (Path|str): Output directory for images and the index page.
+        n_jobs (int|None): Worker processes (None = configured n_jobs, 1 = render in-process).
+        dpi (int): Output DPI.
+        figsize (tuple): Figure size in inches.
+        fmt (str): Image format understood by matplotlib (png, svg, ...).
+
+    Returns:
+        Path: Path of the generated index.html.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    # Distinct strategies may sanitize to the same name; give each its own file
+    files = _unique_filenames(strategy_returns, fmt)
+    items = [(name, file_name, returns) for (name, returns), file_name in zip(strategy_returns.items(), files)]
+    n_jobs = resolve_n_jobs(n_jobs, len(items))
+
+    if n_jobs == 1:
+        results = _render_chunk(items, out_dir, dpi, figsize)
+    else:
+        # One chunk per worker so each builds its figure template only once
+        chunks = [items[i::n_jobs] for i in range(n_jobs)]
+        results = []
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            for chunk_results in pool.map(_render_chunk, chunks, [out_dir] * n_jobs, [dpi] * n_jobs,
+                                          [figsize] * n_jobs):
+                results.extend(chunk_results)
+        order = {name: i for i, (name, _, _) in enumerate(items)}
+        results.sort(key=lambda r: order[r[0]])
+
+    failed = [r for r in results if r[3] is not None]
+    for name, _, _, error in failed:
+        print(f"[WARN] Report for {name} failed: {error}")
+
+    return _write_report_index(out_dir, results).resolve()
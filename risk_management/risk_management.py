@@ -1,4 +1,15 @@
 import numpy as np
+import pandas as pd
+
+from kernels import kernels
+from profiling.instrumentation import instrumented
+
+__all__ = [
+    "get_dynamic_kelly_fraction",
+    "check_stop_loss",
+    "rolling_kelly_fraction",
+    "risk_overlay",
+]
 
 
 def get_dynamic_kelly_fraction(recent_returns, risk_free_rate=0.0):
@@ -23,4 +34,66 @@ def check_stop_loss(portfolio_value, running_max, kelly_fraction, base_drawdown_
     current_drawdown = (portfolio_value / running_max) - 1
     adjusted_limit = base_drawdown_limit * (1 - risk_sensitivity * kelly_fraction)
     stop_investing = current_drawdown <= adjusted_limit
-    return stop_investing, adjusted_limit
\ No newline at end of file
+    return stop_investing, adjusted_limit
+
+
+def rolling_kelly_fraction(returns, lookback=60, risk_free_rate=0.0):
+    """
+    get_dynamic_kelly_fraction for every date at once, using only the `lookback`
+    returns strictly before each date (so the fraction for day t is known at t-1).
+
+    Args:
+        returns (Series): Daily strategy returns.
+        lookback (int): Number of past returns in each window.
+        risk_free_rate (float): Risk-free rate per period.
+
+    Returns:
+        pd.Series: Kelly fraction in [0, 1] per date.
+    """
+    past = returns.shift(1).rolling(window=lookback, min_periods=1)
+    mu = past.mean() - risk_free_rate
+    sigma_sq = past.var()
+    kelly = (mu / sigma_sq).clip(lower=0.0, upper=1.0)
+    kelly[(sigma_sq == 0) | mu.isna() | sigma_sq.isna()] = 0.0
+    return kelly
+
+
+@instrumented("risk_overlay")
+def risk_overlay(strategy_returns, lookback=60, risk_free_rate=0.0, base_drawdown_limit=-0.10,
+                 risk_sensitivity=0.5, resume_recovery=0.05, min_stop_days=1, scale_by_kelly=True):
+    """
+    Kelly sizing and drawdown stop for a whole return history in one pass.
+
+    The rolling Kelly fraction is computed vectorized; the stop/resume state is a
+    single pass of kernels.drawdown_stop_path. The resulting 'exposure' column is a
+    per-date multiplier for backtest_close_to_close / backtest_with_rebalancing (exposure=...).
+
+    Args:
+        strategy_returns (Series): Daily returns of the un-overlaid strategy, indexed by date.
+        lookback (int): Kelly estimation window (returns before each date).
+        risk_free_rate (float): Risk-free rate per period.
+        base_drawdown_limit (float): Drawdown limit at zero Kelly fraction (negative).
+        risk_sensitivity (float): How much a higher Kelly fraction tightens the limit.
+        resume_recovery (float): Rise of the strategy from its low while stopped needed to resume.
+        min_stop_days (int): Minimum number of days spent stopped.
+        scale_by_kelly (bool): Exposure = Kelly fraction while active (else 1).
+
+    Returns:
+        pd.DataFrame: Per date: kelly_fraction, adjusted_limit, drawdown, stopped, exposure,
+                      overlay_return (= exposure * strategy return).
+    """
+    returns = strategy_returns.fillna(0).astype(float)
+    kelly = rolling_kelly_fraction(returns, lookback=lookback, risk_free_rate=risk_free_rate)
+    limit = base_drawdown_limit * (1 - risk_sensitivity * kelly.to_numpy())
+    # The stop/resume state is path dependent: one pass in the configured kernel backend
+    drawdown, stopped, exposure = kernels.drawdown_stop_path(
+        returns.to_numpy(), kelly.to_numpy(), limit, resume_recovery, min_stop_days, scale_by_kelly)
+
+    return pd.DataFrame({
+        "kelly_fraction": kelly.to_numpy(),
+        "adjusted_limit": limit,
+        "drawdown": drawdown,
+        "stopped": stopped,
+        "exposure": exposure,
+        "overlay_return": exposure * returns.to_numpy(),
+    }, index=strategy_returns.index)
@@ -0,0 +1,272 @@
+"""
+Monte Carlo forward paths of portfolio value and drawdown.
+
+Every model is reduced to the portfolios before simulating: with the weights as
+a (portfolios x assets) matrix W, a portfolio's return is W r, so only
+(paths x horizon x portfolios) arrays are drawn, never one value per asset.
+
+    'normal'     multivariate normal with the mean and covariance of the historical
+                 portfolio returns R W' (the projection of the asset-level MVN).
+    'bootstrap'  circular block bootstrap of the historical rows (blocks of
+                 block_size days keep volatility clustering and cross-asset
+                 dependence); the rows are drawn once and applied to R W'.
+    'factor'     r = alpha + B f + e: factor returns f block-bootstrapped from their
+                 history (given factor returns, else the first n_factors principal
+                 components of the asset returns), idiosyncratic e normal with
+                 independent asset residuals, i.e. covariance W diag(psi) W'.
+
+Paths are simulated in chunks of chunk_paths (sized to compute.memory_budget) and
+each chunk draws from its own child of SeedSequence(seed), so the results depend
+on seed and chunk_paths only, not on the number of worker processes.
+"""
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from config import get_config, resolve_n_jobs
+from profiling.instrumentation import instrumented, span, count
+
+__all__ = [
+    "SCENARIO_METHODS",
+    "scenario_model",
+    "simulate_portfolio_returns",
+    "path_statistics",
+    "monte_carlo_scenarios",
+    "scenario_summary",
+]
+
+SCENARIO_METHODS = ("normal", "bootstrap", "factor")
+
+# (paths x horizon x portfolios) float64 buffers alive per chunk: draws, returns, wealth, running max
+_PATH_BUFFERS = 4
+
+
+def _weight_matrix(weights, columns):
+    """(portfolios x assets) array and portfolio labels from a weight vector or matrix."""
+    if isinstance(weights, pd.Series):
+        return weights.reindex(columns).fillna(0.0).to_numpy(dtype=float)[None], pd.Index([weights.name or 0])
+    if isinstance(weights, pd.DataFrame):
+        return weights.reindex(columns=columns).fillna(0.0).to_numpy(dtype=float), weights.index
+    W = np.atleast_2d(np.asarray(weights, dtype=float))
+    if W.shape[1] != len(columns):
+        raise ValueError(f"weights have {W.shape[1]} assets, returns have {len(columns)}")
+    return np.nan_to_num(W), pd.RangeIndex(len(W))
+
+
+def _sqrt_psd(cov):
+    """Matrix square root L with L L' = cov, for positive semi-definite (possibly singular) cov."""
+    vals, vecs = np.linalg.eigh(cov)
+    return vecs * np.sqrt(np.clip(vals, 0.0, None))
+
+
+def scenario_model(returns, weights, method="bootstrap", block_size=20, n_factors=3, factors=None):
+    """
+    Parameters of the portfolio-level return model (small arrays, cheap to send to workers).
+
+    Args:
+        returns (DataFrame): Wide daily return panel (see var_engine.returns_panel);
+                             missing returns count as 0.
+        weights (Series or DataFrame or ndarray): One portfolio (Series over symbols) or
+                                                  several (rows of a DataFrame / 2-D array).
+        method (str): One of SCENARIO_METHODS.
+        block_size (int): Days per bootstrap block ('bootstrap' and 'factor').
+        n_factors (int): Principal components used when method='factor' and factors is None.
+        factors (DataFrame or None): Historical factor returns (index=Date) for method='factor'.
+
+    Returns:
+        dict: Model parameters, with 'method', 'portfolios' and 'block_size'.
+    """
+    if method not in SCENARIO_METHODS:
+        raise ValueError(f"method must be one of {SCENARIO_METHODS}")
+    if block_size < 1:
+        raise ValueError("block_size must be >= 1")
+    W, portfolios = _weight_matrix(weights, returns.columns)
+    R = np.nan_to_num(returns.to_numpy(dtype=float))
+    if len(R) < 2:
+        raise ValueError("Need at least 2 historical returns")
+    history = R @ W.T  # (dates x portfolios)
+    model = {"method": method, "portfolios": portfolios, "block_size": int(block_size)}
+
+    if method == "normal":
+        model["mean"] = history.mean(axis=0)
+        model["scale"] = _sqrt_psd(np.atleast_2d(np.cov(history, rowvar=False)))
+    elif method == "bootstrap":
+        model["history"] = history
+    else:
+        Rc = R - R.mean(axis=0)
+        if factors is None:
+            # Principal-component factor returns from the thin SVD (dates x assets)
+            u, s, _ = np.linalg.svd(Rc, full_matrices=False)
+            F = u[:, :n_factors] * s[:n_factors]
+        else:
+            F = np.nan_to_num(factors.reindex(returns.index).to_numpy(dtype=float))
+        Fc = F - F.mean(axis=0)
+        B = np.linalg.lstsq(Fc, Rc, rcond=None)[0].T  # (assets x factors)
+        psi = (Rc - Fc @ B.T).var(axis=0, ddof=1)
+        beta = W @ B  # (portfolios x factors)
+        model["factor_history"] = F
+        model["beta"] = beta
+        model["alpha"] = history.mean(axis=0) - beta @ F.mean(axis=0)
+        model["scale"] = _sqrt_psd((W * psi) @ W.T)
+    return model
+
+
+def _block_rows(rng, n_paths, horizon, n_rows, block_size):
+    """(n_paths x horizon) row indices of a circular block bootstrap."""
+    block_size = min(block_size, n_rows)
+    n_blocks = -(-horizon // block_size)
+    starts = rng.integers(0, n_rows, size=(n_paths, n_blocks, 1))
+    rows = (starts + np.arange(block_size)) % n_rows
+    return rows.reshape(n_paths, -1)[:, :horizon]
+
+
+def simulate_portfolio_returns(model, n_paths, horizon, rng):
+    """
+    Draw (n_paths x horizon x portfolios) daily portfolio returns from a scenario_model.
+
+    Args:
+        model (dict): From scenario_model.
+        n_paths (int): Paths to draw.
+        horizon (int): Days per path.
+        rng (np.random.Generator): Random source.
+
+    Returns:
+        ndarray
+    """
+    method = model["method"]
+    if method == "bootstrap":
+        history = model["history"]
+        return history[_block_rows(rng, n_paths, horizon, len(history), model["block_size"])]
+    scale = model["scale"]
+    z = rng.standard_normal((n_paths, horizon, scale.shape[1]))
+    if method == "normal":
+        return model["mean"] + z @ scale.T
+    F = model["factor_history"]
+    f = F[_block_rows(rng, n_paths, horizon, len(F), model["block_size"])]
+    return model["alpha"] + f @ model["beta"].T + z @ scale.T
+
+
+def path_statistics(returns, stop_limits=(-0.10,)):
+    """
+    Terminal wealth, maximum drawdown and stop-loss hits of simulated paths.
+
+    Wealth starts at 1 before the first return; a stop is hit on the first day the
+    drawdown from the running maximum is at or below the limit (check_stop_loss rule).
+
+    Args:
+        returns (ndarray): (paths x horizon x portfolios) daily returns.
+        stop_limits (sequence of float): Drawdown limits (negative, e.g. -0.10).
+
+    Returns:
+        dict: 'terminal_wealth' and 'max_drawdown' (paths x portfolios), 'stop_day'
+              (paths x portfolios x limits; first day index, -1 = never hit).
+    """
+    # (paths x portfolios x horizon) copy, so the scans run along contiguous memory and in place
+    wealth = returns.transpose(0, 2, 1).copy()
+    wealth += 1.0
+    np.cumprod(wealth, axis=-1, out=wealth)
+    terminal = wealth[..., -1].copy()
+    peak = np.maximum.accumulate(wealth, axis=-1)
+    np.maximum(peak, 1.0, out=peak)
+    drawdown = wealth
+    drawdown /= peak
+    drawdown -= 1.0
+    limits = np.asarray(stop_limits, dtype=float)
+    stop_day = np.empty(terminal.shape + limits.shape, dtype=np.int64)
+    for j, limit in enumerate(limits):
+        hit = drawdown <= limit
+        first = hit.argmax(axis=-1)
+        stop_day[..., j] = np.where(np.take_along_axis(hit, first[..., None], axis=-1)[..., 0], first, -1)
+    return {
+        "terminal_wealth": terminal,
+        "max_drawdown": np.minimum(drawdown.min(axis=-1), 0.0),
+        "stop_day": stop_day,
+    }
+
+
+def _simulate_chunk(args):
+    model, n_paths, horizon, seed, stop_limits = args
+    rng = np.random.default_rng(seed)
+    return path_statistics(simulate_portfolio_returns(model, n_paths, horizon, rng), stop_limits)
+
+
+@instrumented("monte_carlo_scenarios")
+def monte_carlo_scenarios(returns, weights, n_paths=10_000, horizon=252, method="bootstrap", stop_limits=(-0.10,),
+                          block_size=20, n_factors=3, factors=None, seed=None, chunk_paths=None, n_jobs=None,
+                          memory_budget=None):
+    """
+    Forward distributions of terminal wealth, maximum drawdown and stop-loss hits.
+
+    Args:
+        returns (DataFrame): Wide daily return panel (see var_engine.returns_panel).
+        weights (Series or DataFrame or ndarray): One portfolio or several (rows),
+                                                  held at constant weights (daily rebalanced).
+        n_paths (int): Simulated paths per portfolio.
+        horizon (int): Days per path.
+        method (str): 'normal', 'bootstrap' or 'factor' (see module docstring).
+        stop_limits (sequence of float): Drawdown limits to test, e.g. the adjusted_limit
+                                         of check_stop_loss.
+        block_size (int): Days per bootstrap block.
+        n_factors (int): Principal components for method='factor' without factors.
+        factors (DataFrame or None): Historical factor returns for method='factor'.
+        seed (int or None): Seed of the SeedSequence the chunk seeds are spawned from.
+        chunk_paths (int or None): Paths per chunk (None = fit memory_budget).
+        n_jobs (int or None): Worker processes (None = configured n_jobs, 1 = in-process).
+        memory_budget (int or None): Bytes per chunk (None = configured compute.memory_budget).
+
+    Returns:
+        dict: path_statistics arrays over all paths, plus 'portfolios' and 'stop_limits'.
+    """
+    if n_paths < 1 or horizon < 1:
+        raise ValueError("n_paths and horizon must be >= 1")
+    model = scenario_model(returns, weights, method=method, block_size=block_size, n_factors=n_factors,
+                           factors=factors)
+    n_portfolios = len(model["portfolios"])
+    memory_budget = memory_budget or get_config().compute.memory_budget
+    chunk_paths = chunk_paths or max(1, int(memory_budget // (_PATH_BUFFERS * 8 * horizon * n_portfolios)))
+    sizes = [min(chunk_paths, n_paths - a) for a in range(0, n_paths, chunk_paths)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    stop_limits = tuple(stop_limits)
+    tasks = [(model, size, horizon, s, stop_limits) for size, s in zip(sizes, seeds)]
+
+    n_jobs = resolve_n_jobs(n_jobs, len(tasks))
+    count("scenarios.paths", n_paths * n_portfolios)
+    with span("scenarios.simulate", method=method, n_chunks=len(tasks), n_jobs=n_jobs):
+        if n_jobs == 1:
+            parts = [_simulate_chunk(t) for t in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+                parts = list(pool.map(_simulate_chunk, tasks))
+
+    result = {key: np.concatenate([p[key] for p in parts]) for key in parts[0]}
+    result.update({"portfolios": model["portfolios"], "stop_limits": np.asarray(stop_limits, dtype=float)})
+    return result
+
+
+def scenario_summary(result, quantiles=(0.01, 0.05, 0.5, 0.95)):
+    """
+    One row per portfolio summarizing monte_carlo_scenarios output.
+
+    Args:
+        result (dict): From monte_carlo_scenarios.
+        quantiles (sequence of float): Quantiles of terminal wealth and maximum drawdown.
+
+    Returns:
+        pd.DataFrame: index=portfolio; mean terminal wealth, probability of a loss,
+                      wealth / drawdown quantiles and, per stop limit, the probability
+                      of a hit and the median day of the first hit.
+    """
+    wealth, mdd, stop_day = result["terminal_wealth"], result["max_drawdown"], result["stop_day"]
+    table = {"Mean Terminal Wealth": wealth.mean(axis=0), "P(Loss)": (wealth < 1.0).mean(axis=0)}
+    for q in quantiles:
+        table[f"Terminal Wealth q{q:g}"] = np.quantile(wealth, q, axis=0)
+    for q in quantiles:
+        table[f"Max Drawdown q{q:g}"] = np.quantile(mdd, q, axis=0)
+    for j, limit in enumerate(result["stop_limits"]):
+        days = stop_day[..., j].astype(float)
+        hit = days >= 0
+        table[f"P(Stop {limit:g})"] = hit.mean(axis=0)
+        table[f"Median Stop Day {limit:g}"] = [np.median(d[h]) if h.any() else np.nan
+                                               for d, h in zip(days.T, hit.T)]
+    return pd.DataFrame(table, index=result["portfolios"])
@@ -0,0 +1,186 @@
+import numpy as np
+import pandas as pd
+
+from config import get_config
+from profiling.instrumentation import instrumented, span
+
+__all__ = [
+    "returns_panel",
+    "rolling_portfolio_var",
+]
+
+# Quantile grid used to integrate the Cornish-Fisher tail for CVaR
+_CF_TAIL_POINTS = 64
+
+
+def returns_panel(price_df):
+    """
+    Wide daily return panel (index=Date, columns=Symbol) from long price data,
+    computed once and shared by every date of rolling_portfolio_var.
+
+    Args:
+        price_df (DataFrame): Long format with ['Date', 'Symbol', 'Close'].
+
+    Returns:
+        pd.DataFrame
+    """
+    if 'Date' not in price_df.columns:
+        price_df = price_df.reset_index()
+    prices = price_df.pivot(index='Date', columns='Symbol', values='Close').sort_index()
+    return prices.pct_change().iloc[1:]
+
+
+def _cornish_fisher_z(z, skew, kurt):
+    return (z + (z**2 - 1) * skew / 6 + (z**3 - 3 * z) * kurt / 24
+            - (2 * z**3 - 5 * z) * skew**2 / 36)
+
+
+def _window_chunk(R, W, ends, lookback, min_periods):
+    """
+    Portfolio scenario returns of a chunk of dates from one matrix product.
+
+    Rows of R spanning the union of the chunk's windows are multiplied by all the
+    chunk's weight vectors at once; a mask then keeps, per date, only the rows in
+    that date's own window.
+    """
+    starts = np.maximum(ends - lookback + 1, 0)
+    n_obs = ends - starts + 1
+    u0, u1 = starts.min(), ends.max()
+    R_u = R[u0:u1 + 1]
+    rows = np.arange(u0, u1 + 1)[:, None]
+    mask = (rows >= starts) & (rows <= ends) & (n_obs >= min_periods)
+    scenarios = R_u @ W.T
+    return R_u, scenarios, mask
+
+
+@instrumented("rolling_portfolio_var")
+def rolling_portfolio_var(returns, weights, confidence_level=0.95, lookback=252, method='historical',
+                          min_periods=None, components=False, chunk_size=None):
+    """
+    Rolling portfolio VaR and CVaR for every date of a weights matrix.
+
+    For each weight date the window is the last `lookback` return rows on or before
+    that date. Scenario portfolio returns are computed chunk by chunk as
+    (scenarios x assets) @ (assets x dates) products over the shared return panel;
+    no per-date slicing of the long data. VaR and CVaR follow filter_by_var's
+    convention: a return quantile (negative for a loss), not a positive loss amount.
+
+    Methods:
+        'historical'      empirical quantile (linear interpolation, as np.percentile)
+                          and mean of the scenarios at or below it.
+        'parametric'      normal: mu + z * sigma, CVaR mu - sigma * pdf(z) / (1 - confidence).
+        'cornish_fisher'  normal quantile adjusted for the window's skew and excess
+                          kurtosis; CVaR averages the adjusted quantile over the tail.
+
+    Component VaR (components=True) is the Euler decomposition w_i * marginal_i, summing
+    to the portfolio VaR. For the historical method the marginal VaR is the asset's return
+    in the scenario(s) at the VaR quantile; otherwise mu_i + z * cov(r_i, r_p) / sigma_p.
+
+    Args:
+        returns (DataFrame): Wide return panel (see returns_panel). Missing returns count as 0.
+        weights (DataFrame): Wide weights, index=Date, columns=Symbols (missing weights count as 0).
+        confidence_level (float): e.g. 0.95 or 0.99.
+        lookback (int): Window length in return rows.
+        method (str): 'historical', 'parametric' or 'cornish_fisher'.
+        min_periods (int or None): Minimum window length (None = lookback); shorter windows give NaN.
+        components (bool): Also return per-asset marginal and component VaR.
+        chunk_size (int or None): Dates per matrix product (bounds memory at ~(lookback + chunk_size) x chunk_size;
+                                  None = configured compute.chunk_size).
+
+    Returns:
+        dict: 'var' and 'cvar' Series indexed by weight date; with components=True also
+              'marginal_var' and 'component_var' DataFrames (dates x assets).
+    """
+    if method not in ('historical', 'parametric', 'cornish_fisher'):
+        raise ValueError("Method must be 'historical', 'parametric' or 'cornish_fisher'.")
+    min_periods = lookback if min_periods is None else min_periods
+    chunk_size = chunk_size or get_config().compute.chunk_size
+    alpha = 1 - confidence_level
+
+    assets = weights.columns
+    R = returns.reindex(columns=assets).to_numpy(dtype=float)
+    R = np.where(np.isnan(R), 0.0, R)
+    W_all = np.nan_to_num(weights.to_numpy(dtype=float))
+    ends_all = returns.index.searchsorted(weights.index, side='right') - 1
+
+    n_dates, n_assets = len(weights), len(assets)
+    var = np.full(n_dates, np.nan)
+    cvar = np.full(n_dates, np.nan)
+    marginal = np.full((n_dates, n_assets), np.nan) if components else None
+
+    if method != 'historical':
+        from scipy.stats import norm  # scipy.stats is slow to import, load on demand
+        z = norm.ppf(alpha)
+        tail_z = norm.ppf(alpha * (np.arange(_CF_TAIL_POINTS) + 0.5) / _CF_TAIL_POINTS)
+
+    for c0 in range(0, n_dates, chunk_size):
+        idx = np.arange(c0, min(c0 + chunk_size, n_dates))
+        idx = idx[ends_all[idx] >= 0]
+        if len(idx) == 0:
+            continue
+        with span("var_engine.chunk", n_dates=len(idx)):
+            W = W_all[idx]
+            R_u, scenarios, mask = _window_chunk(R, W, ends_all[idx], lookback, min_periods)
+            n = mask.sum(axis=0)
+            ok = n >= max(min_periods, 2)
+            if not ok.any():
+                continue
+            nn = np.where(ok, n, 1)
+
+            X = np.where(mask, scenarios, 0.0)
+            mu = X.sum(axis=0) / nn
+            dev = np.where(mask, scenarios - mu, 0.0)
+            m2 = (dev**2).sum(axis=0) / nn
+            sigma = np.sqrt(m2 * nn / np.maximum(nn - 1, 1))
+
+            if method == 'historical':
+                # NaN outside the window sorts last, so each column's window is its first n rows
+                order = np.argsort(np.where(mask, scenarios, np.nan), axis=0, kind='stable')
+                ranked = np.take_along_axis(scenarios, order, axis=0)
+                pos = (nn - 1) * alpha
+                lo = np.floor(pos).astype(int)
+                hi = np.minimum(lo + 1, nn - 1)
+                frac = pos - lo
+                cols = np.arange(len(idx))
+                q_lo, q_hi = ranked[lo, cols], ranked[hi, cols]
+                v = q_lo + frac * (q_hi - q_lo)
+                in_tail = mask & (scenarios <= v)
+                cv = np.where(in_tail, scenarios, 0.0).sum(axis=0) / np.maximum(in_tail.sum(axis=0), 1)
+                if components:
+                    r_lo = R_u[order[lo, cols]]
+                    r_hi = R_u[order[hi, cols]]
+                    marg = r_lo + frac[:, None] * (r_hi - r_lo)
+            else:
+                if method == 'parametric':
+                    z_eff = np.full(len(idx), z)
+                    v = mu + z * sigma
+                    cv = mu - sigma * norm.pdf(z) / alpha
+                else:
+                    skew = (dev**3).sum(axis=0) / nn / np.where(m2 > 0, m2**1.5, np.nan)
+                    kurt = (dev**4).sum(axis=0) / nn / np.where(m2 > 0, m2**2, np.nan) - 3
+                    z_eff = _cornish_fisher_z(z, skew, kurt)
+                    v = mu + z_eff * sigma
+                    tail = mu[:, None] + sigma[:, None] * _cornish_fisher_z(tail_z[None, :], skew[:, None], kurt[:, None])
+                    cv = tail.mean(axis=1)
+                if components:
+                    # Window means and cov(r_i, r_p) of every asset via two products over the chunk rows
+                    maskf = mask.astype(float)
+                    mean_i = (R_u.T @ maskf) / nn
+                    cross = R_u.T @ X
+                    cov_ip = (cross - nn * mean_i * mu) / np.maximum(nn - 1, 1)
+                    with np.errstate(invalid='ignore', divide='ignore'):
+                        marg = (mean_i + z_eff * cov_ip / sigma).T
+
+            var[idx[ok]] = v[ok]
+            cvar[idx[ok]] = cv[ok]
+            if components:
+                marginal[idx[ok]] = marg[ok]
+
+    out = {
+        'var': pd.Series(var, index=weights.index, name='VaR'),
+        'cvar': pd.Series(cvar, index=weights.index, name='CVaR'),
+    }
+    if components:
+        out['marginal_var'] = pd.DataFrame(marginal, index=weights.index, columns=assets)
+        out['component_var'] = out['marginal_var'] * np.nan_to_num(weights.to_numpy(dtype=float))
+    return out
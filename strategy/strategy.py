@@ -1,13 +1,25 @@
 import pandas as pd
-import matplotlib.pyplot as plt
 import numpy as np
-
-
-def ewma_momentum_signals(price_df, span=60, threshold=0.001, min_days_above_thresh=5):
-    # Copy to avoid mutating original df
-    df = price_df.copy()
+from config import get_config
+from data_loading.data_loading import is_date_symbol_sorted
+from kernels import kernels
+from profiling.instrumentation import instrumented
+
+__all__ = ["ewma_momentum_signals", "simple_moving_average"]
+
+
+@instrumented("ewma_momentum_signals")
+def ewma_momentum_signals(price_df, span=None, threshold=None, min_days_above_thresh=None):
+    # None = configured strategy.span / threshold / min_days_above_thresh
+    cfg = get_config().strategy
+    span = cfg.span if span is None else span
+    threshold = cfg.threshold if threshold is None else threshold
+    min_days_above_thresh = cfg.min_days_above_thresh if min_days_above_thresh is None else min_days_above_thresh
+    # Copy only the needed columns to avoid mutating (and duplicating) the original df
+    df = price_df[['Date', 'Symbol', 'Close']].copy()
     df['Date'] = pd.to_datetime(df['Date'])
-    df = df.sort_values(['Date', 'Symbol'])
+    if not is_date_symbol_sorted(price_df):
+        df = df.sort_values(['Date', 'Symbol'])
     df = df.set_index('Date')
 
     prices = df.pivot(columns="Symbol", values="Close")
@@ -15,22 +27,23 @@ def ewma_momentum_signals(price_df, span=60, threshold=0.001, min_days_above_thr
     shifted_prices = prices.shift(1)
     log_returns = np.log(prices / shifted_prices)
 
-    momentum_df = log_returns.ewm(span=span, adjust=False).mean()
-
-    pos_momentum = (momentum_df > threshold).astype(int)
-    neg_momentum = (momentum_df < -threshold).astype(int)
+    # EWMA recursion and rolling threshold counts run in the configured kernel backend
+    momentum = kernels.ewma(log_returns.to_numpy(dtype=float), span=span)
+    momentum_df = pd.DataFrame(momentum, index=log_returns.index, columns=log_returns.columns)
 
-    pos_count = pos_momentum.rolling(window=span).sum()
-    neg_count = neg_momentum.rolling(window=span).sum()
+    with np.errstate(invalid='ignore'):
+        pos_count = kernels.rolling_count(momentum > threshold, span)
+        neg_count = kernels.rolling_count(momentum < -threshold, span)
 
-    long_signal = (pos_count >= min_days_above_thresh).astype(int)
-    short_signal = (neg_count >= min_days_above_thresh).astype(int)
+        long_signal = (pos_count >= min_days_above_thresh).astype(int)
+        short_signal = (neg_count >= min_days_above_thresh).astype(int)
 
-    signal_df = long_signal - short_signal
+    signal_df = pd.DataFrame(long_signal - short_signal, index=momentum_df.index, columns=momentum_df.columns)
 
     return momentum_df, signal_df
 
 
+@instrumented("simple_moving_average")
 def simple_moving_average(price_df, short_window=20, long_window=90):
     """
     Compute SMA signals avoiding lookahead bias (uses previous day's moving averages).
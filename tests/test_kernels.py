@@ -0,0 +1,125 @@
+"""
+Cross-backend tests of the kernel layer: every backend must reproduce the
+reference kernels, and the reference must reproduce the pandas / loop
+formulations it replaced.
+"""
+import importlib.util
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from kernels import kernels
+from kernels import reference
+from kernels.kernels import _check_cases
+
+BACKENDS = [
+    "reference",
+    pytest.param("fast", marks=pytest.mark.skipif(importlib.util.find_spec("numba") is None,
+                                                  reason="numba not installed")),
+]
+
+
+def _assert_close(actual, expected, atol=1e-12):
+    actual, expected = np.asarray(actual, dtype=float), np.asarray(expected, dtype=float)
+    assert actual.shape == expected.shape
+    np.testing.assert_array_equal(np.isnan(actual), np.isnan(expected))
+    np.testing.assert_allclose(actual, expected, rtol=0, atol=atol, equal_nan=True)
+
+
+@pytest.fixture(scope="module")
+def cases():
+    return _check_cases(n_rows=600, n_cols=20, seed=7)
+
+
+@pytest.fixture
+def panel():
+    rng = np.random.default_rng(3)
+    values = rng.normal(0, 0.01, (400, 12))
+    values[rng.random(values.shape) < 0.15] = np.nan
+    values[:30, 0] = np.nan
+    values[:, -1] = np.nan
+    return values
+
+
+def test_available_backends_match_numba():
+    expected = ["reference"] + (["fast"] if importlib.util.find_spec("numba") is not None else [])
+    assert kernels.available_backends() == expected
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("name", kernels.KERNEL_NAMES)
+def test_backend_matches_reference(backend, name, cases):
+    module = kernels.get_backend(backend)
+    _assert_close(cases[name](module), cases[name](reference))
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_ewma_matches_pandas(backend, panel):
+    expected = pd.DataFrame(panel).ewm(span=20, adjust=False).mean().to_numpy()
+    _assert_close(kernels.ewma(panel, span=20, backend=backend), expected)
+    _assert_close(kernels.ewma(panel[:, 0], span=20, backend=backend), expected[:, 0])
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_rolling_count_matches_pandas(backend, panel):
+    flags = panel > 0.005
+    expected = pd.DataFrame(flags.astype(int)).rolling(window=30).sum().to_numpy()
+    _assert_close(kernels.rolling_count(flags, 30, backend=backend), expected)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_drawdown_recovery_matches_loop(backend):
+    rng = np.random.default_rng(5)
+    for _ in range(20):
+        wealth = np.cumprod(1 + rng.normal(0, 0.02, 250))
+        max_dd, start, trough, peak = 0.0, 0, 0, 0
+        for t, w in enumerate(wealth):
+            if w >= wealth[peak]:
+                peak = t
+            if w / wealth[peak] - 1 < max_dd:
+                max_dd, start, trough = w / wealth[peak] - 1, peak, t
+        recovery = next((t for t in range(trough, len(wealth)) if wealth[t] >= wealth[start]), -1)
+        assert kernels.drawdown_recovery(wealth, backend=backend) == pytest.approx((max_dd, start, trough, recovery))
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("freq", [1, 3, 21])
+def test_rebalance_hold_index_matches_schedule(backend, freq):
+    rng = np.random.default_rng(freq)
+    for ok in (np.ones(120, dtype=bool), rng.random(120) > 0.2):
+        expected, current, last = [-1], (0 if ok[0] else -1), 0
+        for i in range(1, len(ok)):
+            if i - last >= freq:
+                current, last = (i - 1, i) if ok[i - 1] else (-1, last)
+            expected.append(current)
+        np.testing.assert_array_equal(kernels.rebalance_hold_index(ok, freq, backend=backend), expected)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_no_trade_band_limits(backend):
+    rng = np.random.default_rng(11)
+    targets = np.abs(rng.normal(0, 1, (50, 6)))
+    targets /= targets.sum(axis=1, keepdims=True)
+    targets[rng.random(50) < 0.2, 0] = 0.0
+    returns = rng.normal(0, 0.02, (50, 6))
+
+    # No band: always on target
+    held, trades = kernels.no_trade_band(targets, returns, 0.0, backend=backend)
+    _assert_close(held, targets)
+    # Band wider than any target: nothing is ever bought
+    held, trades = kernels.no_trade_band(targets, returns, 1.0, backend=backend)
+    assert not held.any() and not trades.any()
+    # Trades happen exactly where the drifted weight left the band (or the target is an exit)
+    held, trades = kernels.no_trade_band(targets, returns, 0.1, backend=backend)
+    drifted = held - trades
+    outside = (np.abs(targets - drifted) > 0.1) | ((targets == 0) & (drifted != 0))
+    np.testing.assert_array_equal(trades != 0, outside)
+    # Trading to the edge leaves every asset within the band
+    held, _ = kernels.no_trade_band(targets, returns, 0.05, to_edge=True, backend=backend)
+    assert np.all(np.abs(held - targets) <= 0.05 + 1e-12)
+
+
+def test_check_kernels():
+    ok, report = kernels.check_kernels(n_rows=300, n_cols=10)
+    assert ok, report
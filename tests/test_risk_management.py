@@ -0,0 +1,88 @@
+"""
+risk_overlay against the scalar Kelly / stop-loss functions and the stop/resume
+rules stated in its docstring.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from risk_management.risk_management import check_stop_loss, get_dynamic_kelly_fraction, risk_overlay
+
+
+def _runs(mask):
+    """(start, stop) of each run of True values."""
+    edges = np.diff(np.concatenate([[0], mask.astype(int), [0]]))
+    return list(zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)))
+
+
+@pytest.fixture
+def strategy_returns():
+    rng = np.random.default_rng(1)
+    returns = rng.normal(0.0005, 0.02, 750)
+    returns[200:215] = -0.02  # crashes that must trigger the stop
+    returns[500:510] = -0.03
+    returns[rng.random(750) < 0.02] = np.nan
+    return pd.Series(returns, index=pd.bdate_range("2020-01-01", periods=750))
+
+
+def test_kelly_and_limit_match_scalar_functions(strategy_returns):
+    out = risk_overlay(strategy_returns, lookback=40, risk_sensitivity=0.5)
+    returns = strategy_returns.fillna(0)
+    for t in range(len(returns)):
+        kelly = get_dynamic_kelly_fraction(returns.iloc[max(0, t - 40):t])
+        _, limit = check_stop_loss(1.0, 1.0, kelly, -0.10, 0.5)
+        assert out["kelly_fraction"].iloc[t] == pytest.approx(kelly, abs=1e-10)
+        assert out["adjusted_limit"].iloc[t] == pytest.approx(limit, abs=1e-10)
+
+
+def test_stop_and_resume_on_a_known_path():
+    # Constant -10% limit and full exposure, so every step can be followed by hand
+    returns = pd.Series([0.0, 0.0, 0.0, -0.06, -0.06, -0.02, 0.03, 0.03, -0.05, -0.06, 0.0, 0.0])
+    out = risk_overlay(returns, risk_sensitivity=0.0, scale_by_kelly=False, resume_recovery=0.05, min_stop_days=1)
+    # Day 5: 0.94^2 - 1 = -11.6% <= -10% -> stop
+    # Day 8: strategy 0.98 -> 1.0397 since the stop, >= 5% above its low -> resume, peak reset
+    # Day 10: 0.95 * 0.94 - 1 = -10.7% from the reset peak -> stop again
+    expected = [False] * 5 + [True] * 3 + [False] * 2 + [True] * 2
+    assert out["stopped"].tolist() == expected
+    assert out["exposure"].tolist() == [0.0 if s else 1.0 for s in expected]
+    assert out["drawdown"].iloc[8] == 0.0
+    assert out["drawdown"].iloc[9] == pytest.approx(-0.05)
+    assert out["drawdown"].iloc[10] == pytest.approx(0.95 * 0.94 - 1)
+
+
+@pytest.mark.parametrize("min_stop_days, resume_recovery", [(1, 0.05), (5, 0.02), (10, 0.10)])
+def test_stop_resume_rules(strategy_returns, min_stop_days, resume_recovery):
+    out = risk_overlay(strategy_returns, lookback=40, resume_recovery=resume_recovery, min_stop_days=min_stop_days)
+    returns = strategy_returns.fillna(0).to_numpy()
+    stopped = out["stopped"].to_numpy()
+    limit = out["adjusted_limit"].to_numpy()
+    n = len(returns)
+    assert stopped.any() and not stopped.all()
+
+    # Exposure is zero while stopped, the Kelly fraction otherwise
+    np.testing.assert_array_equal(out["exposure"].to_numpy()[stopped], 0.0)
+    np.testing.assert_allclose(out["exposure"].to_numpy()[~stopped], out["kelly_fraction"].to_numpy()[~stopped])
+
+    # Overlay equity before each day's return
+    value = np.concatenate([[1.0], np.cumprod(1 + out["overlay_return"].to_numpy())])
+
+    # Active runs: the drawdown from the peak since the run started stays above the limit,
+    # and crosses it on the day the next stop starts
+    for a, b in _runs(~stopped):
+        end = min(b + 1, n)
+        drawdown = value[a:end] / np.maximum.accumulate(value[a:end]) - 1
+        np.testing.assert_allclose(out["drawdown"].to_numpy()[a:end], drawdown, atol=1e-12)
+        assert np.all(drawdown[:b - a] > limit[a:b])
+        if b < n:
+            assert drawdown[-1] <= limit[b]
+
+    # Stopped runs: resume on the first day with min_stop_days behind and the strategy
+    # resume_recovery above its low since the stop
+    for s, e in _runs(stopped):
+        shadow = np.concatenate([[1.0], np.cumprod(1 + returns[s:e])])  # before days s .. e
+        low = np.minimum.accumulate(shadow)
+        days = np.arange(len(shadow))
+        ready = (days >= max(min_stop_days, 1)) & (shadow >= low * (1 + resume_recovery))
+        assert not ready[:-1].any()
+        if e < n:
+            assert ready[-1]
@@ -0,0 +1,349 @@
+import json
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+__all__ = ["PositionLedger", "run_daily_ledger_update"]
+
+
+class PositionLedger:
+    """
+    Stateful positions, cash and PnL for one or more portfolios.
+
+    Holdings are stored as (portfolios x symbols) NumPy arrays so that a fill or a
+    daily mark-to-market only touches the slots of open positions. The full state
+    can be saved to / restored from a single .npz snapshot, which lets a live daily
+    job load yesterday's state, apply today's prices and save again without
+    recomputing anything from the start of the history.
+    """
+
+    def __init__(self, portfolios=("default",), initial_cash=0.0, capacity=64):
+        """
+        Args:
+            portfolios (iterable): Portfolio names.
+            initial_cash (float or iterable): Starting cash, scalar or one value per portfolio.
+            capacity (int): Initial number of symbol slots (grown automatically).
+        """
+        self.portfolios = list(portfolios)
+        self._portfolio_idx = {p: i for i, p in enumerate(self.portfolios)}
+        self.symbols = []
+        self._symbol_idx = {}
+
+        n_portfolios = len(self.portfolios)
+        self.quantity = np.zeros((n_portfolios, capacity))
+        self.avg_cost = np.zeros((n_portfolios, capacity))
+        self.realized_pnl = np.zeros((n_portfolios, capacity))
+        self.last_price = np.full(capacity, np.nan)
+        self.cash = np.broadcast_to(np.asarray(initial_cash, dtype=float), (n_portfolios,)).copy()
+        self.fees = np.zeros(n_portfolios)
+        self.last_equity = self.cash.copy()
+        self.last_date = None
+
+        self._open = set()  # symbol slots with a non-zero position in any portfolio
+        self._fills = []
+        self._history = []
+
+    # ------------------------------------------------------------------ #
+    # Symbol / portfolio slots
+    # ------------------------------------------------------------------ #
+    def _portfolio(self, portfolio):
+        try:
+            return self._portfolio_idx[portfolio]
+        except KeyError:
+            raise ValueError(f"Unknown portfolio '{portfolio}'") from None
+
+    def _symbol_slot(self, symbol):
+        slot = self._symbol_idx.get(symbol)
+        if slot is not None:
+            return slot
+
+        slot = len(self.symbols)
+        if slot >= self.quantity.shape[1]:
+            grow = max(slot, 1)
+            pad = ((0, 0), (0, grow))
+            self.quantity = np.pad(self.quantity, pad)
+            self.avg_cost = np.pad(self.avg_cost, pad)
+            self.realized_pnl = np.pad(self.realized_pnl, pad)
+            self.last_price = np.pad(self.last_price, (0, grow), constant_values=np.nan)
+
+        self.symbols.append(symbol)
+        self._symbol_idx[symbol] = slot
+        return slot
+
+    # ------------------------------------------------------------------ #
+    # Fills
+    # ------------------------------------------------------------------ #
+    def record_fill(self, portfolio, symbol, quantity, price, fee=0.0, date=None):
+        """
+        Apply one executed trade using average-cost accounting.
+
+        Args:
+            portfolio (str): Portfolio name.
+            symbol (str): Traded symbol.
+            quantity (float): Signed quantity (positive buys, negative sells).
+            price (float): Fill price.
+            fee (float): Commission paid, deducted from cash and realized PnL.
+            date (datetime or None): Trade date, defaults to the last marked date.
+        """
+        if quantity == 0:
+            return
+
+        p = self._portfolio(portfolio)
+        s = self._symbol_slot(symbol)
+
+        old_qty = self.quantity[p, s]
+        new_qty = old_qty + quantity
+
+        if old_qty == 0 or np.sign(old_qty) == np.sign(quantity):
+            # Opening or adding to a position
+            self.avg_cost[p, s] = (old_qty * self.avg_cost[p, s] + quantity * price) / new_qty
+        else:
+            # Reducing, closing or flipping a position
+            closed = min(abs(quantity), abs(old_qty))
+            self.realized_pnl[p, s] += closed * (price - self.avg_cost[p, s]) * np.sign(old_qty)
+            if new_qty == 0:
+                self.avg_cost[p, s] = 0.0
+            elif np.sign(new_qty) != np.sign(old_qty):
+                self.avg_cost[p, s] = price
+
+        self.quantity[p, s] = new_qty
+        self.cash[p] -= quantity * price + fee
+        self.fees[p] += fee
+        self.realized_pnl[p, s] -= fee
+
+        if np.isnan(self.last_price[s]):
+            self.last_price[s] = price
+
+        if new_qty != 0:
+            self._open.add(s)
+        elif not self.quantity[:, s].any():
+            self._open.discard(s)
+
+        self._fills.append((date if date is not None else self.last_date, portfolio, symbol, quantity, price, fee))
+
+    def record_fills(self, fills_df):
+        """
+        Apply a batch of fills.
+
+        Args:
+            fills_df (DataFrame): Columns ['portfolio', 'symbol', 'quantity', 'price'] and
+                                  optionally 'fee' and 'date'.
+        """
+        has_fee = 'fee' in fills_df.columns
+        has_date = 'date' in fills_df.columns
+        for row in fills_df.itertuples(index=False):
+            self.record_fill(
+                row.portfolio, row.symbol, row.quantity, row.price,
+                fee=row.fee if has_fee else 0.0,
+                date=row.date if has_date else None
+            )
+
+    def rebalance_to(self, portfolio, target_shares, prices, fee_per_share=0.0, date=None):
+        """
+        Generate and record the fills that move a portfolio to target share counts.
+        Symbols held but absent from target_shares are closed.
+
+        Args:
+            portfolio (str): Portfolio name.
+            target_shares (pd.Series): Target shares indexed by symbol (e.g. from prepare_trade_allocation).
+            prices (pd.Series): Fill prices indexed by symbol.
+            fee_per_share (float): Commission per share traded.
+            date (datetime or None): Trade date.
+
+        Returns:
+            pd.Series: Traded quantity per symbol.
+        """
+        current = self.positions(portfolio)
+        target = target_shares[target_shares != 0]
+        trades = target.sub(current, fill_value=0)
+        trades = trades[trades != 0]
+
+        missing = trades.index.difference(prices.dropna().index)
+        if len(missing) > 0:
+            raise ValueError(f"No fill price for: {list(missing)}")
+
+        for symbol, qty in trades.items():
+            self.record_fill(portfolio, symbol, qty, prices[symbol], fee=abs(qty) * fee_per_share, date=date)
+        return trades
+
+    # ------------------------------------------------------------------ #
+    # Daily mark-to-market
+    # ------------------------------------------------------------------ #
+    def update_prices(self, date, prices):
+        """
+        Mark all portfolios to market with one new day of prices.
+        Only open positions are looked up, so the cost is O(positions), independent
+        of the length of the price history or the size of the price universe.
+
+        Args:
+            date (datetime): Valuation date.
+            prices (pd.Series): Prices for the day indexed by symbol (extra symbols are ignored,
+                                missing ones keep their last known price).
+
+        Returns:
+            pd.DataFrame: One row per portfolio with the day's valuation.
+        """
+        date = pd.to_datetime(date)
+        if self.last_date is not None and date <= self.last_date:
+            raise ValueError(f"Date {date.date()} is not after last update {self.last_date.date()}")
+
+        slots = np.fromiter(sorted(self._open), dtype=int, count=len(self._open))
+        if len(slots) > 0:
+            new_prices = prices.reindex([self.symbols[s] for s in slots]).values.astype(float)
+            known = ~np.isnan(new_prices)
+            self.last_price[slots[known]] = new_prices[known]
+
+        self.last_date = date
+        record = self._valuation(slots)
+        self._history.append(record)
+        return record
+
+    def _valuation(self, slots):
+        qty = self.quantity[:, slots]
+        px = self.last_price[slots]
+        market_value = (qty * px).sum(axis=1)
+        unrealized = (qty * (px - self.avg_cost[:, slots])).sum(axis=1)
+        equity = self.cash + market_value
+
+        record = pd.DataFrame({
+            'date': self.last_date,
+            'portfolio': self.portfolios,
+            'market_value': market_value,
+            'cash': self.cash.copy(),
+            'equity': equity,
+            'daily_pnl': equity - self.last_equity,
+            'realized_pnl': self.realized_pnl[:, :len(self.symbols)].sum(axis=1),
+            'unrealized_pnl': unrealized,
+            'n_positions': (qty != 0).sum(axis=1)
+        })
+        self.last_equity = equity
+        return record
+
+    # ------------------------------------------------------------------ #
+    # Views
+    # ------------------------------------------------------------------ #
+    def positions(self, portfolio):
+        """Non-zero share counts of one portfolio as a Series indexed by symbol."""
+        p = self._portfolio(portfolio)
+        slots = sorted(s for s in self._open if self.quantity[p, s] != 0)
+        return pd.Series(self.quantity[p, slots], index=[self.symbols[s] for s in slots], dtype=float)
+
+    def holdings(self):
+        """Long-format table of open positions across all portfolios."""
+        slots = np.array(sorted(self._open), dtype=int)
+        p_idx, s_pos = np.nonzero(self.quantity[:, slots])
+        s_idx = slots[s_pos]
+        qty = self.quantity[p_idx, s_idx]
+        px = self.last_price[s_idx]
+        return pd.DataFrame({
+            'portfolio': [self.portfolios[i] for i in p_idx],
+            'symbol': [self.symbols[i] for i in s_idx],
+            'quantity': qty,
+            'avg_cost': self.avg_cost[p_idx, s_idx],
+            'last_price': px,
+            'market_value': qty * px,
+            'unrealized_pnl': qty * (px - self.avg_cost[p_idx, s_idx])
+        })
+
+    def fills(self):
+        """All fills recorded since the ledger was created or restored."""
+        return pd.DataFrame(self._fills, columns=['date', 'portfolio', 'symbol', 'quantity', 'price', 'fee'])
+
+    def history(self):
+        """Daily valuations recorded since the ledger was created or restored."""
+        if not self._history:
+            return pd.DataFrame(columns=['date', 'portfolio', 'market_value', 'cash', 'equity',
+                                         'daily_pnl', 'realized_pnl', 'unrealized_pnl', 'n_positions'])
+        return pd.concat(self._history, ignore_index=True)
+
+    # ------------------------------------------------------------------ #
+    # Snapshots
+    # ------------------------------------------------------------------ #
+    def snapshot(self):
+        """
+        Capture the ledger state as plain arrays (fills and history are not included).
+
+        Returns:
+            dict: Arrays and metadata accepted by PositionLedger.from_snapshot.
+        """
+        n = len(self.symbols)
+        return {
+            'portfolios': list(self.portfolios),
+            'symbols': list(self.symbols),
+            'quantity': self.quantity[:, :n].copy(),
+            'avg_cost': self.avg_cost[:, :n].copy(),
+            'realized_pnl': self.realized_pnl[:, :n].copy(),
+            'last_price': self.last_price[:n].copy(),
+            'cash': self.cash.copy(),
+            'fees': self.fees.copy(),
+            'last_equity': self.last_equity.copy(),
+            'last_date': None if self.last_date is None else self.last_date.isoformat(),
+        }
+
+    @classmethod
+    def from_snapshot(cls, snap):
+        ledger = cls(portfolios=snap['portfolios'], capacity=max(len(snap['symbols']), 1))
+        n = len(snap['symbols'])
+        ledger.symbols = list(snap['symbols'])
+        ledger._symbol_idx = {s: i for i, s in enumerate(ledger.symbols)}
+        ledger.quantity[:, :n] = snap['quantity']
+        ledger.avg_cost[:, :n] = snap['avg_cost']
+        ledger.realized_pnl[:, :n] = snap['realized_pnl']
+        ledger.last_price[:n] = snap['last_price']
+        ledger.cash = np.asarray(snap['cash'], dtype=float).copy()
+        ledger.fees = np.asarray(snap['fees'], dtype=float).copy()
+        ledger.last_equity = np.asarray(snap['last_equity'], dtype=float).copy()
+        ledger.last_date = None if snap['last_date'] is None else pd.Timestamp(snap['last_date'])
+        ledger._open = set(np.flatnonzero(ledger.quantity[:, :n].any(axis=0)).tolist())
+        return ledger
+
+    def save(self, path):
+        """Write the snapshot to a compressed .npz file."""
+        snap = self.snapshot()
+        meta = {k: snap.pop(k) for k in ('portfolios', 'symbols', 'last_date')}
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(path, meta=np.array(json.dumps(meta)), **snap)
+        return path.resolve()
+
+    @classmethod
+    def load(cls, path):
+        """Restore a ledger saved with PositionLedger.save."""
+        with np.load(path, allow_pickle=False) as data:
+            snap = {k: data[k] for k in data.files if k != 'meta'}
+            snap.update(json.loads(str(data['meta'])))
+        return cls.from_snapshot(snap)
+
+
+def run_daily_ledger_update(snapshot_path, price_df, date, log_path="portfolio_ledger_log.csv", portfolios=("default",)):
+    """
+    Live daily job: restore the ledger, mark it with one day's prices, append the
+    valuation to the log and save the new snapshot. Only the row for `date` is read
+    from price_df.
+
+    Args:
+        snapshot_path (str): Path of the .npz snapshot (created if missing).
+        price_df (DataFrame): Price data (index = Date, columns = Symbols).
+        date (datetime or str): Valuation date.
+        log_path (str): CSV log the day's valuation rows are appended to.
+        portfolios (iterable): Portfolio names used when no snapshot exists yet.
+
+    Returns:
+        PositionLedger: The updated ledger.
+    """
+    snapshot_path = Path(snapshot_path)
+    ledger = PositionLedger.load(snapshot_path) if snapshot_path.exists() else PositionLedger(portfolios)
+
+    date = pd.to_datetime(date)
+    if ledger.last_date is not None and date <= ledger.last_date:
+        print(f"Ledger already marked through {ledger.last_date.date()}, nothing to do.")
+        return ledger
+
+    record = ledger.update_prices(date, price_df.loc[date])
+
+    write_header = not Path(log_path).exists()
+    record.to_csv(log_path, mode='a', header=write_header, index=False)
+    ledger.save(snapshot_path)
+    print(f"Ledger marked for {date.date()}: {int(record['n_positions'].sum())} open positions.")
+
+    return ledger
@@ -2,6 +2,8 @@ import pandas as pd
 from datetime import datetime, timedelta
 from pathlib import Path
 
+__all__ = ["track_portfolio_performance"]
+
 
 def track_portfolio_performance(
     price_df,
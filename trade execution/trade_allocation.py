@@ -1,13 +1,27 @@
+import numpy as np
 import pandas as pd
-import pandas_market_calendars as mcal
 from datetime import datetime, timedelta
 
+__all__ = [
+    "get_trade_entry_exit_dates",
+    "get_previous_trading_day",
+    "prepare_trade_allocation",
+    "allocate_shares_batch",
+    "prepare_batch_trade_allocation",
+]
+
+
+def _nyse_calendar():
+    # pandas_market_calendars is slow to import, load it only when a calendar is needed
+    import pandas_market_calendars as mcal
+    return mcal.get_calendar('NYSE')
+
 
 def get_trade_entry_exit_dates(begin_new_trading_period=True, holding_period=None, entry_date=None):
     if not begin_new_trading_period:
         return None, None
 
-    nyse = mcal.get_calendar('NYSE')
+    nyse = _nyse_calendar()
     today = datetime.today().date()
 
     # Parse entry_date
@@ -50,14 +64,14 @@ def get_trade_entry_exit_dates(begin_new_trading_period=True, holding_period=Non
     return entry_date, exit_date
 
 def get_previous_trading_day(date):
-    nyse = mcal.get_calendar('NYSE')
+    nyse = _nyse_calendar()
     schedule = nyse.schedule(start_date=date - timedelta(days=10), end_date=date)
     trading_days = list(schedule.index.date)
     for d in reversed(trading_days):
         if d < date:
             return pd.to_datetime(d)
 
-def prepare_trade_allocation(entry_date, price_df, weights, capital=100_000):
+def prepare_trade_allocation(entry_date, price_df, weights, capital=100_000, rounding="floor"):
     """
     Prepare trade allocations for the upcoming entry_date.
     Assumes this is run *after market close* on the day before entry_date.
@@ -67,6 +81,8 @@ def prepare_trade_allocation(entry_date, price_df, weights, capital=100_000):
         price_df (DataFrame): Price data with Date index and Symbols as columns (daily close).
         filtered_kelly_weights (DataFrame): Weights filtered and normalized by date and symbol.
         capital (float): Total capital to allocate.
+        rounding (str): 'floor' truncates to whole shares, 'greedy' also spends the
+                        residual cash (see allocate_shares_batch).
 
     Returns:
         dict: {
@@ -99,7 +115,10 @@ def prepare_trade_allocation(entry_date, price_df, weights, capital=100_000):
     entry_prices = price_df.loc[allocation_date, weights.index]
     
     # Calculate shares to buy (integer shares)
-    shares = (capital * weights / entry_prices).fillna(0).astype(int)
+    if rounding == "floor":
+        shares = (capital * weights / entry_prices).fillna(0).astype(int)
+    else:
+        shares = allocate_shares_batch(weights, entry_prices, [capital], rounding=rounding).iloc[0]
     
     invested_capital = (shares * entry_prices).sum()
     
@@ -114,3 +133,158 @@ def prepare_trade_allocation(entry_date, price_df, weights, capital=100_000):
     data.to_csv('portfolio_allocation.csv',index=False)
     
     return entry_date, allocation_date, weights,entry_prices,shares,invested_capital
+
+
+def _greedy_residual_rounding(shares, target_weights, prices, capitals):
+    """
+    Spend the cash left over after flooring, one share at a time per account.
+
+    Each step buys, for every account at once, the single share that lowers the
+    squared weight tracking error the most and that the remaining cash can pay for.
+    After flooring every symbol sits less than one share below target, so a symbol
+    is bought at most once and the loop runs at most n_symbols times.
+
+    Args:
+        shares (ndarray): Floored share counts (accounts x symbols).
+        target_weights (ndarray): Target weights (symbols,), zero for untradeable symbols.
+        prices (ndarray): Entry prices (symbols,), np.inf for untradeable symbols.
+        capitals (ndarray): Capital per account (accounts,).
+
+    Returns:
+        ndarray: Share counts after spending residual cash.
+    """
+    shares = shares.copy()
+    safe_capitals = np.where(capitals > 0, capitals, np.nan)[:, None]
+    tradeable = np.isfinite(prices)
+    finite_prices = np.where(tradeable, prices, 0.0)
+
+    cash = capitals - shares @ finite_prices
+    step = finite_prices[None, :] / safe_capitals             # weight of one extra share
+    deviation = shares * finite_prices / safe_capitals - target_weights
+
+    rows = np.arange(len(capitals))
+    for _ in range(int(tradeable.sum())):
+        # Change in sum of squared deviations from buying one more share
+        gain = step * (2 * deviation + step)
+        gain[(prices[None, :] > cash[:, None]) | ~tradeable[None, :] | np.isnan(gain)] = np.inf
+
+        best = gain.argmin(axis=1)
+        buy = gain[rows, best] < 0
+        if not buy.any():
+            break
+
+        acct, sym = rows[buy], best[buy]
+        shares[acct, sym] += 1
+        cash[acct] -= finite_prices[sym]
+        deviation[acct, sym] += step[acct, sym]
+
+    return shares
+
+
+def allocate_shares_batch(weights, prices, capitals, rounding="greedy"):
+    """
+    Allocate one weight vector to many accounts as integer share counts.
+
+    Args:
+        weights (pd.Series): Target weights indexed by symbol (re-normalized over tradeable symbols).
+        prices (pd.Series): Entry prices indexed by symbol.
+        capitals (array-like or pd.Series): Capital per account. A Series index is used as account ids.
+        rounding (str): 'floor' truncates like prepare_trade_allocation, 'greedy' then spends the
+                        residual cash on the shares that best reduce weight tracking error.
+
+    Returns:
+        pd.DataFrame: Integer shares (accounts x symbols).
+    """
+    if rounding not in ("floor", "greedy"):
+        raise ValueError("rounding must be 'floor' or 'greedy'.")
+
+    accounts = capitals.index if isinstance(capitals, pd.Series) else pd.RangeIndex(len(capitals))
+    capitals = np.asarray(capitals, dtype=float)
+
+    w = weights.astype(float).clip(lower=0).fillna(0)
+    p = prices.reindex(w.index).astype(float).values
+    tradeable = np.isfinite(p) & (p > 0) & (w.values > 0)
+    if not tradeable.any():
+        raise ValueError("No symbol has both a positive weight and a valid price.")
+
+    target = np.where(tradeable, w.values, 0.0)
+    target /= target.sum()
+    p = np.where(tradeable, p, np.inf)
+
+    # Vectorized floor for every account at once
+    shares = np.floor(capitals[:, None] * target[None, :] / p[None, :])
+    shares[~np.isfinite(shares) | (shares < 0)] = 0
+
+    if rounding == "greedy":
+        shares = _greedy_residual_rounding(shares, target, p, capitals)
+
+    return pd.DataFrame(shares.astype(np.int64), index=accounts, columns=w.index)
+
+
+def prepare_batch_trade_allocation(
+    entry_date,
+    price_df,
+    weights,
+    capitals,
+    rounding="greedy",
+    output_path="portfolio_allocation_batch.csv"
+):
+    """
+    Prepare trade allocations for many accounts sharing the same target weights.
+    Same date handling as prepare_trade_allocation, but shares are computed for all
+    accounts in one pass and written to a single bulk file.
+
+    Args:
+        entry_date (date): The date you plan to enter (buy) positions next market open.
+        price_df (DataFrame): Price data with Date index and Symbols as columns (daily close).
+        weights (DataFrame): Weights filtered and normalized by date and symbol.
+        capitals (array-like or pd.Series): Capital per account. A Series index is used as account ids.
+        rounding (str): 'floor' or 'greedy' (see allocate_shares_batch).
+        output_path (str or None): Long-format CSV with one row per account and symbol. None skips writing.
+
+    Returns:
+        tuple: (entry_date, allocation_date, weights, entry_prices, shares, summary) where
+               shares is an accounts x symbols DataFrame and summary holds capital, invested
+               capital, residual cash and weight tracking error per account.
+    """
+    allocation_date = get_previous_trading_day(entry_date)
+
+    if allocation_date not in weights.index:
+        raise ValueError(f"Allocation date {allocation_date} not found in weights")
+
+    weights = weights.loc[allocation_date]
+    weights = weights[weights > 0]
+
+    if weights.sum() == 0:
+        raise ValueError(f"No positive weights on allocation date {allocation_date}")
+
+    weights = weights / weights.sum()
+    entry_prices = price_df.loc[allocation_date, weights.index]
+
+    shares = allocate_shares_batch(weights, entry_prices, capitals, rounding=rounding)
+
+    capital = pd.Series(np.asarray(capitals, dtype=float), index=shares.index)
+    position_value = shares * entry_prices.fillna(0)
+    invested_capital = position_value.sum(axis=1)
+    actual_weights = position_value.div(capital.replace(0, np.nan), axis=0).fillna(0)
+    tracking_error = np.sqrt(((actual_weights - weights) ** 2).sum(axis=1))
+
+    summary = pd.DataFrame({
+        'capital': capital,
+        'capital_allocated': invested_capital,
+        'residual_cash': capital - invested_capital,
+        'tracking_error': tracking_error
+    })
+    summary.index.name = 'account'
+
+    if output_path is not None:
+        data = shares.stack().rename('shares').reset_index()
+        data.columns = ['account', 'symbol', 'shares']
+        data['price'] = entry_prices.reindex(data['symbol']).values
+        data['target_weight'] = weights.reindex(data['symbol']).values
+        data['actual_weight'] = actual_weights.stack().values
+        data.insert(0, 'allocation_date', allocation_date)
+        data.insert(0, 'entry_date', entry_date)
+        data.to_csv(output_path, index=False)
+
+    return entry_date, allocation_date, weights, entry_prices, shares, summary
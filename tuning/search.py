@@ -0,0 +1,433 @@
+"""
+Hyperparameter search over the pipeline stages of main.run_pipeline.
+
+Trials are evaluated on a process pool. Each worker keeps an LRU cache of stage
+results (universe, signals, volatility weights) keyed by the parameters that stage
+depends on, and trials are dispatched in groups sharing their upstream parameters
+so that a worker computes each universe / signal panel once. Every evaluation is
+written to a sqlite table that can be queried with load_results or plain SQL.
+"""
+import itertools
+import json
+import sqlite3
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from backtest.backtest import backtest_close_to_close
+from config import resolve_n_jobs, cache_dir, enforce_cache_limit
+from data_loading.data_loading import load_price_data, is_date_symbol_sorted
+from metrics.metrics import performance_metrics
+from optimize.optimisation import inverse_volatility_weights
+from pipeline.stages import DEFAULT_PARAMS, default_params, point_in_time, select_universe, combine_signal_weights
+from profiling.instrumentation import span, count
+from strategy.strategy import ewma_momentum_signals
+
+__all__ = [
+    "SEARCH_DEFAULTS",
+    "grid_search",
+    "random_search",
+    "successive_halving",
+    "load_results",
+]
+
+# Tunable parameters: the pipeline stages' parameters plus the rebalancing frequency
+# (trials start from the configured strategy parameters, see _run_search)
+SEARCH_DEFAULTS = {**DEFAULT_PARAMS, "rebalance_freq": 1}
+
+# Parameters each cached stage depends on
+_UNIVERSE_KEYS = ("var_confidence", "var_threshold", "var_lookback", "vol_window", "min_vol", "max_vol",
+                  "corr_threshold")
+_SIGNAL_KEYS = ("span", "threshold", "min_days_above_thresh")
+_WEIGHT_KEYS = ("lookback",)
+# Rolling windows a trial needs before it produces weights, and scored rows after them
+_WARMUP_KEYS = ("var_lookback", "span", "lookback", "vol_window")
+_WARMUP_MARGIN = 60
+
+_METRIC_COLUMNS = {
+    "Cumulative Return": "cumulative_return",
+    "Annualized Return": "annualized_return",
+    "Volatility": "volatility",
+    "Sharpe Ratio": "sharpe_ratio",
+    "Max Drawdown": "max_drawdown",
+}
+
+_STATE = {}
+
+
+class _StageCache:
+    """Small LRU cache of stage outputs, one per worker process."""
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+
+    def get(self, key, compute):
+        if key in self._data:
+            self._data.move_to_end(key)
+            count("search.cache_hits")
+            return self._data[key]
+        count("search.cache_misses")
+        value = compute()
+        self._data[key] = value
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+        return value
+
+
+def _init_worker(df, metric, early_fraction, early_min_metric, cache_entries):
+    _STATE["df"] = df
+    _STATE["dates"] = np.sort(df['Date'].unique())
+    _STATE["metric"] = metric
+    _STATE["early_fraction"] = early_fraction
+    _STATE["early_min_metric"] = early_min_metric
+    _STATE["cache"] = _StageCache(cache_entries)
+
+
+def _cutoff(fraction):
+    dates = _STATE["dates"]
+    return dates[max(0, int(np.ceil(fraction * len(dates))) - 1)]
+
+
+def _evaluate(params, fraction):
+    """Run the pipeline stages on the first `fraction` of the history and score the backtest."""
+    cache = _STATE["cache"]
+    cutoff = _cutoff(fraction)
+
+    u_key = (cutoff, *(params[k] for k in _UNIVERSE_KEYS))
+    final_assets, final_price_df, _ = cache.get(
+        ("universe", u_key), lambda: select_universe(point_in_time(_STATE["df"], cutoff), params))
+    if not final_assets:
+        raise ValueError("no assets passed the filters")
+
+    _, signals = cache.get(("signals", u_key, *(params[k] for k in _SIGNAL_KEYS)), lambda: ewma_momentum_signals(
+        final_price_df, span=params["span"], threshold=params["threshold"],
+        min_days_above_thresh=params["min_days_above_thresh"]))
+    weights = cache.get(("weights", u_key, *(params[k] for k in _WEIGHT_KEYS)),
+                        lambda: inverse_volatility_weights(final_price_df, lookback=params["lookback"]))
+
+    final_weights = combine_signal_weights(signals, weights)
+    freq = int(params["rebalance_freq"])
+    if freq > 1:
+        # Hold each rebalance date's weights for `freq` rows
+        final_weights = final_weights.iloc[::freq].reindex(final_weights.index, method='ffill')
+
+    returns = backtest_close_to_close(final_price_df, final_weights)
+    if len(returns) < 2:
+        raise ValueError("backtest produced fewer than two returns")
+    return performance_metrics(returns)
+
+
+def _run_trial(task):
+    trial_id, params, fraction, use_early_stop = task
+    metric = _STATE["metric"]
+    record = {"trial_id": trial_id, "params": params, "budget": fraction, "status": "ok", "error": None,
+              "metrics": {}}
+    start = time.perf_counter()
+    try:
+        with span("search.trial"):
+            early_fraction = _STATE["early_fraction"]
+            early_min = _STATE["early_min_metric"]
+            if use_early_stop and early_min is not None and early_fraction < fraction:
+                early = _evaluate(params, early_fraction)
+                if not early[metric] >= early_min:
+                    record.update(status="early_stopped", budget=early_fraction, metrics=early)
+                    count("search.early_stopped")
+                    return record
+            record["metrics"] = _evaluate(params, fraction)
+    except Exception as e:
+        record.update(status="failed", error=f"{type(e).__name__}: {e}")
+        count("search.failed")
+    finally:
+        record["duration_s"] = time.perf_counter() - start
+    return record
+
+
+def _group_key(params):
+    return tuple(params[k] for k in _UNIVERSE_KEYS + _SIGNAL_KEYS)
+
+
+def _run_group(tasks):
+    return [_run_trial(t) for t in tasks]
+
+
+def _run_tasks(tasks, n_jobs, initargs):
+    """
+    Evaluate tasks, batching those that share upstream stages into one pool task
+    so the batch hits one worker's cache.
+    """
+    groups = OrderedDict()
+    for task in sorted(tasks, key=lambda t: (_group_key(t[1]), t[0])):
+        groups.setdefault(_group_key(task[1]), []).append(task)
+    batches = list(groups.values())
+
+    n_jobs = resolve_n_jobs(n_jobs, len(batches))
+    if n_jobs == 1:
+        _init_worker(*initargs)
+        results = [_run_group(b) for b in batches]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=initargs) as pool:
+            results = list(pool.map(_run_group, batches))
+    records = [r for batch in results for r in batch]
+    return sorted(records, key=lambda r: r["trial_id"])
+
+
+def _db_path(db_path):
+    """The sqlite results file: db_path, or search.sqlite in the cache directory (None)."""
+    return cache_dir("search") / "search.sqlite" if db_path is None else Path(db_path)
+
+
+def _connect(db_path):
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    con = sqlite3.connect(db_path)
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS trials (
+            search_id TEXT, strategy TEXT, trial_id INTEGER, rung INTEGER, budget REAL,
+            status TEXT, metric TEXT, score REAL, params TEXT,
+            cumulative_return REAL, annualized_return REAL, volatility REAL,
+            sharpe_ratio REAL, max_drawdown REAL, duration_s REAL, error TEXT, created TEXT
+        )""")
+    return con
+
+
+def _store(con, search_id, strategy, rung, metric, records):
+    now = datetime.now().isoformat(timespec="seconds")
+    rows = []
+    for r in records:
+        m = r["metrics"]
+        rows.append((
+            search_id, strategy, r["trial_id"], rung, r["budget"], r["status"], metric,
+            _to_float(m.get(metric)), json.dumps(r["params"], default=float),
+            *(_to_float(m.get(name)) for name in _METRIC_COLUMNS),
+            r["duration_s"], r["error"], now,
+        ))
+    con.executemany(f"INSERT INTO trials VALUES ({','.join('?' * 17)})", rows)
+    con.commit()
+
+
+def _to_float(x):
+    return None if x is None or not np.isfinite(x) else float(x)
+
+
+def _validate_space(space):
+    unknown = set(space) - set(SEARCH_DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown search parameters: {sorted(unknown)}. Tunable: {sorted(SEARCH_DEFAULTS)}")
+
+
+def _sample(space, rng):
+    """One draw: lists are choices, (low, high) tuples are uniform (integer if both bounds are ints)."""
+    params = {}
+    for name, spec in space.items():
+        if isinstance(spec, tuple) and len(spec) == 2:
+            low, high = spec
+            if isinstance(low, (int, np.integer)) and isinstance(high, (int, np.integer)):
+                params[name] = int(rng.integers(low, high + 1))
+            else:
+                params[name] = float(rng.uniform(low, high))
+        else:
+            params[name] = spec[int(rng.integers(len(spec)))]
+    return params
+
+
+def _prepare(df, load_kwargs):
+    with span("search.load"):
+        if df is None:
+            df = load_price_data(**(load_kwargs or {}))
+        if 'Date' not in df.columns:
+            df = df.reset_index()
+        if is_date_symbol_sorted(df):
+            return df.reset_index(drop=True)
+        return df.sort_values('Date', kind='stable').reset_index(drop=True)
+
+
+def _warmup_fraction(trials, n_dates):
+    """Smallest history share on which every trial gets past its rolling windows and is scored."""
+    warmup = max(int(p[k]) for p in trials for k in _WARMUP_KEYS)
+    return min(1.0, (warmup + _WARMUP_MARGIN) / max(n_dates, 1))
+
+
+def _run_search(strategy, candidates, df, base_params, metric, n_jobs, db_path, early_fraction,
+                early_min_metric, load_kwargs, cache_entries, budgets=None, eta=3):
+    if metric not in _METRIC_COLUMNS:
+        raise ValueError(f"metric must be one of {list(_METRIC_COLUMNS)}")
+    df = _prepare(df, load_kwargs)
+    base = {**SEARCH_DEFAULTS, **default_params(), **(base_params or {})}
+    trials = [{**base, **c} for c in candidates]
+
+    # A period shorter than the warm-up produces no weights and scores every trial NaN
+    floor = _warmup_fraction(trials, df['Date'].nunique())
+    search_id = uuid.uuid4().hex[:12]
+    initargs = (df, metric, max(early_fraction, floor), early_min_metric, cache_entries)
+    db_path = _db_path(db_path) if db_path is not False else None
+    con = _connect(db_path) if db_path is not None else None
+
+    all_records = []
+    with span("search.run", strategy=strategy, n_trials=len(trials)):
+        if budgets is None:
+            tasks = [(i, p, 1.0, True) for i, p in enumerate(trials)]
+            records = _run_tasks(tasks, n_jobs, initargs)
+            if con is not None:
+                _store(con, search_id, strategy, 0, metric, records)
+            all_records.extend((0, r) for r in records)
+        else:
+            # Rungs floored to the same budget would re-score the same trials on the same history
+            budgets = list(dict.fromkeys(max(b, floor) for b in budgets))
+            alive = list(enumerate(trials))
+            for rung, fraction in enumerate(budgets):
+                tasks = [(i, p, fraction, False) for i, p in alive]
+                records = _run_tasks(tasks, n_jobs, initargs)
+                last = rung == len(budgets) - 1
+                ranked = sorted((r for r in records if r["status"] == "ok" and
+                                 _to_float(r["metrics"].get(metric)) is not None),
+                                key=lambda r: r["metrics"][metric], reverse=True)
+                keep = {r["trial_id"] for r in ranked[:max(1, len(alive) // eta)]} if not last else None
+                if keep is not None and not ranked:
+                    # Nothing to rank on: advance everyone rather than prune every trial
+                    print(f"[WARN] No finite {metric} in rung {rung} (budget {fraction:.2f}); "
+                          f"advancing all {len(alive)} trials.")
+                    keep = {i for i, _ in alive}
+                if keep is not None:
+                    for r in records:
+                        if r["status"] == "ok" and r["trial_id"] not in keep:
+                            r["status"] = "pruned"
+                    count("search.pruned", sum(r["status"] == "pruned" for r in records))
+                if con is not None:
+                    _store(con, search_id, strategy, rung, metric, records)
+                all_records.extend((rung, r) for r in records)
+                if keep is not None:
+                    alive = [(i, p) for i, p in alive if i in keep]
+                if not alive:
+                    break
+
+    if con is not None:
+        con.close()
+        enforce_cache_limit(keep=[db_path])
+        print(f"Stored {len(all_records)} evaluations of search {search_id} in: {db_path.resolve()}")
+
+    results = pd.DataFrame([{
+        "search_id": search_id, "trial_id": r["trial_id"], "rung": rung, "budget": r["budget"],
+        "status": r["status"], "score": _to_float(r["metrics"].get(metric)), **r["params"],
+        "duration_s": r["duration_s"], "error": r["error"],
+    } for rung, r in all_records])
+    # Full-budget evaluations first, so early-period scores never outrank them
+    return results.sort_values(["budget", "rung", "score"], ascending=[False, False, False],
+                               na_position="last").reset_index(drop=True)
+
+
+def grid_search(space, df=None, base_params=None, metric="Sharpe Ratio", n_jobs=None,
+                db_path=None, early_fraction=0.3, early_min_metric=None,
+                load_kwargs=None, cache_entries=64):
+    """
+    Evaluate every combination of the given parameter values.
+
+    Args:
+        space (dict): Parameter name -> list of values (names from SEARCH_DEFAULTS).
+        df (DataFrame or None): Long price data; loaded once with load_price_data if None.
+        base_params (dict or None): Fixed overrides of the configured parameters for all trials.
+        metric (str): performance_metrics key to maximize.
+        n_jobs (int or None): Worker processes (None = configured n_jobs, 1 = in-process).
+        db_path (str or None or False): sqlite results file (table 'trials'; None =
+                                        search/search.sqlite in the cache directory).
+                                        False skips storing.
+        early_fraction (float): Share of the history used for the early check (raised to the
+                                trials' warm-up, see successive_halving; no check if that
+                                is the full history).
+        early_min_metric (float or None): Trials scoring below this on the early period are
+                                          stopped there (None disables early stopping).
+        load_kwargs (dict or None): Passed to load_price_data when df is None.
+        cache_entries (int): Stage results kept per worker.
+
+    Returns:
+        pd.DataFrame: One row per evaluation with status, score and parameters, best
+                      full-history trials first.
+    """
+    _validate_space(space)
+    names = list(space)
+    candidates = [dict(zip(names, values)) for values in itertools.product(*(space[n] for n in names))]
+    return _run_search("grid", candidates, df, base_params, metric, n_jobs, db_path, early_fraction,
+                       early_min_metric, load_kwargs, cache_entries)
+
+
+def random_search(space, n_trials=50, seed=None, df=None, base_params=None, metric="Sharpe Ratio", n_jobs=None,
+                  db_path=None, early_fraction=0.3, early_min_metric=None,
+                  load_kwargs=None, cache_entries=64):
+    """
+    Evaluate `n_trials` random draws from the space. Lists are sampled uniformly
+    as choices, (low, high) tuples uniformly (as integers if both bounds are ints).
+
+    Other arguments as in grid_search.
+    """
+    _validate_space(space)
+    rng = np.random.default_rng(seed)
+    candidates = [_sample(space, rng) for _ in range(n_trials)]
+    return _run_search("random", candidates, df, base_params, metric, n_jobs, db_path, early_fraction,
+                       early_min_metric, load_kwargs, cache_entries)
+
+
+def successive_halving(space, n_trials=27, eta=3, min_fraction=None, seed=None, df=None, base_params=None,
+                       metric="Sharpe Ratio", n_jobs=None, db_path=None,
+                       load_kwargs=None, cache_entries=64):
+    """
+    Successive halving with the length of history as the budget: all sampled
+    trials are scored on a short early period, the best 1/eta advance to a
+    period eta times longer, and so on until the survivors run on the full history.
+
+    Args:
+        space (dict): As in random_search.
+        n_trials (int): Trials in the first rung.
+        eta (int): Reduction factor between rungs.
+        min_fraction (float or None): History share of the first rung
+                                      (None = eta ** -(number of rungs - 1)). Every rung
+                                      covers at least the trials' longest rolling window
+                                      (var_lookback, span, lookback, vol_window) plus
+                                      60 scored dates; rungs raised to the same budget
+                                      are merged.
+        Other arguments as in grid_search.
+
+    Returns:
+        pd.DataFrame: One row per evaluation and rung ('pruned' rows did not advance).
+    """
+    _validate_space(space)
+    n_rungs = max(1, int(np.floor(np.log(max(n_trials, 1)) / np.log(eta))) + 1)
+    if min_fraction is None:
+        min_fraction = float(eta) ** -(n_rungs - 1)
+    budgets = [min(1.0, min_fraction * eta ** r) for r in range(n_rungs)]
+    budgets[-1] = 1.0
+
+    rng = np.random.default_rng(seed)
+    candidates = [_sample(space, rng) for _ in range(n_trials)]
+    return _run_search("successive_halving", candidates, df, base_params, metric, n_jobs, db_path,
+                       early_fraction=1.0, early_min_metric=None, load_kwargs=load_kwargs,
+                       cache_entries=cache_entries, budgets=budgets, eta=eta)
+
+
+def load_results(db_path=None, search_id=None, status=None):
+    """
+    Read stored trials back with their parameters expanded into columns.
+
+    Args:
+        db_path (str or None): sqlite results file (None = the default of grid_search).
+        search_id (str or None): Restrict to one search.
+        status (str or None): Restrict to one status ('ok', 'early_stopped', 'pruned', 'failed').
+
+    Returns:
+        pd.DataFrame
+    """
+    query, args = "SELECT * FROM trials WHERE 1=1", []
+    if search_id is not None:
+        query += " AND search_id = ?"
+        args.append(search_id)
+    if status is not None:
+        query += " AND status = ?"
+        args.append(status)
+    with sqlite3.connect(_db_path(db_path)) as con:
+        df = pd.read_sql_query(query, con, params=args)
+    params = pd.DataFrame([json.loads(p) for p in df.pop("params")], index=df.index)
+    return pd.concat([df, params], axis=1)
@@ -0,0 +1,239 @@
+"""
+Walk-forward and purged k-fold cross-validation of strategy parameter choices.
+
+The expensive part, the daily return series of every candidate parameter set, is
+computed once into a (dates x candidates) panel. Each fold then only selects the
+candidate with the best in-sample metric on its training rows and scores it on its
+test rows, so folds are cheap array slices of the shared panel and run in parallel.
+"""
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from backtest.backtest import backtest_close_to_close
+from config import resolve_n_jobs
+from metrics.metrics import periods_per_year
+from optimize.optimisation import inverse_volatility_weights
+from pipeline.stages import default_params, combine_signal_weights
+from profiling.instrumentation import instrumented, span
+from strategy.strategy import ewma_momentum_signals
+
+__all__ = [
+    "walk_forward_splits",
+    "purged_kfold_splits",
+    "strategy_return_panel",
+    "cross_validate",
+]
+
+METRIC_NAMES = ("Cumulative Return", "Annualized Return", "Volatility", "Sharpe Ratio", "Max Drawdown")
+
+_STATE = {}
+
+
+def walk_forward_splits(n_samples, n_splits=5, train_size=None, test_size=None, anchored=True, gap=0):
+    """
+    Walk-forward splits over row positions: each test block follows its training
+    window in time.
+
+    Args:
+        n_samples (int): Number of dates.
+        n_splits (int): Number of folds.
+        train_size (int or None): Training rows (rolling) or minimum training rows (anchored).
+                                  None = whatever precedes the first test block (rolling mode
+                                  then keeps that many rows, first_test - gap, in every fold).
+        test_size (int or None): Rows per test block (None = n_samples // (n_splits + 1)).
+        anchored (bool): True = expanding window from the first date, False = rolling window
+                         of train_size rows.
+        gap (int): Rows dropped between the end of training and the start of testing.
+
+    Returns:
+        list: (train_idx, test_idx) integer arrays.
+    """
+    test_size = test_size or n_samples // (n_splits + 1)
+    first_test = n_samples - n_splits * test_size
+    if train_size is not None:
+        first_test = max(first_test, train_size + gap)
+    if test_size <= 0 or first_test - gap <= 0 or first_test + test_size > n_samples:
+        raise ValueError("Not enough samples for the requested walk-forward splits.")
+    if train_size is None and not anchored:
+        train_size = first_test - gap
+
+    splits = []
+    for k in range(n_splits):
+        test_start = first_test + k * test_size
+        if test_start >= n_samples:
+            break
+        train_end = test_start - gap
+        train_start = 0 if anchored else max(0, train_end - train_size)
+        splits.append((np.arange(train_start, train_end), np.arange(test_start, min(test_start + test_size, n_samples))))
+    return splits
+
+
+def purged_kfold_splits(n_samples, n_splits=5, purge=0, embargo=0.0):
+    """
+    K-fold over contiguous date blocks with purging and embargo: training rows within
+    `purge` rows before a test block, or within the embargo after it, are dropped so
+    overlapping look-back/label windows cannot leak test information into training.
+
+    Args:
+        n_samples (int): Number of dates.
+        n_splits (int): Number of folds.
+        purge (int): Rows removed from training on both sides of the test block
+                     (typically the longest signal look-back).
+        embargo (float or int): Extra rows removed after the test block; a float < 1 is a
+                                fraction of n_samples.
+
+    Returns:
+        list: (train_idx, test_idx) integer arrays.
+    """
+    if n_splits < 2 or n_splits > n_samples:
+        raise ValueError("n_splits must be between 2 and n_samples.")
+    embargo_rows = int(np.ceil(embargo * n_samples)) if isinstance(embargo, float) and embargo < 1 else int(embargo)
+    bounds = np.linspace(0, n_samples, n_splits + 1).astype(int)
+    rows = np.arange(n_samples)
+
+    splits = []
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        keep = (rows < start - purge) | (rows >= end + purge + embargo_rows)
+        splits.append((rows[keep], rows[start:end]))
+    return splits
+
+
+def _candidate_grid(param_grid):
+    names = list(param_grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(param_grid[n] for n in names))]
+
+
+@instrumented("strategy_return_panel")
+def strategy_return_panel(price_df, param_grid=None, base_params=None):
+    """
+    Daily returns of the EWMA-momentum / inverse-volatility strategy for every
+    parameter combination, as one (dates x candidates) panel. Signal and volatility
+    panels are computed once per distinct parameter value and reused.
+
+    Args:
+        price_df (DataFrame): Long format with ['Date', 'Symbol', 'Close'] (already filtered
+                              to the universe to evaluate).
+        param_grid (dict or None): 'span', 'threshold', 'min_days_above_thresh' and/or
+                                   'lookback' -> list of values. None = configured parameters only.
+        base_params (dict or None): Overrides of the configured parameters not in the grid.
+
+    Returns:
+        tuple: (returns ndarray (n_dates, n_candidates), DatetimeIndex of dates, list of candidate dicts)
+    """
+    base = {**default_params(), **(base_params or {})}
+    candidates = [{**base, **c} for c in _candidate_grid(param_grid or {})]
+
+    signal_cache, weight_cache, columns = {}, {}, []
+    for c in candidates:
+        s_key = (c["span"], c["threshold"], c["min_days_above_thresh"])
+        if s_key not in signal_cache:
+            signal_cache[s_key] = ewma_momentum_signals(price_df, span=c["span"], threshold=c["threshold"],
+                                                        min_days_above_thresh=c["min_days_above_thresh"])[1]
+        if c["lookback"] not in weight_cache:
+            weight_cache[c["lookback"]] = inverse_volatility_weights(price_df, lookback=c["lookback"])
+        weights = combine_signal_weights(signal_cache[s_key], weight_cache[c["lookback"]])
+        columns.append(backtest_close_to_close(price_df, weights))
+
+    panel = pd.concat(columns, axis=1).sort_index()
+    return panel.to_numpy(dtype=float), pd.DatetimeIndex(panel.index), candidates
+
+
+def _metrics_matrix(R, freq):
+    """performance_metrics for every column of R at once (rows = periods)."""
+    n = R.shape[0]
+    growth = np.cumprod(1 + R, axis=0)
+    cumulative = growth[-1] - 1
+    annualized = (1 + cumulative) ** (freq / n) - 1
+    volatility = R.std(axis=0, ddof=1) * np.sqrt(freq)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sharpe = annualized / volatility
+    running_max = np.maximum.accumulate(growth, axis=0)
+    max_drawdown = ((growth - running_max) / running_max).min(axis=0)
+    return np.vstack([cumulative, annualized, volatility, sharpe, max_drawdown])
+
+
+def _init_worker(returns, select_metric, freq):
+    _STATE["returns"] = returns
+    _STATE["select"] = METRIC_NAMES.index(select_metric)
+    _STATE["freq"] = freq
+
+
+def _run_fold(fold):
+    k, train_idx, test_idx = fold
+    R = _STATE["returns"]
+    with span("cv.fold"):
+        train_scores = _metrics_matrix(np.nan_to_num(R[train_idx]), _STATE["freq"])[_STATE["select"]]
+        train_scores = np.where(np.isfinite(train_scores), train_scores, -np.inf)
+        best = int(np.argmax(train_scores))
+        test_returns = np.nan_to_num(R[test_idx, best])
+        test_metrics = _metrics_matrix(test_returns[:, None], _STATE["freq"])[:, 0]
+    return k, best, train_scores[best], test_metrics, test_returns
+
+
+@instrumented("cross_validate")
+def cross_validate(returns, splits, select_metric="Sharpe Ratio", n_jobs=None, freq=252, bar_size=None):
+    """
+    Score parameter selection out of sample: in each fold the candidate with the best
+    training metric is chosen and evaluated on the test rows.
+
+    Args:
+        returns (ndarray or DataFrame): (dates x candidates) return panel (see strategy_return_panel);
+                                        a 1-D array or Series is a single candidate.
+        splits (list): (train_idx, test_idx) arrays from walk_forward_splits / purged_kfold_splits.
+        select_metric (str): Metric used to pick the candidate on the training rows.
+        n_jobs (int or None): Worker processes (None = configured n_jobs, 1 = in-process).
+        freq (int): Periods per year for annualization.
+        bar_size (str or None): If given, freq = periods_per_year(bar_size).
+
+    Returns:
+        dict of arrays:
+            'test_metrics'     (n_folds, 5) in METRIC_NAMES order
+            'chosen'           (n_folds,) candidate column chosen per fold
+            'train_score'      (n_folds,) its training metric
+            'oos_returns'      (n_dates,) out-of-sample returns, NaN on dates never tested
+                               (the last fold wins where test blocks overlap)
+            'oos_mask'         (n_dates,) bool, dates that were tested
+            'oos_metrics'      (5,) metrics of the combined out-of-sample series
+    """
+    if select_metric not in METRIC_NAMES:
+        raise ValueError(f"select_metric must be one of {METRIC_NAMES}")
+    if bar_size is not None:
+        freq = periods_per_year(bar_size)
+    R = np.asarray(returns, dtype=float)
+    if R.ndim == 1:
+        R = R[:, None]
+
+    folds = [(k, np.asarray(tr), np.asarray(te)) for k, (tr, te) in enumerate(splits)]
+    n_jobs = resolve_n_jobs(n_jobs, len(folds))
+    with span("cv.folds", n_folds=len(folds), n_jobs=n_jobs):
+        if n_jobs == 1:
+            _init_worker(R, select_metric, freq)
+            outputs = [_run_fold(f) for f in folds]
+        else:
+            with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                                     initargs=(R, select_metric, freq)) as pool:
+                outputs = list(pool.map(_run_fold, folds))
+
+    n_folds = len(outputs)
+    test_metrics = np.full((n_folds, len(METRIC_NAMES)), np.nan)
+    chosen = np.zeros(n_folds, dtype=int)
+    train_score = np.full(n_folds, np.nan)
+    oos = np.full(R.shape[0], np.nan)
+    for k, best, score, metrics, test_returns in outputs:
+        test_metrics[k], chosen[k], train_score[k] = metrics, best, score
+        oos[folds[k][2]] = test_returns
+
+    mask = ~np.isnan(oos)
+    oos_metrics = _metrics_matrix(oos[mask][:, None], freq)[:, 0] if mask.sum() > 1 else \
+        np.full(len(METRIC_NAMES), np.nan)
+    return {
+        "test_metrics": test_metrics,
+        "chosen": chosen,
+        "train_score": train_score,
+        "oos_returns": oos,
+        "oos_mask": mask,
+        "oos_metrics": oos_metrics,
+    }